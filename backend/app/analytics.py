@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, distinct, func, or_, select
+from sqlalchemy.orm import Session
+from app.db.models import ScanAnalyticsModel, ScanBucketModel, ScanRollupModel
+from app.hll import HyperLogLog
+
+# (chave no resultado, coluna, nome do campo em cada item, limite)
+TOP_DIMENSIONS = (
+    ("top_browsers", ScanAnalyticsModel.browser, "name", 5),
+    ("top_os", ScanAnalyticsModel.os, "name", 5),
+    ("top_devices", ScanAnalyticsModel.device, "type", 5),
+)
+TOP_COUNTRIES = 5
+TOP_CITIES = 3
+
+
+class ScanAggregation:
+    """Estatísticas de um QR Code calculadas no banco com GROUP BY.
+
+    Reproduz exatamente o resultado da versão em Python baseada em Counter:
+    valores vazios/nulos são ignorados e, em caso de empate, vence o valor
+    que apareceu primeiro (menor id), como no Counter.most_common.
+    """
+
+    def __init__(self, qr_code_id: int, days: int = None, now: datetime = None):
+        self.qr_code_id = qr_code_id
+        self.conditions = [ScanAnalyticsModel.qr_code_id == qr_code_id, ScanAnalyticsModel.suppressed.is_(None)]
+        if days:
+            cutoff_date = (now or datetime.utcnow()) - timedelta(days=days)
+            self.conditions.append(ScanAnalyticsModel.scanned_at >= cutoff_date)
+
+    def total_scans_stmt(self):
+        # Total sem o filtro de período, como o scan_count do QR Code
+        return select(func.count()).select_from(ScanAnalyticsModel).where(
+            ScanAnalyticsModel.qr_code_id == self.qr_code_id,
+            ScanAnalyticsModel.suppressed.is_(None)
+        )
+
+    def unique_visitors_stmt(self):
+        return select(func.count(distinct(ScanAnalyticsModel.ip_address))).where(*self.conditions)
+
+    def top_values_stmt(self, column, limit: int):
+        count = func.count()
+        return (
+            select(column, count)
+            .where(*self.conditions, column.is_not(None), column != "")
+            .group_by(column)
+            .order_by(count.desc(), func.min(ScanAnalyticsModel.id))
+            .limit(limit)
+        )
+
+    def top_cities_stmt(self, countries: list[str]):
+        country, city = ScanAnalyticsModel.country, ScanAnalyticsModel.city
+        count = func.count()
+        return (
+            select(country, city, count)
+            .where(*self.conditions, country.in_(countries), city.is_not(None), city != "")
+            .group_by(country, city)
+            .order_by(country, count.desc(), func.min(ScanAnalyticsModel.id))
+        )
+
+    @staticmethod
+    def format_top(rows, field: str) -> list[dict]:
+        return [{field: value, "count": count} for value, count in rows]
+
+    @staticmethod
+    def format_countries(country_rows, city_rows) -> list[dict]:
+        cities = {}
+        for country, city, count in city_rows:
+            top_cities = cities.setdefault(country, [])
+            if len(top_cities) < TOP_CITIES:
+                top_cities.append({"name": city, "count": count})
+
+        return [
+            {"name": country, "count": count, "top_cities": cities.get(country, [])}
+            for country, count in country_rows
+        ]
+
+    def run(self, session: Session, total_scans: int = None) -> dict:
+        # total_scans pode vir do contador desnormalizado do QR Code (qr_codes.scan_count)
+        if total_scans is None:
+            total_scans = session.execute(self.total_scans_stmt()).scalar_one()
+        result = {
+            "total_scans": total_scans,
+            "unique_visitors": session.execute(self.unique_visitors_stmt()).scalar_one()
+        }
+
+        for key, column, field, limit in TOP_DIMENSIONS:
+            rows = session.execute(self.top_values_stmt(column, limit)).all()
+            result[key] = self.format_top(rows, field)
+
+        country_rows = session.execute(self.top_values_stmt(ScanAnalyticsModel.country, TOP_COUNTRIES)).all()
+        city_rows = []
+        if country_rows:
+            city_rows = session.execute(self.top_cities_stmt([country for country, _ in country_rows])).all()
+        result["top_countries"] = self.format_countries(country_rows, city_rows)
+
+        return result
+
+
+class RollupAggregation:
+    """Mesmas estatísticas do ScanAggregation, lidas das tabelas de rollup.
+
+    O custo depende do número de buckets (horas/dias do período) e de valores
+    distintos, não do número de scans. A precisão do corte é de uma hora:
+    o início do período usa buckets por hora até o próximo dia cheio e, a
+    partir dele, buckets diários. Sem days usa o bucket "total". Os visitantes
+    únicos são estimados pela união dos sketches HyperLogLog dos buckets, e
+    empates no ranking são desempatados pelo valor.
+    """
+
+    def __init__(self, qr_code_id: int, days: int = None, now: datetime = None):
+        self.qr_code_id = qr_code_id
+        self.days = days
+        self.now = now or datetime.utcnow()
+
+    def bucket_conditions(self, model) -> list:
+        conditions = [model.qr_code_id == self.qr_code_id]
+        if not self.days:
+            conditions.append(model.granularity == "total")
+            return conditions
+
+        cutoff_date = self.now - timedelta(days=self.days)
+        first_hour = cutoff_date.replace(minute=0, second=0, microsecond=0)
+        first_day = cutoff_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        if first_day < first_hour:
+            first_day += timedelta(days=1)
+
+        conditions.append(or_(
+            and_(model.granularity == "hour", model.bucket_start >= first_hour, model.bucket_start < first_day),
+            and_(model.granularity == "day", model.bucket_start >= first_day)
+        ))
+        return conditions
+
+    def total_scans_stmt(self):
+        return select(func.coalesce(func.sum(ScanBucketModel.scans), 0)).where(
+            ScanBucketModel.qr_code_id == self.qr_code_id,
+            ScanBucketModel.granularity == "total"
+        )
+
+    def sketches_stmt(self):
+        return select(ScanBucketModel.visitors_sketch).where(
+            *self.bucket_conditions(ScanBucketModel),
+            ScanBucketModel.visitors_sketch.is_not(None)
+        )
+
+    def top_values_stmt(self, dimension: str, limit: int):
+        total = func.sum(ScanRollupModel.count)
+        return (
+            select(ScanRollupModel.value, total)
+            .where(*self.bucket_conditions(ScanRollupModel), ScanRollupModel.dimension == dimension)
+            .group_by(ScanRollupModel.value)
+            .order_by(total.desc(), ScanRollupModel.value)
+            .limit(limit)
+        )
+
+    def top_cities_stmt(self, countries: list[str]):
+        total = func.sum(ScanRollupModel.count)
+        return (
+            select(ScanRollupModel.parent, ScanRollupModel.value, total)
+            .where(
+                *self.bucket_conditions(ScanRollupModel),
+                ScanRollupModel.dimension == "city",
+                ScanRollupModel.parent.in_(countries)
+            )
+            .group_by(ScanRollupModel.parent, ScanRollupModel.value)
+            .order_by(ScanRollupModel.parent, total.desc(), ScanRollupModel.value)
+        )
+
+    @staticmethod
+    def estimate_visitors(sketches) -> int:
+        merged = None
+        for sketch in sketches:
+            hll = HyperLogLog.from_bytes(sketch)
+            if merged is None:
+                merged = hll
+            else:
+                merged.merge(hll)
+        return merged.count() if merged is not None else 0
+
+    def run(self, session: Session, total_scans: int = None) -> dict:
+        # total_scans pode vir do contador desnormalizado do QR Code (qr_codes.scan_count)
+        if total_scans is None:
+            total_scans = session.execute(self.total_scans_stmt()).scalar_one()
+        result = {
+            "total_scans": total_scans,
+            "unique_visitors": self.estimate_visitors(session.execute(self.sketches_stmt()).scalars())
+        }
+
+        for key, column, field, limit in TOP_DIMENSIONS:
+            rows = session.execute(self.top_values_stmt(column.key, limit)).all()
+            result[key] = ScanAggregation.format_top(rows, field)
+
+        country_rows = session.execute(self.top_values_stmt("country", TOP_COUNTRIES)).all()
+        city_rows = []
+        if country_rows:
+            city_rows = session.execute(self.top_cities_stmt([country for country, _ in country_rows])).all()
+        result["top_countries"] = ScanAggregation.format_countries(country_rows, city_rows)
+
+        return result
@@ -0,0 +1,114 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.depends import get_async_db_session, get_reader_async
+from app.ingestion import ScanEvent, scan_ingestion
+from app.qr_code_use_cases import AsyncQRCodeUseCases
+from app.qr_routes import _scan_to_dict, _stream_scans
+from app.schemas import QRCodeResponse, AnalyticsResponse, ScanAnalytic, ScanPage
+
+# Mesmas rotas de redirect e analytics de app/qr_routes.py, sobre a engine async.
+# O app/main.py usa estes routers quando DB_ASYNC=true.
+redirect_router = APIRouter(tags=["Redirect"])
+analytics_router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+
+async def _submit_scan(event: ScanEvent) -> bool:
+    # Na política block o submit pode esperar a fila liberar: sai do event loop
+    if scan_ingestion.policy == "block":
+        return await run_in_threadpool(scan_ingestion.submit, event)
+    return scan_ingestion.submit(event)
+
+
+@redirect_router.get("/r/{code}")
+async def redirect_and_track(
+    code: str,
+    request: Request,
+    db_session: AsyncSession = Depends(get_async_db_session)
+):
+    """Captura analytics e redireciona para URL de destino"""
+    ip_address = request.client.host
+    user_agent = request.headers.get("user-agent", "Unknown")
+
+    uc = AsyncQRCodeUseCases(db_session=db_session)
+    target = await uc.resolve_code(code)
+
+    # O scan é gravado em background; sem o pipeline rodando, grava na hora
+    event = ScanEvent(target.qr_code_id, ip_address, user_agent, datetime.utcnow())
+    if not await _submit_scan(event):
+        await uc.record_scan(target.qr_code_id, ip_address, user_agent, event.scanned_at)
+
+    return RedirectResponse(url=target.destination_url, status_code=status.HTTP_302_FOUND)
+
+
+@analytics_router.get("/{code}", response_model=AnalyticsResponse)
+async def get_qr_analytics(
+    code: str,
+    days: int = None,
+    include_scans: bool = True,
+    current_user = Depends(get_reader_async),
+    db_session: AsyncSession = Depends(get_async_db_session)
+):
+    """Retorna as estatísticas de scans de um QR Code. Use days para filtrar (ex: days=7 para últimos 7 dias)
+    e include_scans=false para receber só o resumo (a lista de scans fica em /analytics/{code}/scans)"""
+    uc = AsyncQRCodeUseCases(db_session=db_session)
+    analytics = await uc.get_analytics(code, current_user.id, days)
+
+    qr_code = analytics["qr_code"]
+
+    scans_data = []
+    if include_scans:
+        async for partition in uc.iter_scans(qr_code.id):
+            scans_data.extend(ScanAnalytic(**_scan_to_dict(scan)) for scan in partition)
+
+    return AnalyticsResponse(
+        qr_code=QRCodeResponse(
+            id=qr_code.id,
+            code=qr_code.code,
+            destination_url=qr_code.destination_url,
+            created_at=qr_code.created_at.isoformat(),
+            scan_count=qr_code.scan_count,
+            last_scanned_at=qr_code.last_scanned_at.isoformat() if qr_code.last_scanned_at else None
+        ),
+        total_scans=analytics["total_scans"],
+        unique_visitors=analytics["unique_visitors"],
+        scans=scans_data,
+        top_browsers=analytics["top_browsers"],
+        top_os=analytics["top_os"],
+        top_devices=analytics["top_devices"],
+        top_countries=analytics["top_countries"]
+    )
+
+
+@analytics_router.get("/{code}/scans", response_model=ScanPage)
+async def list_qr_scans(
+    code: str,
+    days: int = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str = None,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    current_user = Depends(get_reader_async),
+    db_session: AsyncSession = Depends(get_async_db_session)
+):
+    """Lista os scans de um QR Code, do mais recente para o mais antigo. Em format=json a lista é paginada
+    (use o next_cursor da resposta em cursor); ndjson e csv fazem streaming de todos os scans do período"""
+    uc = AsyncQRCodeUseCases(db_session=db_session)
+    qr_code = await uc.get_user_qr_code(code, current_user.id)
+
+    # O streaming usa o gerador síncrono (sessão própria), executado no threadpool
+    if format == "ndjson":
+        return StreamingResponse(_stream_scans(qr_code.id, days, format), media_type="application/x-ndjson")
+    if format == "csv":
+        return StreamingResponse(
+            _stream_scans(qr_code.id, days, format),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{code}-scans.csv"'}
+        )
+
+    scans, next_cursor = await uc.list_scans(qr_code.id, limit, cursor, days)
+    return ScanPage(
+        scans=[ScanAnalytic(**_scan_to_dict(scan)) for scan in scans],
+        next_cursor=next_cursor
+    )
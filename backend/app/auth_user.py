@@ -1,11 +1,12 @@
 from datetime import datetime, timedelta
 from fastapi import status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from app.db.models import UserModel
+from app.passwords import hash_password, needs_rehash, verify_password
 from app.schemas import User, UserLogin
-import bcrypt
 from jose import jwt, JWTError
 from decouple import config
 
@@ -16,13 +17,7 @@ class UserUseCases:
     def __init__(self, db_session: Session):
         self.db_session = db_session
 
-    def user_register(self, user: User):
-        hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
-        user_model = UserModel(
-            username=user.username,
-            email=user.email,
-            password=hashed_password.decode('utf-8')
-        )
+    def _add_user(self, user_model: UserModel):
         try:
             self.db_session.add(user_model)
             self.db_session.commit()
@@ -31,12 +26,30 @@ class UserUseCases:
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Usuário ou email já está cadastrado"
             )
+
+    def _find_user(self, username: str) -> UserModel | None:
+        return self.db_session.query(UserModel).filter(
+            (UserModel.username == username) | (UserModel.email == username)
+        ).first()
+
+    def _update_password(self, user_model: UserModel, hashed_password: str):
+        user_model.password = hashed_password
+        self.db_session.commit()
+
+    # O bcrypt roda no pool de processos (app/passwords.py) e as queries no
+    # threadpool: nenhuma thread fica presa esperando o hash
+    async def user_register(self, user: User):
+        hashed_password = await hash_password(user.password)
+        user_model = UserModel(
+            username=user.username,
+            email=user.email,
+            password=hashed_password
+        )
+        await run_in_threadpool(self._add_user, user_model)
         return user_model   
     
-    def user_login(self, user: UserLogin, expires_in: int = 3600):
-        user_on_db = self.db_session.query(UserModel).filter(
-            (UserModel.username == user.username) | (UserModel.email == user.username)
-        ).first()
+    async def user_login(self, user: UserLogin, expires_in: int = 3600):
+        user_on_db = await run_in_threadpool(self._find_user, user.username)
 
         if user_on_db is None:
             raise HTTPException(
@@ -44,16 +57,22 @@ class UserUseCases:
                 detail="Usuário ou senha inválidos"
             )
         
-        if not bcrypt.checkpw(user.password.encode('utf-8'), user_on_db.password.encode('utf-8')):
+        if not await verify_password(user.password, user_on_db.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Usuário ou senha inválidos"
             )
         
+        # BCRYPT_ROUNDS mudou desde o cadastro: refaz o hash com a senha em mãos
+        if needs_rehash(user_on_db.password):
+            hashed_password = await hash_password(user.password)
+            await run_in_threadpool(self._update_password, user_on_db, hashed_password)
+        
         exp = datetime.utcnow() + timedelta(seconds=expires_in)
 
         payload = {
             "sub": user_on_db.username,
+            "uid": user_on_db.id,
             "exp": exp
         }
         token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
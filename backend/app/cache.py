@@ -0,0 +1,283 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from decouple import config
+from fastapi.concurrency import run_in_threadpool
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Cache em memória com evicção LRU e expiração opcional por TTL (thread-safe).
+
+    Com maxbytes e sizeof, a evicção também limita a soma dos tamanhos dos valores.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, maxbytes: int | None = None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pop(self, key):
+        value, _ = self._data.pop(key)
+        self.bytes -= self.sizeof(value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, expires_at)
+            self.bytes += self.sizeof(value)
+            while len(self._data) > self.maxsize or (
+                self.maxbytes is not None and self.bytes > self.maxbytes and len(self._data) > 1
+            ):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._pop(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+        if self.maxbytes is not None:
+            stats.update(bytes=self.bytes, maxbytes=self.maxbytes)
+        return stats
+
+
+class CacheBackend:
+    """Interface de cache compartilhado entre workers (ex: Redis). Valores são strings."""
+
+    # Faz I/O de rede: no event loop, as chamadas vão para o threadpool
+    blocking = True
+
+    def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Substituto local do backend compartilhado, usado em desenvolvimento e testes."""
+
+    blocking = False
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, url: str, prefix: str = "qrtrack:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.1)
+        self.prefix = prefix
+
+    def get(self, key: str) -> str | None:
+        value = self.client.get(self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+
+class RedirectTarget(NamedTuple):
+    qr_code_id: int
+    destination_url: str
+
+
+class RedirectCache:
+    """Cache code -> (qr_code_id, destination_url) usado pelo /r/{code}.
+
+    Primeiro consulta o LRU local do processo e depois o backend compartilhado
+    (se configurado). Falhas no backend compartilhado nunca quebram o redirect:
+    a busca simplesmente cai para o banco.
+
+    invalidate() só alcança o LRU do próprio processo e o backend compartilhado,
+    então o LRU local expira em local_ttl segundos: é o tempo máximo que outro
+    worker continua redirecionando um código apagado ou alterado.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300, backend: CacheBackend | None = None,
+                 local_ttl: float | None = None):
+        self.local = LRUCache(maxsize=maxsize, ttl=min(ttl, local_ttl) if local_ttl else ttl)
+        self.backend = backend
+        self.ttl = ttl
+        self.shared_hits = 0
+        self.backend_errors = 0
+
+    def _key(self, code: str) -> str:
+        return f"redirect:{code}"
+
+    def get(self, code: str) -> RedirectTarget | None:
+        target = self.local.get(code)
+        if target is not None or self.backend is None:
+            return target
+        return self._get_shared(code)
+
+    async def aget(self, code: str) -> RedirectTarget | None:
+        """get() para o event loop: só a consulta ao backend compartilhado vai para o threadpool."""
+        target = self.local.get(code)
+        if target is not None or self.backend is None:
+            return target
+        if self.backend.blocking:
+            return await run_in_threadpool(self._get_shared, code)
+        return self._get_shared(code)
+
+    def _get_shared(self, code: str) -> RedirectTarget | None:
+        try:
+            raw = self.backend.get(self._key(code))
+        except Exception:
+            self.backend_errors += 1
+            return None
+
+        if raw is None:
+            return None
+
+        target = RedirectTarget(*json.loads(raw))
+        self.shared_hits += 1
+        self.local.set(code, target)
+        return target
+
+    def set(self, code: str, qr_code_id: int, destination_url: str) -> RedirectTarget:
+        target = RedirectTarget(qr_code_id, destination_url)
+        self.local.set(code, target)
+        if self.backend is not None:
+            self._set_shared(code, target)
+        return target
+
+    async def aset(self, code: str, qr_code_id: int, destination_url: str) -> RedirectTarget:
+        target = RedirectTarget(qr_code_id, destination_url)
+        self.local.set(code, target)
+        if self.backend is not None:
+            if self.backend.blocking:
+                await run_in_threadpool(self._set_shared, code, target)
+            else:
+                self._set_shared(code, target)
+        return target
+
+    def _set_shared(self, code: str, target: RedirectTarget):
+        try:
+            self.backend.set(self._key(code), json.dumps(target), int(self.ttl))
+        except Exception:
+            self.backend_errors += 1
+
+    def invalidate(self, code: str):
+        self.local.delete(code)
+
+        if self.backend is not None:
+            try:
+                self.backend.delete(self._key(code))
+            except Exception:
+                self.backend_errors += 1
+
+    def stats(self) -> dict:
+        local = self.local.stats()
+        # Um hit no backend compartilhado conta como miss no LRU local
+        hits = local["hits"] + self.shared_hits
+        lookups = local["hits"] + local["misses"]
+        return {
+            **local,
+            "shared_hits": self.shared_hits,
+            "misses": lookups - hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "backend_errors": self.backend_errors
+        }
+
+
+def _build_backend() -> CacheBackend | None:
+    url = config("REDIRECT_CACHE_URL", default="")
+    if not url:
+        return None
+    if url == "memory://":
+        return InMemoryCacheBackend()
+    return RedisCacheBackend(url)
+
+
+redirect_cache = RedirectCache(
+    maxsize=config("REDIRECT_CACHE_SIZE", default=10000, cast=int),
+    ttl=config("REDIRECT_CACHE_TTL", default=300, cast=int),
+    backend=_build_backend(),
+    local_ttl=config("REDIRECT_CACHE_LOCAL_TTL", default=5, cast=float)
+)
@@ -0,0 +1,232 @@
+import hashlib
+import secrets
+import string
+import threading
+from decouple import config
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from app.db.models import CodeSequenceModel
+
+ALPHABET = string.ascii_lowercase + string.digits
+
+
+def encode_code(value: int, length: int) -> str:
+    """Inteiro em [0, 36^length) -> código de tamanho fixo no ALPHABET."""
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+class FeistelPermutation:
+    """Permutação bijetora e com chave de [0, domain).
+
+    Rede de Feistel balanceada sobre o menor número par de bits que cobre o
+    domínio, com cycle walking: valores cifrados fora do domínio são cifrados
+    de novo até cair nele, o que mantém a bijeção. Sem a chave, códigos
+    consecutivos do contador não revelam a ordem nem os vizinhos.
+    """
+
+    def __init__(self, key: bytes, domain: int, rounds: int = 4):
+        bits = max(2, (domain - 1).bit_length())
+        bits += bits % 2
+        self.domain = domain
+        self.half_bits = bits // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.rounds = rounds
+        # Uma chave por domínio: cada tamanho de código tem a sua permutação
+        self.key = hashlib.blake2b(key + domain.to_bytes(16, "big"), digest_size=32).digest()
+
+    def _round(self, index: int, value: int) -> int:
+        digest = hashlib.blake2b(value.to_bytes(8, "big") + bytes((index,)), key=self.key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.mask
+        for index in range(self.rounds):
+            left, right = right, left ^ self._round(index, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.domain:
+            raise ValueError("value out of domain")
+        value = self._encrypt(value)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+
+class CodeStrategy:
+    """Estratégia de geração de códigos curtos. Não consulta a tabela qr_codes:
+    colisões (raras) aparecem como IntegrityError no insert e são tratadas por
+    quem insere, chamando report_collisions()."""
+
+    name = "base"
+
+    def next_codes(self, count: int) -> list[str]:
+        raise NotImplementedError
+
+    def report_collisions(self, codes: list[str]):
+        pass
+
+    def stats(self) -> dict:
+        return {"strategy": self.name}
+
+
+class RandomCodeStrategy(CodeStrategy):
+    """Códigos aleatórios. Se a taxa de colisões passa de max_collision_rate
+    (o espaço de códigos está enchendo), passa a gerar códigos maiores."""
+
+    name = "random"
+
+    def __init__(self, length: int = 6, max_collision_rate: float = 0.01, window: int = 1000):
+        self.length = length
+        self.max_collision_rate = max_collision_rate
+        self.window = window
+        self._generated = 0
+        self._collisions = 0
+        self._lock = threading.Lock()
+        self.total_collisions = 0
+
+    def next_codes(self, count: int) -> list[str]:
+        with self._lock:
+            self._generated += count
+            length = self.length
+        return ["".join(secrets.choice(ALPHABET) for _ in range(length)) for _ in range(count)]
+
+    def report_collisions(self, codes: list[str]):
+        with self._lock:
+            self.total_collisions += len(codes)
+            # Colisões de códigos gerados antes do último crescimento não contam
+            self._collisions += sum(1 for code in codes if len(code) == self.length)
+            # Avalia a taxa a cada janela de códigos gerados
+            if self._generated >= self.window:
+                if self._collisions / self._generated > self.max_collision_rate:
+                    self.length += 1
+                self._generated = 0
+                self._collisions = 0
+
+    def stats(self) -> dict:
+        return {"strategy": self.name, "length": self.length, "collisions": self.total_collisions}
+
+
+class PermutedCounterStrategy(CodeStrategy):
+    """Contador reservado em blocos no banco (tabela code_sequences) e passado
+    por uma permutação com chave (FeistelPermutation).
+
+    Cada processo reserva block_size valores por vez com um único UPDATE
+    atômico, numa transação curta e separada; dentro do bloco os códigos saem
+    sem nenhuma query. Códigos do mesmo tamanho nunca se repetem; quando o
+    contador esgota o espaço de um tamanho, passa para o próximo. Colisões só
+    acontecem com códigos antigos gerados aleatoriamente.
+    """
+
+    name = "counter"
+
+    def __init__(self, engine: Engine, key: bytes, length: int = 6, block_size: int = 1000):
+        self.engine = engine
+        self.key = key
+        self.length = length
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._permutations = {}
+        self._lock = threading.Lock()
+        self.blocks_reserved = 0
+        self.total_collisions = 0
+
+    def _sequence_name(self, length: int) -> str:
+        return f"short_code:{length}"
+
+    def _permutation(self, length: int) -> FeistelPermutation:
+        permutation = self._permutations.get(length)
+        if permutation is None:
+            permutation = self._permutations[length] = FeistelPermutation(self.key, len(ALPHABET) ** length)
+        return permutation
+
+    def _reserve(self, length: int, size: int) -> int:
+        """Reserva [start, start + size) na sequência do tamanho e retorna start."""
+        table = CodeSequenceModel.__table__
+        name = self._sequence_name(length)
+        with self.engine.begin() as connection:
+            end = connection.execute(
+                update(table)
+                .where(table.c.name == name)
+                .values(next_value=table.c.next_value + size)
+                .returning(table.c.next_value)
+            ).scalar_one_or_none()
+            if end is not None:
+                return end - size
+
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(table).values(name=name, next_value=size))
+            return 0
+        except IntegrityError:
+            # Outro processo criou a sequência ao mesmo tempo
+            return self._reserve(length, size)
+
+    def _reserve_block(self):
+        capacity = len(ALPHABET) ** self.length
+        start = self._reserve(self.length, self.block_size)
+        while start >= capacity:
+            self.length += 1
+            capacity = len(ALPHABET) ** self.length
+            start = self._reserve(self.length, self.block_size)
+        self._next = start
+        self._end = min(start + self.block_size, capacity)
+        self.blocks_reserved += 1
+
+    def next_codes(self, count: int) -> list[str]:
+        codes = []
+        with self._lock:
+            while len(codes) < count:
+                if self._next >= self._end:
+                    self._reserve_block()
+                permutation = self._permutation(self.length)
+                take = min(count - len(codes), self._end - self._next)
+                codes.extend(
+                    encode_code(permutation.permute(value), self.length)
+                    for value in range(self._next, self._next + take)
+                )
+                self._next += take
+        return codes
+
+    def report_collisions(self, codes: list[str]):
+        with self._lock:
+            self.total_collisions += len(codes)
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.name,
+            "length": self.length,
+            "block_remaining": self._end - self._next,
+            "blocks_reserved": self.blocks_reserved,
+            "collisions": self.total_collisions
+        }
+
+
+def build_strategy(name: str) -> CodeStrategy:
+    length = config("CODE_LENGTH", default=6, cast=int)
+    if name == "random":
+        return RandomCodeStrategy(length)
+
+    from app.db.connection import DB_URL, engine_options
+
+    # Engine própria, com uma conexão: a reserva de bloco acontece com a sessão da
+    # request aberta e não pode disputar o pool das requests
+    options = engine_options(DB_URL)
+    if "pool_size" in options:
+        options.update(pool_size=1, max_overflow=0)
+    secret = config("CODE_ALLOCATOR_KEY", default="") or config("SECRET_KEY")
+    return PermutedCounterStrategy(
+        create_engine(DB_URL, **options),
+        key=secret.encode("utf-8"),
+        length=length,
+        block_size=config("CODE_BLOCK_SIZE", default=1000, cast=int)
+    )
+
+
+code_allocator = build_strategy(config("CODE_ALLOCATOR", default="counter"))
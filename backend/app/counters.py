@@ -0,0 +1,91 @@
+from sqlalchemy import case, func, select, update
+from sqlalchemy.engine import Connection
+from app.db.models import QRCodeModel, ScanAnalyticsModel
+
+
+def apply_scan_counters(connection: Connection, rows: list[dict]):
+    """Soma um lote de scans em qr_codes.scan_count e avança last_scanned_at.
+
+    Roda na mesma transação do insert dos scans, com um único UPDATE por QR
+    Code do lote (scan_count = scan_count + n), em ordem de id para que
+    workers concorrentes travem as linhas sempre na mesma ordem.
+    """
+    if not rows:
+        return
+
+    batch = {}
+    for row in rows:
+        count, last = batch.get(row["qr_code_id"], (0, None))
+        if last is None or row["scanned_at"] > last:
+            last = row["scanned_at"]
+        batch[row["qr_code_id"]] = (count + 1, last)
+
+    table = QRCodeModel.__table__
+    for qr_code_id, (count, last) in sorted(batch.items()):
+        connection.execute(
+            update(table)
+            .where(table.c.id == qr_code_id)
+            .values(
+                scan_count=table.c.scan_count + count,
+                last_scanned_at=case(
+                    (table.c.last_scanned_at.is_(None), last),
+                    (table.c.last_scanned_at < last, last),
+                    else_=table.c.last_scanned_at
+                )
+            )
+        )
+
+
+def counter_drift(connection: Connection, qr_code_id: int = None) -> list[dict]:
+    """QR Codes cujos contadores divergem de scan_analytics."""
+    scans = (
+        select(
+            ScanAnalyticsModel.qr_code_id,
+            func.count().label("scan_count"),
+            func.max(ScanAnalyticsModel.scanned_at).label("last_scanned_at")
+        )
+        .where(ScanAnalyticsModel.suppressed.is_(None))
+        .group_by(ScanAnalyticsModel.qr_code_id)
+        .subquery()
+    )
+    actual_count = func.coalesce(scans.c.scan_count, 0)
+    stmt = (
+        select(
+            QRCodeModel.id,
+            QRCodeModel.code,
+            QRCodeModel.scan_count,
+            actual_count.label("actual_scan_count"),
+            QRCodeModel.last_scanned_at,
+            scans.c.last_scanned_at.label("actual_last_scanned_at")
+        )
+        .outerjoin(scans, scans.c.qr_code_id == QRCodeModel.id)
+        .where(
+            (QRCodeModel.scan_count != actual_count)
+            | QRCodeModel.last_scanned_at.is_distinct_from(scans.c.last_scanned_at)
+        )
+        .order_by(QRCodeModel.id)
+    )
+    if qr_code_id is not None:
+        stmt = stmt.where(QRCodeModel.id == qr_code_id)
+    return [dict(row) for row in connection.execute(stmt).mappings()]
+
+
+def reconcile_scan_counters(connection: Connection, qr_code_id: int = None, fix: bool = False) -> list[dict]:
+    """Detecta (e, com fix=True, corrige) a divergência entre os contadores
+    de qr_codes e scan_analytics. Retorna os QR Codes divergentes."""
+    drift = counter_drift(connection, qr_code_id)
+    if fix and drift:
+        # Recalcula no próprio UPDATE (subqueries correlacionadas) em vez de gravar
+        # os valores lidos acima, que podem ter mudado com scans novos
+        table = QRCodeModel.__table__
+        scans = ScanAnalyticsModel.__table__
+        counted = (scans.c.qr_code_id == table.c.id, scans.c.suppressed.is_(None))
+        connection.execute(
+            update(table)
+            .where(table.c.id.in_([row["id"] for row in drift]))
+            .values(
+                scan_count=select(func.count()).where(*counted).scalar_subquery(),
+                last_scanned_at=select(func.max(scans.c.scanned_at)).where(*counted).scalar_subquery()
+            )
+        )
+    return drift
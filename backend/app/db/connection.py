@@ -1,8 +1,43 @@
 from decouple import config
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 DB_URL = config("DB_URL")
 
-engine = create_engine(DB_URL, pool_pre_ping=True)
-Session = sessionmaker(bind=engine)
\ No newline at end of file
+# Pool de conexões (os valores de tamanho são ignorados no SQLite)
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=5, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=10, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=1800, cast=int)
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=True, cast=bool)
+
+# Engine async (asyncpg/aiosqlite) usada pelas rotas de redirect e analytics
+DB_ASYNC = config("DB_ASYNC", default=False, cast=bool)
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def async_url(url: str) -> str:
+    """Troca o driver da URL síncrona pelo equivalente async (ex: psycopg2 -> asyncpg)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+engine = create_engine(DB_URL, **engine_options(DB_URL))
+Session = sessionmaker(bind=engine)
+
+DB_ASYNC_URL = config("DB_ASYNC_URL", default="") or async_url(DB_URL)
+
+# Só cria a engine async quando habilitada, para não exigir o driver async instalado
+async_engine = create_async_engine(DB_ASYNC_URL, **engine_options(DB_ASYNC_URL)) if DB_ASYNC else None
+AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
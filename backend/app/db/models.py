@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, DateTime, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
@@ -17,6 +17,9 @@ class UserModel(Base):
 
 class QRCodeModel(Base):
     __tablename__ = "qr_codes"
+    __table_args__ = (
+        Index("ix_qr_codes_user_id_created_at", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String, unique=True, index=True, nullable=False)  # código curto (ex: xyz123)
@@ -24,6 +27,10 @@ class QRCodeModel(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
+    # Contadores desnormalizados, atualizados junto com o insert dos scans (app/counters.py)
+    scan_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_scanned_at = Column(DateTime)
+    
     # Relacionamentos
     owner = relationship("UserModel", back_populates="qr_codes")
     scans = relationship("ScanAnalyticsModel", back_populates="qr_code", cascade="all, delete-orphan")
@@ -31,7 +38,11 @@ class QRCodeModel(Base):
 
 class ScanAnalyticsModel(Base):
     __tablename__ = "scan_analytics"
+    __table_args__ = (
+        Index("ix_scan_analytics_qr_code_id_scanned_at", "qr_code_id", "scanned_at"),
+    )
     
+    # No PostgreSQL a tabela é particionada por mês e a chave primária é (id, scanned_at)
     id = Column(Integer, primary_key=True, index=True)
     qr_code_id = Column(Integer, ForeignKey("qr_codes.id"), nullable=False)
     
@@ -54,7 +65,56 @@ class ScanAnalyticsModel(Base):
     timezone = Column(String)
     isp = Column(String)
     
+    # Motivo do filtro (bot, preview, duplicate); NULL para scans válidos
+    suppressed = Column(String)
+    
     scanned_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relacionamento
-    qr_code = relationship("QRCodeModel", back_populates="scans")
\ No newline at end of file
+    qr_code = relationship("QRCodeModel", back_populates="scans")
+
+class ScanRollupModel(Base):
+    __tablename__ = "scan_rollups"
+    __table_args__ = (
+        UniqueConstraint("qr_code_id", "granularity", "bucket_start", "dimension", "parent", "value", name="uq_scan_rollups_bucket_value"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    qr_code_id = Column(Integer, ForeignKey("qr_codes.id", ondelete="CASCADE"), nullable=False)
+    granularity = Column(String, nullable=False)  # hour, day ou total
+    bucket_start = Column(DateTime, nullable=False)
+    dimension = Column(String, nullable=False)  # browser, os, device, country, city
+    parent = Column(String, nullable=False, default="")  # país, para a dimensão city
+    value = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ScanBucketModel(Base):
+    __tablename__ = "scan_buckets"
+    __table_args__ = (
+        UniqueConstraint("qr_code_id", "granularity", "bucket_start", name="uq_scan_buckets_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    qr_code_id = Column(Integer, ForeignKey("qr_codes.id", ondelete="CASCADE"), nullable=False)
+    granularity = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    scans = Column(Integer, nullable=False, default=0)
+    visitors_sketch = Column(LargeBinary)  # HyperLogLog dos IPs (app/hll.py)
+
+
+class CodeSequenceModel(Base):
+    __tablename__ = "code_sequences"
+    
+    # Contadores reservados em blocos pelo alocador de códigos curtos (app/code_allocator.py)
+    name = Column(String, primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=0)
+
+
+class ScanRetentionModel(Base):
+    __tablename__ = "scan_retention"
+    
+    # Scans anteriores a retained_since foram removidos pela retenção (app/partitions.py):
+    # scan_count e os rollups mais antigos não podem mais ser recalculados a partir deles
+    name = Column(String, primary_key=True)
+    retained_since = Column(DateTime, nullable=False)
@@ -1,14 +1,24 @@
+from typing import NamedTuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncDBSession
 from sqlalchemy.orm import Session as DBSession
-from app.db.connection import Session
+from app.db.connection import AsyncSession, Session
 from app.db.models import UserModel
+from app.cache import LRUCache
 from decouple import config
 
 SECRET_KEY = config("SECRET_KEY")
 ALGORITHM = config("ALGORITHM")
 
+# Usuários autenticados ficam em cache por id (claim uid do token); 0 desliga
+AUTH_CACHE_TTL = config("AUTH_CACHE_TTL", default=60, cast=float)
+AUTH_CACHE_SIZE = config("AUTH_CACHE_SIZE", default=10000, cast=int)
+# Nas rotas só de leitura, confia nas claims do token (assinado) sem ir ao banco
+AUTH_TRUST_CLAIMS = config("AUTH_TRUST_CLAIMS", default=False, cast=bool)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
 def get_db_session():
@@ -18,7 +28,32 @@ def get_db_session():
     finally:
         session.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db_session: DBSession = Depends(get_db_session)):
+async def get_async_db_session():
+    async with AsyncSession() as session:
+        yield session
+
+class Principal(NamedTuple):
+    """Usuário autenticado, desacoplado da sessão do banco (pode ficar em cache)."""
+    id: int
+    username: str
+    email: str | None = None
+
+
+principal_cache = LRUCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+
+def invalidate_principal(user_id: int):
+    principal_cache.delete(user_id)
+
+
+@event.listens_for(UserModel, "after_update")
+@event.listens_for(UserModel, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    # Alterações feitas em outros processos só aparecem depois do TTL
+    invalidate_principal(target.id)
+
+
+def _token_claims(token: str) -> tuple[str, int | None]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -28,13 +63,66 @@ def get_current_user(token: str = Depends(oauth2_scheme), db_session: DBSession
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        user_id = payload.get("uid")
+        if username is None or (user_id is not None and not isinstance(user_id, int)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db_session.query(UserModel).filter(UserModel.username == username).first()
+    return username, user_id
+
+def _user_stmt(username: str, user_id: int | None):
+    # Tokens antigos não têm uid: busca pelo username
+    if user_id is None:
+        return select(UserModel).where(UserModel.username == username)
+    return select(UserModel).where(UserModel.id == user_id, UserModel.username == username)
+
+def _cached_principal(username: str, user_id: int | None) -> Principal | None:
+    if user_id is None or not AUTH_CACHE_TTL:
+        return None
+    principal = principal_cache.get(user_id)
+    if principal is not None and principal.username == username:
+        return principal
+    return None
+
+def _check_user(user: UserModel | None) -> Principal:
     if user is None:
-        raise credentials_exception
-    
-    return user
\ No newline at end of file
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    principal = Principal(user.id, user.username, user.email)
+    if AUTH_CACHE_TTL:
+        principal_cache.set(user.id, principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db_session: DBSession = Depends(get_db_session)) -> Principal:
+    username, user_id = _token_claims(token)
+    principal = _cached_principal(username, user_id)
+    if principal is not None:
+        return principal
+    user = db_session.execute(_user_stmt(username, user_id)).scalars().first()
+    return _check_user(user)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db_session: AsyncDBSession = Depends(get_async_db_session)) -> Principal:
+    username, user_id = _token_claims(token)
+    principal = _cached_principal(username, user_id)
+    if principal is not None:
+        return principal
+    result = await db_session.execute(_user_stmt(username, user_id))
+    return _check_user(result.scalars().first())
+
+def _trusted_principal(token: str) -> Principal | None:
+    # Token válido até expirar, mesmo que o usuário seja removido nesse meio tempo
+    if not AUTH_TRUST_CLAIMS:
+        return None
+    username, user_id = _token_claims(token)
+    return Principal(user_id, username) if user_id is not None else None
+
+def get_reader(token: str = Depends(oauth2_scheme), db_session: DBSession = Depends(get_db_session)) -> Principal:
+    """Usuário das rotas só de leitura: com AUTH_TRUST_CLAIMS, vem direto do token."""
+    return _trusted_principal(token) or get_current_user(token, db_session)
+
+async def get_reader_async(token: str = Depends(oauth2_scheme), db_session: AsyncDBSession = Depends(get_async_db_session)) -> Principal:
+    return _trusted_principal(token) or await get_current_user_async(token, db_session)
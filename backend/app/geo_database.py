@@ -0,0 +1,135 @@
+import csv
+import mmap
+import socket
+import struct
+from app.geolocation import GEO_FIELDS, GeoProvider
+
+# Formato do arquivo (inteiros big-endian):
+#   header:   magic (8 bytes) | count (uint32) | strings_offset (uint32)
+#   starts:   count x 16 bytes   início de cada faixa, ordenado
+#   ends:     count x 16 bytes   fim (inclusivo) de cada faixa
+#   records:  count x uint32     offset da localização na área de strings
+#   strings:  uint16 len + campos UTF-8 separados por \x1f (deduplicados)
+# IPv4 é gravado como IPv4-mapped IPv6, então todas as chaves têm 16 bytes e
+# a comparação de bytes equivale à comparação numérica.
+MAGIC = b"QRGEO\x00\x00\x01"
+HEADER = struct.Struct(">8sII")
+KEY_SIZE = 16
+FIELD_SEP = "\x1f"
+IPV4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+
+
+def ip_key(ip_address: str) -> bytes:
+    try:
+        return IPV4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, ip_address)
+    except OSError:
+        pass
+    try:
+        return socket.inet_pton(socket.AF_INET6, ip_address)
+    except OSError:
+        raise ValueError(f"Invalid IP address: {ip_address}") from None
+
+
+def build_database(csv_path: str, output_path: str) -> int:
+    """Compila um CSV de faixas de IP no índice binário lido pelo OfflineGeoProvider.
+
+    Colunas esperadas: start_ip, end_ip, country, city, latitude, longitude, timezone, isp
+    """
+    ranges = []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            start, end = ip_key(row["start_ip"]), ip_key(row["end_ip"])
+            if start > end:
+                raise ValueError(f"Invalid range: {row['start_ip']} - {row['end_ip']}")
+            location = FIELD_SEP.join((row.get(field) or "") for field in GEO_FIELDS)
+            ranges.append((start, end, location))
+
+    ranges.sort(key=lambda r: r[0])
+    for previous, current in zip(ranges, ranges[1:]):
+        if current[0] <= previous[1]:
+            raise ValueError("Overlapping IP ranges in dataset")
+
+    strings = bytearray()
+    offsets = {}
+    records = []
+    for _, _, location in ranges:
+        if location not in offsets:
+            encoded = location.encode("utf-8")
+            offsets[location] = len(strings)
+            strings += struct.pack(">H", len(encoded)) + encoded
+        records.append(offsets[location])
+
+    count = len(ranges)
+    strings_offset = HEADER.size + count * (2 * KEY_SIZE + 4)
+
+    with open(output_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, count, strings_offset))
+        for start, _, _ in ranges:
+            f.write(start)
+        for _, end, _ in ranges:
+            f.write(end)
+        f.write(struct.pack(f">{count}I", *records))
+        f.write(strings)
+
+    return count
+
+
+class OfflineGeoProvider(GeoProvider):
+    """Geolocalização a partir do índice local, via mmap e busca binária.
+
+    O arquivo é mapeado somente leitura, então as páginas ficam no page cache
+    e são compartilhadas entre todos os workers.
+    """
+
+    name = "offline"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, self._strings_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a QRTrack geolocation database")
+
+        self._starts = HEADER.size
+        self._ends = self._starts + self.count * KEY_SIZE
+        self._records = self._ends + self.count * KEY_SIZE
+
+    def _find(self, key: bytes) -> int:
+        # Última faixa cujo início é <= key
+        mm, base = self._mm, self._starts
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = base + mid * KEY_SIZE
+            if mm[offset:offset + KEY_SIZE] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def lookup(self, ip_address: str) -> dict:
+        try:
+            key = ip_key(ip_address)
+        except ValueError:
+            return {}
+
+        index = self._find(key)
+        if index < 0:
+            return {}
+
+        end_offset = self._ends + index * KEY_SIZE
+        if key > self._mm[end_offset:end_offset + KEY_SIZE]:
+            return {}
+
+        (location_offset,) = struct.unpack_from(">I", self._mm, self._records + index * 4)
+        offset = self._strings_offset + location_offset
+        (length,) = struct.unpack_from(">H", self._mm, offset)
+        values = self._mm[offset + 2:offset + 2 + length].decode("utf-8").split(FIELD_SEP)
+
+        return {field: value or None for field, value in zip(GEO_FIELDS, values)}
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
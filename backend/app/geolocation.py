@@ -0,0 +1,261 @@
+import threading
+import time
+from decouple import config
+from app.cache import LRUCache
+
+_MISSING = object()
+
+# Colunas de scan_analytics preenchidas pela geolocalização
+GEO_FIELDS = ("country", "city", "latitude", "longitude", "timezone", "isp")
+
+
+class GeoLookupError(Exception):
+    """Falha do provedor (timeout, erro HTTP, limite de requisições...)."""
+
+
+class GeoProvider:
+    """Interface dos provedores de geolocalização.
+
+    lookup() retorna um dict com as chaves de GEO_FIELDS, {} quando o IP não é
+    encontrado, e levanta GeoLookupError quando o provedor falha.
+    """
+
+    name = "base"
+
+    def lookup(self, ip_address: str) -> dict:
+        raise NotImplementedError
+
+
+class NullGeoProvider(GeoProvider):
+    name = "none"
+
+    def lookup(self, ip_address: str) -> dict:
+        return {}
+
+
+class StaticGeoProvider(GeoProvider):
+    """Provedor local com respostas fixas, para desenvolvimento e testes."""
+
+    name = "static"
+
+    def __init__(self, results: dict | None = None, default: dict | None = None, delay: float = 0.0):
+        self.results = results or {}
+        self.default = default or {}
+        self.delay = delay
+        self.calls = 0
+
+    def lookup(self, ip_address: str) -> dict:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        result = self.results.get(ip_address, self.default)
+        if isinstance(result, Exception):
+            raise result
+        return dict(result)
+
+
+class IPGeolocationProvider(GeoProvider):
+    name = "ipgeolocation"
+    url = "https://api.ipgeolocation.io/ipgeo"
+
+    def __init__(self, api_key: str, timeout: float = 2.0, connect_timeout: float = 0.5, pool_size: int = 10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_key = api_key
+        self.timeout = (connect_timeout, timeout)
+        self._requests = requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+
+    def lookup(self, ip_address: str) -> dict:
+        # Se for localhost, usa um IP público brasileiro para teste
+        if ip_address in ["127.0.0.1", "::1", "localhost"]:
+            ip_address = "200.98.196.114"
+
+        try:
+            response = self.session.get(
+                self.url,
+                params={"apiKey": self.api_key, "ip": ip_address},
+                timeout=self.timeout
+            )
+        except self._requests.RequestException as e:
+            raise GeoLookupError(str(e)) from e
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise GeoLookupError(f"ipgeolocation.io returned {response.status_code}")
+        if response.status_code != 200:
+            return {}
+
+        data = response.json()
+        return {
+            "country": data.get("country_name"),
+            "city": data.get("city"),
+            "latitude": data.get("latitude"),
+            "longitude": data.get("longitude"),
+            "timezone": (data.get("time_zone") or {}).get("name"),
+            "isp": data.get("isp")
+        }
+
+
+class CircuitBreaker:
+    """Abre após failure_threshold falhas seguidas; depois de reset_timeout
+    segundos deixa passar uma chamada de teste (half-open)."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class _InflightLookup:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = {}
+
+
+class GeolocationService:
+    """Geolocalização com cache por IP (inclusive negativo), coalescência de
+    consultas simultâneas ao mesmo IP e circuit breaker em volta do provedor."""
+
+    def __init__(
+        self,
+        provider: GeoProvider,
+        cache_size: int = 50000,
+        ttl: float = 86400,
+        negative_ttl: float = 300,
+        breaker: CircuitBreaker | None = None,
+        wait_timeout: float = 5.0
+    ):
+        self.provider = provider
+        self.cache = LRUCache(maxsize=cache_size, ttl=ttl)
+        self.negative_ttl = negative_ttl
+        self.breaker = breaker or CircuitBreaker()
+        self.wait_timeout = wait_timeout
+
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.provider_calls = 0
+        self.provider_errors = 0
+        self.coalesced = 0
+        self.short_circuited = 0
+
+    def lookup(self, ip_address: str) -> dict:
+        cached = self.cache.get(ip_address, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        with self._lock:
+            call = self._inflight.get(ip_address)
+            leader = call is None
+            if leader:
+                call = self._inflight[ip_address] = _InflightLookup()
+
+        if not leader:
+            self.coalesced += 1
+            call.event.wait(self.wait_timeout)
+            return call.result
+
+        try:
+            call.result = self._fetch(ip_address)
+        finally:
+            call.event.set()
+            with self._lock:
+                del self._inflight[ip_address]
+
+        return call.result
+
+    def _fetch(self, ip_address: str) -> dict:
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            return {}
+
+        self.provider_calls += 1
+        try:
+            result = self.provider.lookup(ip_address)
+        except Exception:
+            self.provider_errors += 1
+            self.breaker.record_failure()
+            self.cache.set(ip_address, {}, ttl=self.negative_ttl)
+            return {}
+
+        self.breaker.record_success()
+        self.cache.set(ip_address, result, ttl=None if result else self.negative_ttl)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider.name,
+            "cache": self.cache.stats(),
+            "provider_calls": self.provider_calls,
+            "provider_errors": self.provider_errors,
+            "coalesced": self.coalesced,
+            "short_circuited": self.short_circuited,
+            "breaker_state": self.breaker.state
+        }
+
+
+def build_provider(name: str) -> GeoProvider:
+    api_key = config("IPGEOLOCATION_API_KEY", default="")
+
+    if name == "ipgeolocation" and api_key:
+        return IPGeolocationProvider(
+            api_key,
+            timeout=config("GEO_TIMEOUT", default=2.0, cast=float),
+            connect_timeout=config("GEO_CONNECT_TIMEOUT", default=0.5, cast=float),
+            pool_size=config("GEO_POOL_SIZE", default=10, cast=int)
+        )
+    if name == "offline":
+        from app.geo_database import OfflineGeoProvider
+        return OfflineGeoProvider(config("GEO_DATABASE_PATH", default="geo.db"))
+    if name == "static":
+        return StaticGeoProvider()
+    return NullGeoProvider()
+
+
+geolocation = GeolocationService(
+    build_provider(config("GEO_PROVIDER", default="ipgeolocation")),
+    cache_size=config("GEO_CACHE_SIZE", default=50000, cast=int),
+    ttl=config("GEO_CACHE_TTL", default=86400, cast=int),
+    negative_ttl=config("GEO_NEGATIVE_TTL", default=300, cast=int),
+    breaker=CircuitBreaker(
+        failure_threshold=config("GEO_BREAKER_THRESHOLD", default=5, cast=int),
+        reset_timeout=config("GEO_BREAKER_RESET", default=30.0, cast=float)
+    )
+)
@@ -0,0 +1,300 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from decouple import config
+from app.db.connection import engine
+from app.live import live_hub
+from app.qr_code_use_cases import QRCodeUseCases
+from app.scan_writer import ScanBatchWriter
+
+POLICIES = ("drop", "block", "spill")
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@dataclass
+class ScanEvent:
+    qr_code_id: int
+    ip_address: str
+    user_agent: str
+    scanned_at: datetime
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["scanned_at"] = self.scanned_at.isoformat()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, line: str) -> "ScanEvent":
+        data = json.loads(line)
+        data["scanned_at"] = datetime.fromisoformat(data["scanned_at"])
+        return cls(**data)
+
+
+class ScanIngestion:
+    """Fila limitada em memória entre o redirect e a gravação dos scans.
+
+    O handler do /r/{code} apenas enfileira um ScanEvent; threads de background
+    fazem o enriquecimento (user agent, geolocalização) e a persistência.
+    Quando a fila enche, a política define o que acontece com o evento:
+    - drop: descarta o evento
+    - block: espera até block_timeout segundos por espaço, depois descarta
+    - spill: grava o evento em disco (JSON lines) para ser reprocessado depois
+    """
+
+    def __init__(
+        self,
+        handler,
+        on_idle=None,
+        on_stop=None,
+        maxsize: int = 10000,
+        policy: str = "drop",
+        block_timeout: float = 1.0,
+        spill_path: str | None = None,
+        workers: int = 1,
+        idle_interval: float = 0.5
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid backpressure policy: {policy}")
+        if policy == "spill" and not spill_path:
+            raise ValueError("spill policy requires a spill_path")
+
+        self.handler = handler
+        self.on_idle = on_idle
+        self.on_stop = on_stop
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        self.workers = workers
+        self.idle_interval = idle_interval
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.running = False
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.spill_errors = 0
+        self.worker_errors = 0
+        self.max_depth = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(i,), name=f"scan-ingestion-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """Para de aceitar eventos e espera os workers drenarem a fila."""
+        if not self.running:
+            return
+        self.running = False
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.on_stop is not None:
+            self.on_stop()
+
+    def submit(self, event: ScanEvent) -> bool:
+        """Enfileira o evento. Retorna False se o pipeline não estiver rodando,
+        caso em que quem chamou deve gravar o scan de forma síncrona."""
+        if not self.running:
+            return False
+
+        try:
+            if self.policy == "block":
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            if self.policy == "spill":
+                self._spill(event)
+            else:
+                self._count("dropped")
+            return True
+
+        with self._stats_lock:
+            self.enqueued += 1
+            depth = self._queue.qsize()
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+
+    def _count(self, name: str, n: int = 1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _spill(self, event: ScanEvent):
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(event.to_json() + "\n")
+        self._count("spilled")
+
+    def _replay_name(self, worker: int) -> str:
+        return f"{self.spill_path}.replay.{os.getpid()}-{worker}"
+
+    def _claim_spill(self, worker: int) -> str | None:
+        """Move para um nome exclusivo do worker o arquivo a reprocessar: o que
+        sobrou de uma execução interrompida (de um processo que já terminou) ou
+        o spill atual. os.replace é atômico, então só um worker fica com cada arquivo."""
+        replay_path = self._replay_name(worker)
+        if os.path.exists(replay_path):
+            return replay_path
+
+        for orphan in glob.glob(glob.escape(self.spill_path) + ".replay*"):
+            owner = orphan.rsplit(".replay", 1)[1].lstrip(".").split("-")[0]
+            if owner.isdigit() and (int(owner) == os.getpid() or _pid_alive(int(owner))):
+                continue
+            try:
+                os.replace(orphan, replay_path)
+                return replay_path
+            except OSError:
+                continue
+
+        with self._spill_lock:
+            try:
+                os.replace(self.spill_path, replay_path)
+            except OSError:
+                return None
+        return replay_path
+
+    def _replay_spill(self, worker: int = 0):
+        if not self.spill_path:
+            return
+        replay_path = self._claim_spill(worker)
+        if replay_path is None:
+            return
+
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = ScanEvent.from_json(line)
+                except (ValueError, TypeError, KeyError):
+                    # Linha corrompida (ex: gravação interrompida): descarta só ela
+                    self._count("spill_errors")
+                    continue
+                self._handle(event)
+                self._count("replayed")
+        os.remove(replay_path)
+
+    def _handle(self, event: ScanEvent):
+        try:
+            self.handler(event)
+            self._count("processed")
+        except Exception:
+            self._count("failed")
+
+    def _run(self, worker: int = 0):
+        idle = True
+        while True:
+            # Um erro inesperado não pode matar o worker: a fila ficaria sem consumidor
+            try:
+                if idle:
+                    self._replay_spill(worker)
+                    if self.on_idle is not None:
+                        self.on_idle()
+                try:
+                    event = self._queue.get(timeout=self.idle_interval)
+                except queue.Empty:
+                    idle = True
+                    continue
+
+                idle = False
+                if event is _STOP:
+                    return
+                self._handle(event)
+            except Exception:
+                self._count("worker_errors")
+                logger.exception("scan ingestion worker %s failed", worker)
+                idle = False
+
+    def load(self) -> float:
+        """Fração ocupada da fila (0 a 1)."""
+        return self._queue.qsize() / self.maxsize if self.maxsize > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "policy": self.policy,
+            "depth": self._queue.qsize(),
+            "capacity": self.maxsize,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "spill_errors": self.spill_errors,
+            "worker_errors": self.worker_errors
+        }
+
+
+scan_writer = ScanBatchWriter(
+    engine,
+    batch_size=config("SCAN_BATCH_SIZE", default=500, cast=int),
+    flush_interval=config("SCAN_FLUSH_INTERVAL", default=1.0, cast=float),
+    fallback_path=config("SCAN_WRITER_FALLBACK_PATH", default="scan_writer_pending.jsonl"),
+    dead_letter_path=config("SCAN_WRITER_DEAD_LETTER_PATH", default="scan_writer_dead.jsonl"),
+    max_pending=config("SCAN_WRITER_MAX_PENDING", default=50000, cast=int),
+    max_backoff=config("SCAN_WRITER_MAX_BACKOFF", default=30.0, cast=float)
+)
+
+
+def enrich_scan_event(event: ScanEvent):
+    uc = QRCodeUseCases(db_session=None)
+    row = uc.enrich_scan(
+        event.qr_code_id,
+        event.ip_address,
+        event.user_agent,
+        event.scanned_at
+    )
+    if row is None:
+        return
+    scan_writer.add(row)
+    # Os dashboards recebem o scan já enriquecido, antes do flush do lote
+    if not row["suppressed"]:
+        live_hub.publish(row)
+
+
+scan_ingestion = ScanIngestion(
+    handler=enrich_scan_event,
+    on_idle=scan_writer.flush_if_due,
+    on_stop=scan_writer.close,
+    maxsize=config("SCAN_QUEUE_SIZE", default=10000, cast=int),
+    policy=config("SCAN_QUEUE_POLICY", default="drop"),
+    block_timeout=config("SCAN_QUEUE_BLOCK_TIMEOUT", default=1.0, cast=float),
+    spill_path=config("SCAN_SPILL_PATH", default="scan_spill.jsonl"),
+    workers=config("SCAN_WORKERS", default=1, cast=int)
+)
@@ -0,0 +1,311 @@
+import asyncio
+import calendar
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decouple import config
+from fastapi.concurrency import run_in_threadpool
+
+LIVE_BUFFER_SIZE = config("LIVE_BUFFER_SIZE", default=100, cast=int)
+LIVE_MAX_SUBSCRIBERS = config("LIVE_MAX_SUBSCRIBERS", default=10000, cast=int)
+LIVE_WINDOW_MINUTES = config("LIVE_WINDOW_MINUTES", default=60, cast=int)
+LIVE_COUNTER_CODES = config("LIVE_COUNTER_CODES", default=100000, cast=int)
+# Tempo (s) que um dashboard pode ficar com o buffer cheio antes de ser desconectado
+LIVE_SLOW_TIMEOUT = config("LIVE_SLOW_TIMEOUT", default=5, cast=float)
+
+# Campos do scan enviados aos dashboards (sem IP nem user agent completo)
+LIVE_FIELDS = ("qr_code_id", "browser", "os", "device", "country", "city")
+
+
+def live_event(row: dict) -> dict:
+    event = {field: row.get(field) for field in LIVE_FIELDS}
+    scanned_at = row.get("scanned_at") or datetime.utcnow()
+    event["scanned_at"] = scanned_at.isoformat() if isinstance(scanned_at, datetime) else scanned_at
+    return event
+
+
+class LiveBroker:
+    """Distribui os scans entre os workers. Quem publica não entrega direto ao
+    hub: o broker entrega a todos os processos inscritos, inclusive o próprio."""
+
+    # publish() faz I/O de rede: no event loop, vai para o threadpool
+    blocking = True
+
+    def start(self, deliver):
+        raise NotImplementedError
+
+    def publish(self, event: dict):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class LocalBroker(LiveBroker):
+    """Substituto em memória, para um único worker (e desenvolvimento)."""
+
+    blocking = False
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, event: dict):
+        if self._deliver is not None:
+            self._deliver(event)
+
+    def stop(self):
+        self._deliver = None
+
+
+class RedisBroker(LiveBroker):
+    def __init__(self, url: str, channel: str = "qrtrack:live"):
+        import redis
+
+        # O publish tem timeout curto; a inscrição fica numa conexão à parte,
+        # sem socket_timeout, porque passa a maior parte do tempo ociosa
+        self.client = redis.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.5)
+        self.subscriber = redis.Redis.from_url(url, socket_connect_timeout=0.5)
+        self.channel = channel
+        self._pubsub = None
+        self._thread = None
+
+    def start(self, deliver):
+        def handle(message):
+            deliver(json.loads(message["data"]))
+
+        self._pubsub = self.subscriber.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: handle})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, event: dict):
+        self.client.publish(self.channel, json.dumps(event))
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+
+class Subscription:
+    """Buffer limitado de um dashboard. Com o buffer cheio os scans novos são
+    descartados (dropped); se o consumidor continuar sem acompanhar, a inscrição
+    é encerrada (evicted) em vez de crescer ou segurar o publish."""
+
+    def __init__(self, topics: set[int], maxsize: int):
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize)
+        self.active = True
+        self.evicted = False
+        self.dropped = 0
+        self.lagging_since = None
+
+    def _close(self, evicted: bool = False):
+        self.evicted = evicted
+        # Libera espaço para o aviso de encerramento
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> dict | None:
+        """Próximo scan; None quando a inscrição foi encerrada. Levanta
+        TimeoutError se nada chegar em timeout segundos."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class MinuteCounters:
+    """Scans por minuto de cada QR Code nos últimos window minutos, para no
+    máximo max_topics QR Codes (os que receberam scans há mais tempo saem).
+    Só é usado no event loop, sem lock."""
+
+    def __init__(self, window: int, max_topics: int = 100000):
+        self.window = window
+        self.max_topics = max_topics
+        self._counts = OrderedDict()
+
+    def add(self, topic: int, minute: int):
+        buckets = self._counts.get(topic)
+        if buckets is None:
+            buckets = self._counts[topic] = {}
+            if len(self._counts) > self.max_topics:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(topic)
+        buckets[minute] = buckets.get(minute, 0) + 1
+        if len(buckets) > self.window:
+            for old in [m for m in buckets if m <= minute - self.window]:
+                del buckets[old]
+
+    def snapshot(self, topics: set[int], now: float = None) -> list[dict]:
+        current = int((now or time.time()) // 60)
+        totals = [0] * self.window
+        for topic in topics:
+            for minute, count in self._counts.get(topic, {}).items():
+                age = current - minute
+                if 0 <= age < self.window:
+                    totals[self.window - 1 - age] += count
+        first = current - self.window + 1
+        return [
+            {"minute": datetime.utcfromtimestamp((first + i) * 60).isoformat(), "scans": count}
+            for i, count in enumerate(totals)
+        ]
+
+
+class LiveHub:
+    """Pub/sub em processo dos scans para os dashboards (SSE/WebSocket).
+
+    publish() pode ser chamado de qualquer thread (fila de ingestão, threadpool)
+    e é barato quando ninguém está inscrito. A entrega acontece no event loop:
+    um call_soon_threadsafe por scan, e o fan-out para as inscrições roda lá.
+    Nenhum dashboard consulta o banco depois de conectar.
+    """
+
+    def __init__(self, broker: LiveBroker, buffer_size: int = 100, max_subscribers: int = 10000,
+                 window: int = 60, counter_codes: int = 100000, slow_timeout: float = 5):
+        self.broker = broker
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.slow_timeout = slow_timeout
+        self.counters = MinuteCounters(window, counter_codes)
+        self._loop = None
+        self._subscribers = {}  # topic -> set de Subscription
+        self._count = 0
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.evictions = 0
+        self.publish_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self.broker.start(self._receive)
+
+    def stop(self):
+        self.broker.stop()
+        loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        subscriptions = {s for topic_subscriptions in self._subscribers.values() for s in topic_subscriptions}
+        for subscription in subscriptions:
+            self.unsubscribe(subscription)
+            subscription._close()
+
+    def publish(self, row: dict):
+        if self._loop is None:
+            return
+        self.published += 1
+        try:
+            self.broker.publish(live_event(row))
+        except Exception:
+            # O live feed nunca pode atrapalhar a gravação do scan
+            self.publish_errors += 1
+
+    async def apublish(self, row: dict):
+        """publish() para o event loop."""
+        if self._loop is None:
+            return
+        if self.broker.blocking:
+            await run_in_threadpool(self.publish, row)
+        else:
+            self.publish(row)
+
+    def _receive(self, event: dict):
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._dispatch, event)
+            except RuntimeError:
+                # Loop já encerrado
+                pass
+
+    def _dispatch(self, event: dict):
+        topic = event["qr_code_id"]
+        # scanned_at é UTC (datetime.utcnow)
+        scanned_at = datetime.fromisoformat(event["scanned_at"])
+        self.counters.add(topic, calendar.timegm(scanned_at.utctimetuple()) // 60)
+        for subscription in list(self._subscribers.get(topic, ())):
+            queue = subscription.queue
+            if not queue.full():
+                # Só deixa de estar atrasado quando esvazia metade do buffer
+                if queue.qsize() <= queue.maxsize // 2:
+                    subscription.lagging_since = None
+                queue.put_nowait(event)
+                self.delivered += 1
+                continue
+
+            now = time.monotonic()
+            if subscription.lagging_since is None:
+                subscription.lagging_since = now
+            elif now - subscription.lagging_since > self.slow_timeout:
+                self.evictions += 1
+                self.unsubscribe(subscription)
+                subscription._close(evicted=True)
+                continue
+            subscription.dropped += 1
+            self.dropped += 1
+
+    def subscribe(self, topics: set[int]) -> Subscription | None:
+        """Nova inscrição nos QR Codes topics, ou None se o limite de inscrições foi atingido."""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            subscription = Subscription(set(topics), self.buffer_size)
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if not subscription.active:
+                return
+            subscription.active = False
+            self._count -= 1
+            for topic in subscription.topics:
+                subscriptions = self._subscribers.get(topic)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscribers[topic]
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "broker": type(self.broker).__name__,
+            "subscribers": self._count,
+            "topics": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "evictions": self.evictions,
+            "publish_errors": self.publish_errors
+        }
+
+
+def _build_broker() -> LiveBroker:
+    url = config("LIVE_BROKER_URL", default="")
+    if not url or url == "memory://":
+        return LocalBroker()
+    return RedisBroker(url)
+
+
+live_hub = LiveHub(
+    _build_broker(),
+    buffer_size=LIVE_BUFFER_SIZE,
+    max_subscribers=LIVE_MAX_SUBSCRIBERS,
+    window=LIVE_WINDOW_MINUTES,
+    counter_codes=LIVE_COUNTER_CODES,
+    slow_timeout=LIVE_SLOW_TIMEOUT
+)
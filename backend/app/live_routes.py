@@ -0,0 +1,111 @@
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from decouple import config
+from app.db.connection import Session as SessionFactory
+from app.depends import get_reader
+from app.live import Subscription, live_hub
+from app.qr_code_use_cases import QRCodeUseCases
+
+# Intervalo (s) entre os envios dos contadores por minuto; também mantém a conexão viva
+LIVE_COUNTER_INTERVAL = config("LIVE_COUNTER_INTERVAL", default=10, cast=float)
+
+live_router = APIRouter(prefix="/live", tags=["Live"])
+
+
+def _resolve_topics(token: str, code: str | None) -> dict[int, str]:
+    # Única consulta ao banco de um feed: autenticação e lista de QR Codes na conexão
+    session = SessionFactory()
+    try:
+        user = get_reader(token, session)
+        return QRCodeUseCases(db_session=session).live_topics(user.id, code)
+    finally:
+        session.close()
+
+
+def _request_token(request: Request, access_token: str | None) -> str:
+    # EventSource e WebSocket do navegador não enviam headers: aceita ?access_token=
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return token if scheme.lower() == "bearer" and token else access_token or ""
+
+
+async def _subscribe(token: str, code: str | None) -> tuple[Subscription, dict[int, str]]:
+    topics = await run_in_threadpool(_resolve_topics, token, code)
+    subscription = live_hub.subscribe(set(topics))
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live subscribers, try again later",
+            headers={"Retry-After": "30"}
+        )
+    return subscription, topics
+
+
+def _counters(subscription: Subscription) -> dict:
+    # dropped: scans não enviados a este feed por estar atrasado (os contadores incluem todos)
+    return {"minutes": live_hub.counters.snapshot(subscription.topics), "dropped": subscription.dropped}
+
+
+async def _live_messages(subscription: Subscription, topics: dict[int, str]):
+    """Mensagens (tipo, dados) de um feed: counters logo na conexão e a cada
+    LIVE_COUNTER_INTERVAL segundos, scan a cada novo scan e evicted/closed no fim."""
+    loop = asyncio.get_running_loop()
+    try:
+        yield "counters", _counters(subscription)
+        next_counters = loop.time() + LIVE_COUNTER_INTERVAL
+        while True:
+            try:
+                event = await subscription.get(max(0.0, next_counters - loop.time()))
+            except asyncio.TimeoutError:
+                yield "counters", _counters(subscription)
+                next_counters = loop.time() + LIVE_COUNTER_INTERVAL
+                continue
+
+            if event is None:
+                yield ("evicted" if subscription.evicted else "closed"), {}
+                return
+            yield "scan", {**event, "code": topics.get(event["qr_code_id"])}
+    finally:
+        live_hub.unsubscribe(subscription)
+
+
+async def _sse(messages):
+    async for kind, data in messages:
+        yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+@live_router.get("")
+@live_router.get("/{code}")
+async def live_feed(request: Request, code: str = None, access_token: str = None):
+    """Feed ao vivo (Server-Sent Events) dos scans de um QR Code, ou de todos os QR Codes
+    do usuário sem code. Eventos: scan, counters (scans por minuto) e evicted (cliente lento)"""
+    subscription, topics = await _subscribe(_request_token(request, access_token), code)
+    return StreamingResponse(
+        _sse(_live_messages(subscription, topics)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@live_router.websocket("/ws")
+async def live_feed_ws(websocket: WebSocket, code: str = None, access_token: str = ""):
+    """Mesmo feed de /live via WebSocket: mensagens JSON {"type": ..., "data": ...}"""
+    try:
+        subscription, topics = await _subscribe(access_token, code)
+    except HTTPException as error:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(error.detail))
+        return
+
+    messages = _live_messages(subscription, topics)
+    try:
+        await websocket.accept()
+        async for kind, data in messages:
+            await websocket.send_json({"type": kind, "data": data})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await messages.aclose()
+        live_hub.unsubscribe(subscription)
@@ -1,7 +1,25 @@
+import asyncio
+from contextlib import asynccontextmanager
+from decouple import config
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routes import router as user_router
+from app.db.connection import DB_ASYNC, DB_MAX_OVERFLOW, DB_POOL_SIZE, async_engine, engine
 from app.qr_routes import router as qr_router, redirect_router, analytics_router
+from app.cache import redirect_cache
+from app.code_allocator import code_allocator
+from app.depends import principal_cache
+from app.metrics import METRICS_ENABLED, MetricsMiddleware, register_pool_gauges, registry
+from app.ingestion import scan_ingestion, scan_writer
+from app.live import live_hub
+from app.live_routes import live_router
+from app.geolocation import geolocation
+from app.passwords import login_limiter, shutdown_hash_pool
+from app.qr_images import image_cache, shutdown_render_pool
+from app.rate_limit import RATE_LIMIT_ENABLED, RateLimitMiddleware, load_shedder, rate_limiter
+from app.scan_filter import scan_filter
+from app.user_agent import user_agent_parser
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,12 +28,43 @@ origins = [
      "*"
 ]
 
+SCAN_INGESTION_ENABLED = config("SCAN_INGESTION_ENABLED", default=True, cast=bool)
+# GET /stats não tem autenticação e expõe o estado interno (caches, filas, limites):
+# só é registrado com STATS_ENABLED=true, para uso interno/diagnóstico
+STATS_ENABLED = config("STATS_ENABLED", default=False, cast=bool)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    live_hub.start(asyncio.get_running_loop())
+    if SCAN_INGESTION_ENABLED:
+        scan_ingestion.start()
+    yield
+    # Drena a fila de scans antes de encerrar o processo
+    scan_ingestion.stop()
+    live_hub.stop()
+    shutdown_render_pool()
+    shutdown_hash_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 app = FastAPI(
     title="QRTrack API",
     description="Sistema de rastreamento de QR Codes com analytics em tempo real",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Rate limit antes do CORS (mais interno), para que as respostas 429/503 levem os headers de CORS
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+    load_shedder.watch_queue(scan_ingestion)
+    # No SQLite os tamanhos são ignorados, mas os padrões coincidem com os do SQLAlchemy (5 + 10)
+    load_shedder.watch_pool(engine.pool, DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    if async_engine is not None:
+        load_shedder.watch_pool(async_engine.sync_engine.pool, DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -23,16 +72,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Métricas por último: é o middleware mais externo e mede a request inteira
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    register_pool_gauges(engine)
+    if async_engine is not None:
+        register_pool_gauges(async_engine.sync_engine, prefix="db_async_pool")
+
 @app.get("/")
 def health_check():
     return {"status": "ok", "message": "QRTrack API is running"}
 
+def runtime_stats():
+    return {
+        "redirect_cache": redirect_cache.stats(),
+        "scan_ingestion": scan_ingestion.stats(),
+        "scan_writer": scan_writer.stats(),
+        "geolocation": geolocation.stats(),
+        "user_agent_parser": user_agent_parser.stats(),
+        "image_cache": image_cache.stats(),
+        "code_allocator": code_allocator.stats(),
+        "auth_cache": principal_cache.stats(),
+        "login_limiter": login_limiter.stats(),
+        "live": live_hub.stats(),
+        "scan_filter": scan_filter.stats(),
+        "rate_limit": rate_limiter.stats()
+    }
+
+if STATS_ENABLED:
+    app.get("/stats", include_in_schema=False)(runtime_stats)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Rotas de usuários
 app.include_router(user_router)
 
 # Rotas de QR Codes
 app.include_router(qr_router)
+
+# Redirect e analytics: versão async (engine asyncpg/aiosqlite) com DB_ASYNC=true
+if DB_ASYNC:
+    from app.async_routes import redirect_router, analytics_router
+
 app.include_router(redirect_router)
-app.include_router(analytics_router)
\ No newline at end of file
+app.include_router(analytics_router)
+
+# Feed ao vivo dos scans (SSE e WebSocket)
+app.include_router(live_router)
\ No newline at end of file
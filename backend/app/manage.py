@@ -0,0 +1,173 @@
+"""Comandos de manutenção do QRTrack.
+
+Uso (a partir de backend/):
+    python -m app.manage build-geo-db ranges.csv geo.db
+    python -m app.manage geo-lookup 200.98.196.114
+    python -m app.manage backfill-rollups [--code xyz123]
+    python -m app.manage reconcile-counters [--code xyz123] [--fix]
+    python -m app.manage maintain-partitions [--ahead 3] [--retention-months 12] [--archive-dir DIR] [--dry-run]
+"""
+import argparse
+import json
+from datetime import datetime
+
+
+def build_geo_db(args):
+    from app.geo_database import build_database
+
+    count = build_database(args.csv_path, args.output_path)
+    print(f"{count} faixas gravadas em {args.output_path}")
+
+
+def geo_lookup(args):
+    from app.geolocation import geolocation
+
+    print(json.dumps(geolocation.lookup(args.ip_address), ensure_ascii=False))
+
+
+def _qr_code_id(connection, code):
+    from app.db.models import QRCodeModel
+    from sqlalchemy import select
+
+    if not code:
+        return None
+    qr_code_id = connection.execute(
+        select(QRCodeModel.id).where(QRCodeModel.code == code)
+    ).scalar_one_or_none()
+    if qr_code_id is None:
+        raise SystemExit(f"QR Code {code} não encontrado")
+    return qr_code_id
+
+
+def backfill_rollups(args):
+    from app.db.connection import engine
+    from app.partitions import retained_since
+    from app.rollups import backfill_rollups as backfill
+
+    with engine.begin() as connection:
+        # Depois da retenção só dá para reconstruir os buckets de hora/dia dos meses mantidos
+        since = retained_since(connection)
+        total = backfill(connection, _qr_code_id(connection, args.code), since=since)
+    print(f"Rollups reconstruídos a partir de {total} scans")
+    if since is not None:
+        print(
+            f"scans anteriores a {since:%Y-%m-%d} foram removidos pela retenção: os buckets de hora/dia "
+            "anteriores e o acumulado total foram mantidos como estavam"
+        )
+
+
+def reconcile_counters(args):
+    from app.counters import reconcile_scan_counters
+    from app.db.connection import engine
+    from app.partitions import retained_since
+
+    with engine.begin() as connection:
+        since = retained_since(connection)
+        if since is not None:
+            # scan_count é o total histórico: recalcular só com os scans mantidos o diminuiria
+            raise SystemExit(
+                f"scans anteriores a {since:%Y-%m-%d} foram removidos pela retenção; "
+                "scan_analytics não tem mais o histórico completo para conferir os contadores"
+            )
+        drift = reconcile_scan_counters(connection, _qr_code_id(connection, args.code), fix=args.fix)
+
+    for row in drift:
+        print(
+            f"{row['code']}: scan_count {row['scan_count']} (real {row['actual_scan_count']}), "
+            f"last_scanned_at {row['last_scanned_at']} (real {row['actual_last_scanned_at']})"
+        )
+    action = "corrigidos" if args.fix else "divergentes (use --fix para corrigir)"
+    print(f"{len(drift)} QR Codes {action}")
+    if drift and not args.fix:
+        raise SystemExit(1)
+
+
+def maintain_partitions(args):
+    from app import partitions
+    from app.db.connection import engine
+
+    current = partitions.month_start(datetime.utcnow())
+    with engine.begin() as connection:
+        partitioned = partitions.is_partitioned(connection)
+        if partitioned:
+            last = partitions.add_months(current, args.ahead)
+            if args.dry_run:
+                missing = partitions.missing_partitions(connection, current, last)
+            else:
+                missing = partitions.create_partitions(connection, current, last)
+            for partition, moved in missing:
+                action = "criaria" if args.dry_run else "criada"
+                detail = f", {moved} scans movidos da partição default" if moved else ""
+                print(f"{action} {partition.name} [{partition.start:%Y-%m-%d}, {partition.end:%Y-%m-%d}){detail}")
+            if any(moved for _, moved in missing):
+                print("aviso: havia scans na partição default; o maintain-partitions deixou de rodar a tempo?")
+            outside = 0 if args.dry_run else partitions.default_partition_rows(connection)
+            if outside:
+                raise SystemExit(f"erro: {outside} scans continuam na partição default")
+        else:
+            print(f"{connection.dialect.name}: scan_analytics sem partições; a retenção usa DELETE por mês")
+
+    if args.retention_months <= 0:
+        return
+
+    cutoff = partitions.add_months(current, -args.retention_months)
+    with engine.connect() as connection:
+        expired = partitions.expired_months(connection, cutoff)
+    for partition in expired:
+        if args.dry_run:
+            action = f"arquivaria em {args.archive_dir} e removeria" if args.archive_dir else "removeria"
+            print(f"{action} {partition.name}")
+            continue
+        # Um mês por transação: se o arquivamento falhar, o mês não é removido
+        with engine.begin() as connection:
+            if args.archive_dir:
+                path, rows = partitions.archive_month(connection, partition, args.archive_dir)
+                print(f"arquivada {partition.name}: {rows} scans em {path}")
+            deleted = partitions.drop_month(connection, partition)
+        detail = "partição apagada" if deleted is None else f"{deleted} scans apagados"
+        print(f"removida {partition.name} ({detail})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Comandos de manutenção do QRTrack")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("build-geo-db", help="Compila um CSV de faixas de IP para o provedor offline")
+    command.add_argument("csv_path")
+    command.add_argument("output_path")
+    command.set_defaults(func=build_geo_db)
+
+    command = commands.add_parser("geo-lookup", help="Consulta um IP no provedor de geolocalização configurado")
+    command.add_argument("ip_address")
+    command.set_defaults(func=geo_lookup)
+
+    command = commands.add_parser("backfill-rollups", help="Reconstrói os rollups de analytics a partir de scan_analytics")
+    command.add_argument("--code", help="apenas este QR Code (padrão: todos)")
+    command.set_defaults(func=backfill_rollups)
+
+    command = commands.add_parser("reconcile-counters", help="Confere scan_count/last_scanned_at dos QR Codes com scan_analytics")
+    command.add_argument("--code", help="apenas este QR Code (padrão: todos)")
+    command.add_argument("--fix", action="store_true", help="corrige os contadores divergentes")
+    command.set_defaults(func=reconcile_counters)
+
+    from app.partitions import SCAN_ARCHIVE_DIR, SCAN_PARTITIONS_AHEAD, SCAN_RETENTION_MONTHS
+
+    command = commands.add_parser(
+        "maintain-partitions",
+        help="Cria as partições mensais de scan_analytics à frente e aplica a retenção"
+    )
+    command.add_argument("--ahead", type=int, default=SCAN_PARTITIONS_AHEAD, help="meses criados à frente do atual")
+    command.add_argument(
+        "--retention-months", type=int, default=SCAN_RETENTION_MONTHS,
+        help="meses completos mantidos além do atual (0 = guarda tudo)"
+    )
+    command.add_argument("--archive-dir", default=SCAN_ARCHIVE_DIR or None, help="arquiva os meses removidos em .csv.gz")
+    command.add_argument("--dry-run", action="store_true", help="só mostra o que seria feito")
+    command.set_defaults(func=maintain_partitions)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import threading
+import time
+from bisect import bisect_left
+from decouple import config
+
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+
+# Buckets (s) padrão do cliente oficial do Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield self.name, _labels(self.labelnames, labelvalues), value
+
+
+class Gauge(Metric):
+    """Gauge com valor definido por set() ou lido de uma função na hora da coleta."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def samples(self):
+        if self.function is not None:
+            # function() retorna {labelvalues: valor}
+            items = list(self.function().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for labelvalues, value in items:
+            yield self.name, _labels(self.labelnames, labelvalues), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        # Guarda a contagem por bucket (não cumulativa); acumula só na coleta
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labelvalues) -> "Timer":
+        return Timer(self, labelvalues)
+
+    def samples(self):
+        with self._lock:
+            items = [(labelvalues, (list(counts), total, count)) for labelvalues, (counts, total, count) in self._values.items()]
+        for labelvalues, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", _labels(self.labelnames, labelvalues, f'le="{_number(bound)}"'), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labelvalues), total
+            yield f"{self.name}_count", _labels(self.labelnames, labelvalues), count
+
+
+class Timer:
+    """with histogram.time("etapa"): ... registra a duração do bloco em segundos."""
+
+    __slots__ = ("histogram", "labelvalues", "started")
+
+    def __init__(self, histogram: Histogram, labelvalues: tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Formato texto do Prometheus (exposition format 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "Requests HTTP por rota e status", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Latência das requests HTTP por rota", ("method", "route")
+))
+scan_stage_duration = registry.register(Histogram(
+    "scan_stage_duration_seconds", "Duração das etapas do processamento de um scan", ("stage",), STAGE_BUCKETS
+))
+
+
+def register_pool_gauges(engine, prefix: str = "db_pool"):
+    """Gauges do pool de conexões da engine (só pools com tamanho fixo, como o QueuePool)."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return
+
+    gauges = {
+        "size": ("Conexões mantidas no pool", pool.size),
+        "checked_out": ("Conexões em uso", pool.checkedout),
+        "checked_in": ("Conexões livres no pool", pool.checkedin),
+        # O QueuePool conta o overflow negativo enquanto o pool não enche
+        "overflow": ("Conexões além do tamanho do pool", lambda: max(pool.overflow(), 0)),
+    }
+    for name, (help, read) in gauges.items():
+        registry.register(Gauge(f"{prefix}_{name}", help, function=lambda read=read: {(): read()}))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que registra latência e status por rota.
+
+    Usa o template da rota (ex: /r/{code}) e não o path, para não criar uma série
+    por código; requests que não casam com nenhuma rota ficam em "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - started, method, path)
+            http_requests.inc(method, path, status_code)
@@ -0,0 +1,233 @@
+import csv
+import gzip
+import os
+import re
+from datetime import datetime
+from typing import NamedTuple
+from decouple import config
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.engine import Connection
+from app.db.models import ScanAnalyticsModel, ScanRetentionModel
+
+# Partições mensais criadas com antecedência e retenção (0 = guarda tudo)
+SCAN_PARTITIONS_AHEAD = config("SCAN_PARTITIONS_AHEAD", default=3, cast=int)
+SCAN_RETENTION_MONTHS = config("SCAN_RETENTION_MONTHS", default=0, cast=int)
+# Diretório dos arquivos .csv.gz dos meses removidos pela retenção (vazio = não arquiva)
+SCAN_ARCHIVE_DIR = config("SCAN_ARCHIVE_DIR", default="")
+
+TABLE = ScanAnalyticsModel.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_for(month: datetime) -> Partition:
+    month = month_start(month)
+    return Partition(f"{TABLE}_p{month:%Y_%m}", month, add_months(month, 1))
+
+
+def is_partitioned(connection: Connection) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = to_regnamespace(current_schema())"
+    ), {"table": TABLE}).first() is not None
+
+
+def list_partitions(connection: Connection) -> list[Partition]:
+    """Partições mensais de scan_analytics, em ordem (a partição DEFAULT fica de fora)."""
+    rows = connection.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table AND p.relnamespace = to_regnamespace(current_schema())"
+    ), {"table": TABLE}).all()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUNDS.search(bound)
+        if match:
+            start, end = (datetime.fromisoformat(value) for value in match.groups())
+            partitions.append(Partition(name, start, end))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def create_partition_sql(partition: Partition) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition.name} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+    )
+
+
+def default_months(connection: Connection) -> dict[datetime, int]:
+    """Meses (e quantos scans) que caíram na partição DEFAULT por falta da partição do mês."""
+    rows = connection.execute(text(
+        f"SELECT date_trunc('month', scanned_at), count(*) FROM {DEFAULT_PARTITION} GROUP BY 1"
+    )).all()
+    return {month_start(month): count for month, count in rows}
+
+
+def _create_from_default(connection: Connection, partition: Partition):
+    # O PostgreSQL recusa criar a partição de um mês que já tem scans na DEFAULT:
+    # desanexa a DEFAULT, cria o mês, move os scans e anexa de novo (na transação de connection)
+    bounds = {"start": partition.start, "end": partition.end}
+    connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    connection.execute(text(create_partition_sql(partition)))
+    connection.execute(text(
+        f"INSERT INTO {partition.name} SELECT * FROM {DEFAULT_PARTITION} "
+        "WHERE scanned_at >= :start AND scanned_at < :end"
+    ), bounds)
+    connection.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE scanned_at >= :start AND scanned_at < :end"), bounds)
+    connection.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+
+def missing_partitions(connection: Connection, first: datetime, last: datetime) -> list[tuple[Partition, int]]:
+    """Partições que faltam: os meses de first até last (inclusive) e os meses com
+    scans na DEFAULT. Cada uma vem com os scans que serão movidos da DEFAULT."""
+    existing = {partition.name for partition in list_partitions(connection)}
+    in_default = default_months(connection)
+    months = set(in_default)
+    month = month_start(first)
+    while month <= last:
+        months.add(month)
+        month = add_months(month, 1)
+    return [
+        (partition_for(month), in_default.get(month, 0))
+        for month in sorted(months) if partition_for(month).name not in existing
+    ]
+
+
+def create_partitions(connection: Connection, first: datetime, last: datetime) -> list[tuple[Partition, int]]:
+    """Cria as partições que faltam (ver missing_partitions), movendo para elas os
+    scans que estavam na DEFAULT."""
+    missing = missing_partitions(connection, first, last)
+    for partition, in_default in missing:
+        if in_default:
+            _create_from_default(connection, partition)
+        else:
+            connection.execute(text(create_partition_sql(partition)))
+    return missing
+
+
+def expired_months(connection: Connection, cutoff: datetime) -> list[Partition]:
+    """Meses inteiramente anteriores a cutoff que ainda existem no banco."""
+    if is_partitioned(connection):
+        return [partition for partition in list_partitions(connection) if partition.end <= cutoff]
+
+    # Sem partições (SQLite): os meses vêm dos próprios scans
+    oldest = connection.execute(select(func.min(ScanAnalyticsModel.scanned_at))).scalar()
+    if oldest is None:
+        return []
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+    months = []
+    month = month_start(oldest)
+    while add_months(month, 1) <= cutoff:
+        months.append(partition_for(month))
+        month = add_months(month, 1)
+    return months
+
+
+def _archive_query(partition: Partition):
+    table = ScanAnalyticsModel.__table__
+    return select(table).where(
+        table.c.scanned_at >= partition.start, table.c.scanned_at < partition.end
+    ).order_by(table.c.id)
+
+
+def archive_month(connection: Connection, partition: Partition, directory: str) -> tuple[str, int]:
+    """Grava os scans do mês em <directory>/<partição>.csv.gz (com cabeçalho).
+
+    O arquivo só aparece com o nome final depois de completo, então uma
+    execução interrompida nunca deixa um arquivo parcial no lugar do arquivo.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{partition.name}.csv.gz")
+    partial = path + ".partial"
+    columns = [column.name for column in ScanAnalyticsModel.__table__.columns]
+
+    with open(partial, "wb") as raw:
+        with gzip.open(raw, "wt", encoding="utf-8", newline="") as f:
+            if connection.dialect.driver == "psycopg2":
+                # COPY direto para o arquivo, sem montar as linhas em Python
+                cursor = connection.connection.cursor()
+                try:
+                    cursor.copy_expert(
+                        f"COPY (SELECT {', '.join(columns)} FROM {TABLE} "
+                        f"WHERE scanned_at >= '{partition.start.isoformat()}' AND scanned_at < '{partition.end.isoformat()}' "
+                        f"ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)",
+                        f
+                    )
+                    rows = cursor.rowcount
+                finally:
+                    cursor.close()
+            else:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                rows = 0
+                result = connection.execution_options(stream_results=True, yield_per=5000).execute(_archive_query(partition))
+                for row in result:
+                    writer.writerow(row)
+                    rows += 1
+        # O arquivo precisa estar no disco antes de a partição ser apagada
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    os.replace(partial, path)
+    return path, rows
+
+
+def retained_since(connection: Connection) -> datetime | None:
+    """Início dos scans mantidos, ou None se a retenção nunca removeu nada."""
+    return connection.execute(
+        select(ScanRetentionModel.retained_since).where(ScanRetentionModel.name == TABLE)
+    ).scalar()
+
+
+def _mark_retained_since(connection: Connection, moment: datetime):
+    current = retained_since(connection)
+    if current is None:
+        connection.execute(insert(ScanRetentionModel).values(name=TABLE, retained_since=moment))
+    elif moment > current:
+        connection.execute(
+            update(ScanRetentionModel).where(ScanRetentionModel.name == TABLE).values(retained_since=moment)
+        )
+
+
+def drop_month(connection: Connection, partition: Partition) -> int | None:
+    """Remove os scans do mês. Com partições, desanexa e apaga a partição inteira
+    (instantâneo, sem DELETE linha a linha); sem partições, cai para um DELETE
+    por intervalo. Retorna as linhas apagadas (None quando a partição é apagada).
+
+    Registra em scan_retention, na mesma transação, que o histórico agora começa
+    em partition.end.
+    """
+    _mark_retained_since(connection, partition.end)
+    if is_partitioned(connection):
+        connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {partition.name}"))
+        connection.execute(text(f"DROP TABLE {partition.name}"))
+        return None
+
+    table = ScanAnalyticsModel.__table__
+    result = connection.execute(
+        delete(table).where(table.c.scanned_at >= partition.start, table.c.scanned_at < partition.end)
+    )
+    return result.rowcount
+
+
+def default_partition_rows(connection: Connection) -> int:
+    """Scans que caíram na partição DEFAULT (fora de qualquer mês criado)."""
+    return connection.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}")).scalar()
@@ -0,0 +1,130 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from decouple import config
+from fastapi import HTTPException, status
+
+# Custo do bcrypt (2^rounds iterações). Hashes com outro custo são refeitos no login
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", default=12, cast=int)
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=2, cast=int)
+
+# Logins/cadastros processados ao mesmo tempo e quantos podem esperar na fila
+LOGIN_MAX_CONCURRENCY = config("LOGIN_MAX_CONCURRENCY", default=4, cast=int)
+LOGIN_MAX_WAITING = config("LOGIN_MAX_WAITING", default=32, cast=int)
+LOGIN_RETRY_AFTER = config("LOGIN_RETRY_AFTER", default=2, cast=int)
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def hash_pool() -> ProcessPoolExecutor:
+    """Pool de processos do bcrypt: o hash não ocupa o GIL nem as threads das requests.
+
+    Usa spawn pelo mesmo motivo do pool de renderização (app/qr_images.py).
+    """
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _hash_pool
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(cancel_futures=True)
+            _hash_pool = None
+
+
+async def hash_password(password: str, rounds: int = None) -> str:
+    future = hash_pool().submit(_hash, password.encode("utf-8"), rounds or BCRYPT_ROUNDS)
+    return (await asyncio.wrap_future(future)).decode("utf-8")
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    future = hash_pool().submit(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+    return await asyncio.wrap_future(future)
+
+
+def hash_rounds(hashed: str) -> int | None:
+    # Formato $2b$12$<salt+hash>
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+class ConcurrencyLimiter:
+    """Limita quantas requests executam ao mesmo tempo (async with limiter).
+
+    Até max_waiting requests esperam por uma vaga; além disso a request é
+    recusada na hora com 503 e Retry-After, em vez de acumular no servidor.
+    """
+
+    def __init__(self, max_concurrency: int, max_waiting: int, retry_after: int = 1):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked():
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many login attempts in progress, try again",
+                    headers={"Retry-After": str(self.retry_after)}
+                )
+            self.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected
+        }
+
+
+login_limiter = ConcurrencyLimiter(LOGIN_MAX_CONCURRENCY, LOGIN_MAX_WAITING, LOGIN_RETRY_AFTER)
+
+
+async def login_slot():
+    """Dependência das rotas de login e cadastro."""
+    async with login_limiter:
+        yield
@@ -1,46 +1,299 @@
-import secrets
-import string
-import qrcode
-from io import BytesIO
+import base64
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from user_agents import parse
-from datetime import datetime
+from datetime import datetime, timedelta
+from decouple import config
+from app.analytics import RollupAggregation, ScanAggregation
+from app.cache import RedirectTarget, redirect_cache
+from app.code_allocator import code_allocator
 from app.db.models import QRCodeModel, ScanAnalyticsModel, UserModel
+from app.geolocation import geolocation
+from app.live import live_hub
+from app.metrics import scan_stage_duration
+from app.qr_images import RenderedImage, image_cache, png_min_size
+from app.rollups import delete_rollups
+from app.scan_filter import scan_filter
+from app.scan_writer import write_scan_rows
 from app.schemas import QRCodeCreate
+from app.user_agent import user_agent_parser
+
+SCAN_LIST_COLUMNS = (
+    ScanAnalyticsModel.id,
+    ScanAnalyticsModel.ip_address,
+    ScanAnalyticsModel.browser,
+    ScanAnalyticsModel.browser_version,
+    ScanAnalyticsModel.os,
+    ScanAnalyticsModel.os_version,
+    ScanAnalyticsModel.device,
+    ScanAnalyticsModel.country,
+    ScanAnalyticsModel.city,
+    ScanAnalyticsModel.latitude,
+    ScanAnalyticsModel.longitude,
+    ScanAnalyticsModel.timezone,
+    ScanAnalyticsModel.isp,
+    ScanAnalyticsModel.scanned_at,
+)
+
+# rollups: lê as tabelas pré-agregadas; scans: agrega scan_analytics na hora
+ANALYTICS_SOURCE = config("ANALYTICS_SOURCE", default="rollups")
+
+# Máximo de QR Codes por requisição de criação em lote
+BULK_MAX_CODES = config("BULK_MAX_CODES", default=10000, cast=int)
+
+# Tentativas de insert quando um código colide no índice único
+CODE_INSERT_ATTEMPTS = 5
+CODE_PROBE_ROUNDS = 20
+
+
+def encode_cursor(*values) -> str:
+    raw = "|".join(value.isoformat() if isinstance(value, datetime) else str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if len(parts) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(part) if type_ is datetime else type_(part)
+            for part, type_ in zip(parts, types)
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def scans_stmt(qr_code_id: int, days: int = None):
+    stmt = select(*SCAN_LIST_COLUMNS).where(
+        ScanAnalyticsModel.qr_code_id == qr_code_id,
+        ScanAnalyticsModel.suppressed.is_(None)
+    )
+    if days:
+        stmt = stmt.where(ScanAnalyticsModel.scanned_at >= datetime.utcnow() - timedelta(days=days))
+    return stmt
+
+
+def scan_page_stmt(qr_code_id: int, limit: int, cursor: str = None, days: int = None):
+    stmt = scans_stmt(qr_code_id, days)
+    
+    if cursor:
+        scanned_at, scan_id = decode_cursor(cursor, datetime, int)
+        stmt = stmt.where(or_(
+            ScanAnalyticsModel.scanned_at < scanned_at,
+            and_(ScanAnalyticsModel.scanned_at == scanned_at, ScanAnalyticsModel.id < scan_id)
+        ))
+    
+    # Uma linha a mais indica que existe próxima página
+    return stmt.order_by(ScanAnalyticsModel.scanned_at.desc(), ScanAnalyticsModel.id.desc()).limit(limit + 1)
+
+
+def scan_page(rows: list, limit: int):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].scanned_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def iter_scans_stmt(qr_code_id: int, days: int = None, newest_first: bool = False):
+    stmt = scans_stmt(qr_code_id, days)
+    if newest_first:
+        return stmt.order_by(ScanAnalyticsModel.scanned_at.desc(), ScanAnalyticsModel.id.desc())
+    return stmt.order_by(ScanAnalyticsModel.id)
+
+
+def _unique_codes(codes: list[str]) -> list[str]:
+    # A estratégia aleatória pode repetir um código dentro do próprio lote
+    seen = set()
+    unique = []
+    for code in codes:
+        while code in seen:
+            code = code_allocator.next_codes(1)[0]
+        seen.add(code)
+        unique.append(code)
+    return unique
+
+
+def analytics_aggregation(qr_code: QRCodeModel, days: int = None):
+    # Agregações feitas no banco, sem carregar os scans
+    aggregation = RollupAggregation if ANALYTICS_SOURCE == "rollups" else ScanAggregation
+    return aggregation(qr_code.id, days)
+
+
+def user_qr_code_or_404(qr_code: QRCodeModel | None) -> QRCodeModel:
+    if not qr_code:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="QR Code not found or you don't have permission"
+        )
+    return qr_code
 
 
 class QRCodeUseCases:
     def __init__(self, db_session: Session):
         self.db_session = db_session
     
-    def _generate_short_code(self, length: int = 6) -> str:
-        while True:
-            code = ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(length))
-            existing = self.db_session.query(QRCodeModel).filter_by(code=code).first()
-            if not existing:
-                return code
+    def _taken_codes(self, codes: list[str]) -> set[str]:
+        return set(self.db_session.execute(
+            select(QRCodeModel.code).where(QRCodeModel.code.in_(codes))
+        ).scalars())
     
-    def create_qr_code(self, qr_data: QRCodeCreate, user_id: int, base_url: str) -> QRCodeModel:
-        short_code = self._generate_short_code()
-        
-        qr_code = QRCodeModel(
-            code=short_code,
-            destination_url=qr_data.destination_url,
-            user_id=user_id
+    def _replace_taken_codes(self, codes: list[str], taken: set[str]) -> list[str]:
+        # Só roda depois de uma colisão: troca os códigos que já existem e confere
+        # apenas os substitutos, até o lote ficar livre
+        for _ in range(CODE_PROBE_ROUNDS):
+            if not taken:
+                break
+            code_allocator.report_collisions(list(taken))
+            replacements = code_allocator.next_codes(len(taken))
+            lookup = iter(replacements)
+            codes = [next(lookup) if code in taken else code for code in codes]
+            taken = self._taken_codes(replacements)
+        return codes
+    
+    def _insert_qr_codes(self, rows: list[dict]) -> list:
+        """Insere QR Codes (rows sem code) com códigos do alocador, sem consultar
+        antes se eles existem. Se o índice único de code acusar colisão, troca só os
+        códigos que já existem e tenta de novo. Retorna (id, code, destination_url,
+        created_at) na ordem de rows."""
+        table = QRCodeModel.__table__
+        codes = code_allocator.next_codes(len(rows))
+        
+        for _ in range(CODE_INSERT_ATTEMPTS):
+            codes = _unique_codes(codes)
+            try:
+                inserted = self.db_session.execute(
+                    insert(table).returning(
+                        table.c.id, table.c.code, table.c.destination_url, table.c.created_at,
+                        sort_by_parameter_order=True
+                    ),
+                    [dict(row, code=code) for row, code in zip(rows, codes)]
+                ).all()
+                self.db_session.commit()
+                return inserted
+            except IntegrityError:
+                # A transação só contém este insert
+                self.db_session.rollback()
+                taken = self._taken_codes(codes)
+                if not taken:
+                    raise
+                codes = self._replace_taken_codes(codes, taken)
+        
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not allocate a unique code, try again"
         )
+    
+    def create_qr_codes_bulk(self, destination_urls: list[str], user_id: int) -> list:
+        """Cria vários QR Codes numa única transação (um INSERT em lote).
+        Retorna as linhas inseridas (id, code, destination_url, created_at), na ordem recebida."""
+        destination_urls = [url.strip() for url in destination_urls if url and url.strip()]
+        if not destination_urls:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No destination URLs"
+            )
+        if len(destination_urls) > BULK_MAX_CODES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Too many destination URLs (max {BULK_MAX_CODES})"
+            )
         
-        self.db_session.add(qr_code)
-        self.db_session.commit()
-        self.db_session.refresh(qr_code)
-        
-        return qr_code
+        created_at = datetime.utcnow()
+        return self._insert_qr_codes([
+            {"destination_url": url, "user_id": user_id, "created_at": created_at}
+            for url in destination_urls
+        ])
+    
+    def create_qr_code(self, qr_data: QRCodeCreate, user_id: int, base_url: str):
+        return self._insert_qr_codes([{
+            "destination_url": qr_data.destination_url,
+            "user_id": user_id,
+            "created_at": datetime.utcnow()
+        }])[0]
+    
+    def get_user_qr_codes(
+        self,
+        user_id: int,
+        sort: str = "created_at",
+        order: str = "asc",
+        limit: int = None,
+        cursor: str = None
+    ) -> tuple[list[QRCodeModel], str | None]:
+        """QR Codes do usuário com o total de scans de cada um (coluna
+        desnormalizada scan_count), com ordenação e paginação por keyset."""
+        sort_column, sort_type = {
+            "created_at": (QRCodeModel.created_at, datetime),
+            "code": (QRCodeModel.code, str),
+            "scan_count": (QRCodeModel.scan_count, int),
+        }[sort]
+        
+        stmt = select(QRCodeModel).where(QRCodeModel.user_id == user_id)
+        
+        descending = order == "desc"
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort_type, int)
+            if descending:
+                stmt = stmt.where(or_(sort_column < value, and_(sort_column == value, QRCodeModel.id < last_id)))
+            else:
+                stmt = stmt.where(or_(sort_column > value, and_(sort_column == value, QRCodeModel.id > last_id)))
+        
+        if descending:
+            stmt = stmt.order_by(sort_column.desc(), QRCodeModel.id.desc())
+        else:
+            stmt = stmt.order_by(sort_column.asc(), QRCodeModel.id.asc())
+        
+        if limit:
+            stmt = stmt.limit(limit + 1)
+        qr_codes = self.db_session.execute(stmt).scalars().all()
+        
+        next_cursor = None
+        if limit and len(qr_codes) > limit:
+            qr_codes = qr_codes[:limit]
+            last = qr_codes[-1]
+            next_cursor = encode_cursor(getattr(last, sort), last.id)
+        
+        return qr_codes, next_cursor
+    
+    def generate_qr_image(
+        self,
+        code: str,
+        base_url: str,
+        format: str = "png",
+        size: int = None,
+        error_correction: str = "L"
+    ) -> RenderedImage:
+        # resolve_code confirma que o código existe (normalmente sem ir ao banco)
+        self.resolve_code(code)
+        self.check_image_size(base_url, format, size, error_correction, code)
+        return image_cache.prerender(base_url, code, format, size, error_correction)
     
-    def get_user_qr_codes(self, user_id: int) -> list[QRCodeModel]:
-        return self.db_session.query(QRCodeModel).filter_by(user_id=user_id).all()
+    def check_image_size(self, base_url: str, format: str, size: int | None, error_correction: str, code: str = None):
+        """422 se o PNG não cabe em size pixels (menos de um pixel por módulo).
+        Sem code, usa um código do tamanho gerado hoje pelo alocador (lotes, antes de criar)."""
+        if format != "png" or not size:
+            return
+        min_size = png_min_size(base_url, code or "a" * code_allocator.length, error_correction)
+        if size < min_size:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=f"size must be at least {min_size} pixels for this QR Code"
+            )
     
-    def generate_qr_image(self, code: str, base_url: str) -> BytesIO:
-        qr_code = self.db_session.query(QRCodeModel).filter_by(code=code).first()
+    def resolve_code(self, code: str) -> RedirectTarget:
+        target = redirect_cache.get(code)
+        if target is not None:
+            return target
+        
+        with scan_stage_duration.time("lookup"):
+            qr_code = self.db_session.query(QRCodeModel).filter_by(code=code).first()
         
         if not qr_code:
             raise HTTPException(
@@ -48,54 +301,123 @@ class QRCodeUseCases:
                 detail="QR Code not found"
             )
         
-        redirect_url = f"{base_url}r/{code}"
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(redirect_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        buf = BytesIO()
-        img.save(buf, format='PNG')
-        buf.seek(0)
-        
-        return buf
+        return redirect_cache.set(code, qr_code.id, qr_code.destination_url)
+    
+    def enrich_scan(self, qr_code_id: int, ip_address: str, user_agent: str, scanned_at: datetime = None) -> dict | None:
+        """Linha de scan_analytics do scan, ou None se o filtro mandou descartar."""
+        with scan_stage_duration.time("ua_parse"):
+            ua = user_agent_parser.parse(user_agent)
+        suppressed = scan_filter.check(qr_code_id, ip_address, user_agent, ua)
+        if suppressed and scan_filter.policy == "drop":
+            return None
+        if suppressed:
+            # Bots, prévias e repetições não gastam a cota do provedor de geolocalização
+            geo_data = {}
+        else:
+            with scan_stage_duration.time("geolocation"):
+                geo_data = geolocation.lookup(ip_address)
+        
+        # Colunas de scan_analytics, prontas para o insert em lote
+        return {
+            "qr_code_id": qr_code_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "browser": ua.browser,
+            "browser_version": ua.browser_version,
+            "os": ua.os,
+            "os_version": ua.os_version,
+            "device": ua.device,
+            "country": geo_data.get("country"),
+            "city": geo_data.get("city"),
+            "latitude": geo_data.get("latitude"),
+            "longitude": geo_data.get("longitude"),
+            "timezone": geo_data.get("timezone"),
+            "isp": geo_data.get("isp"),
+            "suppressed": suppressed,
+            "scanned_at": scanned_at or datetime.utcnow()
+        }
+    
+    def record_scan(self, qr_code_id: int, ip_address: str, user_agent: str, scanned_at: datetime = None):
+        row = self.enrich_scan(qr_code_id, ip_address, user_agent, scanned_at)
+        if row is None:
+            return
+        with scan_stage_duration.time("db_commit"):
+            write_scan_rows(self.db_session.connection(), [row])
+            self.db_session.commit()
+        if not row["suppressed"]:
+            live_hub.publish(row)
+    
+    def process_scan(self, code: str, ip_address: str, user_agent: str) -> str:
+        target = self.resolve_code(code)
+        self.record_scan(target.qr_code_id, ip_address, user_agent)
+        return target.destination_url
     
-    def _get_ip_geolocation(self, ip_address: str, api_key: str) -> dict:
-        import requests
+    def get_user_qr_code(self, code: str, user_id: int) -> QRCodeModel:
+        qr_code = self.db_session.query(QRCodeModel).filter_by(code=code, user_id=user_id).first()
+        return user_qr_code_or_404(qr_code)
+    
+    def live_topics(self, user_id: int, code: str = None) -> dict[int, str]:
+        """QR Codes (id -> code) acompanhados por um feed ao vivo: um código ou todos os do usuário."""
+        stmt = select(QRCodeModel.id, QRCodeModel.code).where(QRCodeModel.user_id == user_id)
+        if code is not None:
+            stmt = stmt.where(QRCodeModel.code == code)
+        topics = dict(self.db_session.execute(stmt).all())
+        if code is not None:
+            user_qr_code_or_404(topics or None)
+        return topics
+    
+    def get_analytics(self, code: str, user_id: int, days: int = None):
+        qr_code = self.get_user_qr_code(code, user_id)
         
-        if not api_key:
-            return {}
+        analytics = analytics_aggregation(qr_code, days).run(self.db_session, total_scans=qr_code.scan_count)
         
-        # Se for localhost, usa um IP público brasileiro para teste
-        if ip_address in ["127.0.0.1", "::1", "localhost"]:
-            ip_address = "200.98.196.114"
+        return {"qr_code": qr_code, **analytics}
+    
+    def list_scans(self, qr_code_id: int, limit: int = 100, cursor: str = None, days: int = None):
+        """Página de scans (mais recentes primeiro) com paginação por keyset em (scanned_at, id)."""
+        rows = self.db_session.execute(scan_page_stmt(qr_code_id, limit, cursor, days)).all()
+        return scan_page(rows, limit)
+    
+    def iter_scans(self, qr_code_id: int, days: int = None, newest_first: bool = False, batch_size: int = 1000):
+        """Percorre os scans em lotes com cursor do lado do servidor, sem montar a lista inteira."""
+        stmt = iter_scans_stmt(qr_code_id, days, newest_first)
+        result = self.db_session.execute(stmt, execution_options={"yield_per": batch_size})
+        for partition in result.partitions():
+            yield partition
+    
+    def delete_qr_code(self, code: str, user_id: int):
+        qr_code = self.get_user_qr_code(code, user_id)
         
-        try:
-            response = requests.get(f"https://api.ipgeolocation.io/ipgeo?apiKey={api_key}&ip={ip_address}")
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "country": data.get("country_name"),
-                    "city": data.get("city"),
-                    "latitude": data.get("latitude"),
-                    "longitude": data.get("longitude"),
-                    "timezone": data.get("time_zone", {}).get("name"),
-                    "isp": data.get("isp")
-                }
-        except:
-            pass
+        delete_rollups(self.db_session.connection(), qr_code.id)
+        self.db_session.delete(qr_code)
+        self.db_session.commit()
         
-        return {}
+        redirect_cache.invalidate(code)
+        image_cache.invalidate(code)
+
+
+class AsyncQRCodeUseCases:
+    """Versões async dos casos de uso do redirect e do analytics (DB_ASYNC=true).
+
+    As consultas reaproveitam os mesmos builders de statement da versão síncrona.
+    O enriquecimento do scan (geolocalização por HTTP), o cache compartilhado
+    de redirect e o live feed com Redis rodam no threadpool para não bloquear o
+    event loop.
+    """
     
-    def process_scan(self, code: str, ip_address: str, user_agent: str, api_key: str = None) -> str:
-        qr_code = self.db_session.query(QRCodeModel).filter_by(code=code).first()
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+    
+    async def resolve_code(self, code: str) -> RedirectTarget:
+        target = await redirect_cache.aget(code)
+        if target is not None:
+            return target
+        
+        with scan_stage_duration.time("lookup"):
+            result = await self.db_session.execute(
+                select(QRCodeModel.id, QRCodeModel.destination_url).where(QRCodeModel.code == code)
+            )
+            qr_code = result.first()
         
         if not qr_code:
             raise HTTPException(
@@ -103,100 +425,45 @@ class QRCodeUseCases:
                 detail="QR Code not found"
             )
         
-        ua = parse(user_agent)
-        
-        geo_data = {}
-        if api_key:
-            geo_data = self._get_ip_geolocation(ip_address, api_key)
-        
-        scan = ScanAnalyticsModel(
-            qr_code_id=qr_code.id,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            browser=ua.browser.family,
-            browser_version=ua.browser.version_string,
-            os=ua.os.family,
-            os_version=ua.os.version_string,
-            device=ua.device.family,
-            country=geo_data.get("country"),
-            city=geo_data.get("city"),
-            latitude=geo_data.get("latitude"),
-            longitude=geo_data.get("longitude"),
-            timezone=geo_data.get("timezone"),
-            isp=geo_data.get("isp")
+        return await redirect_cache.aset(code, qr_code.id, qr_code.destination_url)
+    
+    async def record_scan(self, qr_code_id: int, ip_address: str, user_agent: str, scanned_at: datetime = None):
+        row = await run_in_threadpool(
+            QRCodeUseCases(db_session=None).enrich_scan, qr_code_id, ip_address, user_agent, scanned_at
         )
-        
-        self.db_session.add(scan)
-        self.db_session.commit()
-        
-        return qr_code.destination_url
+        if row is None:
+            return
+        with scan_stage_duration.time("db_commit"):
+            await self.db_session.run_sync(lambda session: write_scan_rows(session.connection(), [row]))
+            await self.db_session.commit()
+        if not row["suppressed"]:
+            await live_hub.apublish(row)
     
-    def get_analytics(self, code: str, user_id: int, days: int = None):
-        from collections import Counter
-        from datetime import timedelta
-        
-        qr_code = self.db_session.query(QRCodeModel).filter_by(code=code, user_id=user_id).first()
-        
-        if not qr_code:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="QR Code not found or you don't have permission"
-            )
-        
-        scans = qr_code.scans
-        
-        if days:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            scans = [scan for scan in scans if scan.scanned_at >= cutoff_date]
-        
-        # Unique visitors (IPs únicos)
-        unique_ips = len(set(scan.ip_address for scan in scans))
-        
-        # Top browsers
-        browser_counter = Counter(scan.browser for scan in scans if scan.browser)
-        top_browsers = [{"name": name, "count": count} for name, count in browser_counter.most_common(5)]
-        
-        # Top OS
-        os_counter = Counter(scan.os for scan in scans if scan.os)
-        top_os = [{"name": name, "count": count} for name, count in os_counter.most_common(5)]
-        
-        # Top devices
-        device_counter = Counter(scan.device for scan in scans if scan.device)
-        top_devices = [{"type": device, "count": count} for device, count in device_counter.most_common(5)]
-        
-        # Top countries com suas cidades
-        country_counter = Counter(scan.country for scan in scans if scan.country)
-        top_countries = []
-        
-        for country_name, country_count in country_counter.most_common(5):
-            # Pega cidades deste país
-            country_scans = [scan for scan in scans if scan.country == country_name and scan.city]
-            city_counter = Counter(scan.city for scan in country_scans)
-            top_cities = [{"name": city, "count": count} for city, count in city_counter.most_common(3)]
-            
-            top_countries.append({
-                "name": country_name,
-                "count": country_count,
-                "top_cities": top_cities
-            })
-        
-        return {
-            "qr_code": qr_code,
-            "unique_visitors": unique_ips,
-            "top_browsers": top_browsers,
-            "top_os": top_os,
-            "top_devices": top_devices,
-            "top_countries": top_countries
-        }
+    async def process_scan(self, code: str, ip_address: str, user_agent: str) -> str:
+        target = await self.resolve_code(code)
+        await self.record_scan(target.qr_code_id, ip_address, user_agent)
+        return target.destination_url
     
-    def delete_qr_code(self, code: str, user_id: int):
-        qr_code = self.db_session.query(QRCodeModel).filter_by(code=code, user_id=user_id).first()
+    async def get_user_qr_code(self, code: str, user_id: int) -> QRCodeModel:
+        result = await self.db_session.execute(
+            select(QRCodeModel).where(QRCodeModel.code == code, QRCodeModel.user_id == user_id)
+        )
+        return user_qr_code_or_404(result.scalars().first())
+    
+    async def get_analytics(self, code: str, user_id: int, days: int = None):
+        qr_code = await self.get_user_qr_code(code, user_id)
         
-        if not qr_code:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="QR Code not found or you don't have permission"
-            )
+        aggregation = analytics_aggregation(qr_code, days)
+        analytics = await self.db_session.run_sync(aggregation.run, total_scans=qr_code.scan_count)
         
-        self.db_session.delete(qr_code)
-        self.db_session.commit()
+        return {"qr_code": qr_code, **analytics}
+    
+    async def list_scans(self, qr_code_id: int, limit: int = 100, cursor: str = None, days: int = None):
+        result = await self.db_session.execute(scan_page_stmt(qr_code_id, limit, cursor, days))
+        return scan_page(result.all(), limit)
+    
+    async def iter_scans(self, qr_code_id: int, days: int = None, newest_first: bool = False, batch_size: int = 1000):
+        stmt = iter_scans_stmt(qr_code_id, days, newest_first)
+        result = await self.db_session.stream(stmt, execution_options={"yield_per": batch_size})
+        async for partition in result.partitions():
+            yield partition
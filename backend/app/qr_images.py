@@ -0,0 +1,368 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import struct
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+import qrcode
+from decouple import config
+from app.cache import LRUCache
+
+# URL pública do serviço (ex: https://qr.example.com/), codificada nas imagens.
+# Sem ela, vale a URL da request, que vem do header Host
+PUBLIC_BASE_URL = config("PUBLIC_BASE_URL", default="")
+
+
+class RenderedImage(NamedTuple):
+    content: bytes
+    media_type: str
+    etag: str
+
+
+def make_etag(content: bytes) -> str:
+    # ETag forte: muda se e somente se os bytes mudarem
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+def redirect_url(base_url: str, code: str) -> str:
+    return f"{base_url}r/{code}"
+
+
+def public_base_url(request_base_url: str) -> str:
+    if not PUBLIC_BASE_URL:
+        return request_base_url
+    return PUBLIC_BASE_URL if PUBLIC_BASE_URL.endswith("/") else PUBLIC_BASE_URL + "/"
+
+
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml", "pdf": "application/pdf"}
+
+# Processos do pool de renderização em lote (0 = um por CPU)
+QR_RENDER_WORKERS = config("QR_RENDER_WORKERS", default=0, cast=int)
+
+DEFAULT_MODULE_SIZE = 10  # pixels por módulo quando size não é informado
+BORDER = 4  # zona de silêncio, em módulos
+
+
+@lru_cache(maxsize=1024)
+def qr_matrix(data: str, error_correction: str = "L") -> tuple[tuple[bool, ...], ...]:
+    """Matriz de módulos (True = escuro) sem a borda. Fica em cache para que
+    formatos e tamanhos diferentes do mesmo código não refaçam a codificação."""
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECTION[error_correction], border=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.modules)
+
+
+def _dark_runs(row) -> list[tuple[int, int]]:
+    """Sequências horizontais de módulos escuros: (início, comprimento)."""
+    runs = []
+    start = None
+    for x, dark in enumerate(row):
+        if dark and start is None:
+            start = x
+        elif not dark and start is not None:
+            runs.append((start, x - start))
+            start = None
+    if start is not None:
+        runs.append((start, len(row) - start))
+    return runs
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def render_png(matrix, module_size: int = DEFAULT_MODULE_SIZE, border: int = BORDER, size: int = None) -> bytes:
+    """PNG 1 bit em tons de cinza montado direto da matriz, sem desenhar com o PIL.
+
+    Cada linha de módulos vira uma scanline (bits empacotados com int.to_bytes),
+    repetida module_size vezes; a compressão é um único zlib.compress. Com size,
+    a sobra de size sobre os módulos inteiros é somada à borda branca.
+    """
+    modules = len(matrix) + 2 * border
+    width = size or modules * module_size
+    extra = width - modules * module_size
+    before = border * module_size + extra // 2
+    after = border * module_size + extra - extra // 2
+    pad = -width % 8
+    white = "1" * module_size
+    black = "0" * module_size
+
+    blank = b"\x00" + b"\xff" * ((width + pad) // 8)
+    rows = [blank * before]
+    for row in matrix:
+        bits = "1" * before + "".join(black if dark else white for dark in row) + "1" * (after + pad)
+        scanline = b"\x00" + int(bits, 2).to_bytes((width + pad) // 8, "big")
+        rows.append(scanline * module_size)
+    rows.append(blank * after)
+
+    header = struct.pack(">IIBBBBB", width, width, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def render_svg(matrix, size: int, border: int = BORDER) -> bytes:
+    """SVG com um único path (um retângulo por sequência de módulos escuros)."""
+    modules = len(matrix) + 2 * border
+    path = "".join(
+        f"M{x + border},{y + border}h{length}v1h-{length}z"
+        for y, row in enumerate(matrix)
+        for x, length in _dark_runs(row)
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    ).encode("utf-8")
+
+
+def render_pdf(matrix, size: int, border: int = BORDER) -> bytes:
+    """PDF de uma página (size x size pontos) com os módulos como retângulos vetoriais."""
+    modules = len(matrix) + 2 * border
+    scale = size / modules
+    height = len(matrix)
+    # No PDF o eixo y cresce para cima
+    rects = "\n".join(
+        f"{x + border} {height - 1 - y + border} {length} 1 re"
+        for y, row in enumerate(matrix)
+        for x, length in _dark_runs(row)
+    )
+    content = f"q {scale:.4f} 0 0 {scale:.4f} 0 0 cm\n0 g\n{rects}\nf\nQ".encode("ascii")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {size} {size}] /Contents 4 0 R >>".encode("ascii"),
+        f"<< /Length {len(content)} >>\nstream\n".encode("ascii") + content + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("ascii")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def png_min_size(base_url: str, code: str, error_correction: str = "L") -> int:
+    """Menor size do PNG de `code`: um pixel por módulo, com a borda."""
+    return len(qr_matrix(redirect_url(base_url, code), error_correction)) + 2 * BORDER
+
+
+def render_qr_image(
+    base_url: str,
+    code: str,
+    format: str = "png",
+    size: int = None,
+    error_correction: str = "L"
+) -> RenderedImage:
+    """Renderiza o QR Code do redirect de `code`.
+
+    size é a largura em pixels (PNG) ou pontos (SVG/PDF). No PNG os módulos têm
+    um número inteiro de pixels e o que sobra vira borda, então a imagem tem
+    exatamente size pixels; size menor que png_min_size() levanta ValueError.
+    Sem size, cada módulo tem DEFAULT_MODULE_SIZE pixels.
+    """
+    matrix = qr_matrix(redirect_url(base_url, code), error_correction)
+    modules = len(matrix) + 2 * BORDER
+    if format == "png":
+        if size and size < modules:
+            raise ValueError(f"size must be at least {modules} pixels for this QR Code")
+        module_size = size // modules if size else DEFAULT_MODULE_SIZE
+        content = render_png(matrix, module_size, size=size)
+    elif format == "svg":
+        content = render_svg(matrix, size or modules * DEFAULT_MODULE_SIZE)
+    else:
+        content = render_pdf(matrix, size or modules * DEFAULT_MODULE_SIZE)
+    return RenderedImage(content, MEDIA_TYPES[format], make_etag(content))
+
+
+def image_variant(base_url: str, format: str = "png", size: int = None, error_correction: str = "L") -> str:
+    return f"{base_url}|{format}|{size or ''}|{error_correction}"
+
+
+def _render_batch(base_url: str, codes: list[str], format: str, size: int, error_correction: str) -> list[RenderedImage]:
+    return [render_qr_image(base_url, code, format, size, error_correction) for code in codes]
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def render_pool() -> ProcessPoolExecutor:
+    """Pool de processos para renderizações em lote (CPU-bound, não escala com threads).
+
+    Usa spawn: o processo da API tem threads (fila de scans, writer) e um fork
+    herdaria os locks delas num estado qualquer.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=QR_RENDER_WORKERS or None,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(cancel_futures=True)
+            _render_pool = None
+
+
+def render_many(
+    base_url: str,
+    codes: list[str],
+    format: str = "png",
+    size: int = None,
+    error_correction: str = "L",
+    chunk_size: int = 64
+):
+    """Renderiza vários QR Codes no pool de processos, em lotes de chunk_size.
+
+    Gera pares (code, RenderedImage) na ordem de codes, à medida que os lotes
+    ficam prontos. Lotes pequenos são renderizados no próprio processo.
+    """
+    if len(codes) <= chunk_size:
+        yield from zip(codes, _render_batch(base_url, codes, format, size, error_correction))
+        return
+
+    pool = render_pool()
+    chunks = [codes[i:i + chunk_size] for i in range(0, len(codes), chunk_size)]
+    futures = [pool.submit(_render_batch, base_url, chunk, format, size, error_correction) for chunk in chunks]
+    for chunk, future in zip(chunks, futures):
+        yield from zip(chunk, future.result())
+
+
+class ImageCache:
+    """Cache das imagens renderizadas, por código e variante (base_url, formato, tamanho, correção de erro).
+
+    A imagem de um código nunca muda, então o cache não expira: o tier em
+    memória é um LRU limitado pela soma dos bytes das imagens e o tier opcional
+    em disco (cache_dir/<code>/<variante>) sobrevive a restarts e é
+    compartilhado pelos workers da máquina. O disco só guarda disk_variant (a
+    imagem padrão na URL pública): as outras variantes são escolhidas pelo
+    cliente e encheriam o disco sem limite. invalidate() remove as variantes de
+    um código nos dois tiers.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, cache_dir: str | None = None, maxsize: int = 100000,
+                 disk_variant: str | None = None):
+        self.memory = LRUCache(maxsize=maxsize, maxbytes=max_bytes, sizeof=lambda image: len(image.content))
+        self.cache_dir = cache_dir if disk_variant else None
+        self.disk_variant = disk_variant
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self.renders = 0
+
+    def _key(self, code: str, variant: str) -> tuple:
+        return (code, variant)
+
+    def _path(self, code: str, variant: str) -> str:
+        return os.path.join(self.cache_dir, code, hashlib.sha1(variant.encode("utf-8")).hexdigest())
+
+    def get(self, code: str, variant: str) -> RenderedImage | None:
+        image = self.memory.get(self._key(code, variant))
+        if image is not None or not self.cache_dir or variant != self.disk_variant:
+            return image
+
+        path = self._path(code, variant)
+        try:
+            with open(path, "rb") as f:
+                media_type = f.readline().decode("ascii").strip()
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError:
+            self.disk_errors += 1
+            return None
+
+        image = RenderedImage(content, media_type, make_etag(content))
+        self.disk_hits += 1
+        self.memory.set(self._key(code, variant), image)
+        return image
+
+    def set(self, code: str, variant: str, image: RenderedImage) -> RenderedImage:
+        self.memory.set(self._key(code, variant), image)
+
+        if self.cache_dir and variant == self.disk_variant:
+            path = self._path(code, variant)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    f.write(image.media_type.encode("ascii") + b"\n")
+                    f.write(image.content)
+                # Rename atômico: leitores nunca veem um arquivo pela metade
+                os.replace(tmp_path, path)
+            except OSError:
+                self.disk_errors += 1
+
+        return image
+
+    def prerender(
+        self,
+        base_url: str,
+        code: str,
+        format: str = "png",
+        size: int = None,
+        error_correction: str = "L"
+    ) -> RenderedImage:
+        return self.get_or_render(
+            code,
+            image_variant(base_url, format, size, error_correction),
+            lambda: render_qr_image(base_url, code, format, size, error_correction)
+        )
+
+    def get_or_render(self, code: str, variant: str, render) -> RenderedImage:
+        image = self.get(code, variant)
+        if image is None:
+            self.renders += 1
+            image = self.set(code, variant, render())
+        return image
+
+    def invalidate(self, code: str):
+        for key in self.memory.keys():
+            if key[0] == code:
+                self.memory.delete(key)
+
+        if self.cache_dir:
+            shutil.rmtree(os.path.join(self.cache_dir, code), ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.cache_dir or None,
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+            "renders": self.renders
+        }
+
+
+image_cache = ImageCache(
+    max_bytes=config("QR_IMAGE_CACHE_BYTES", default=32 * 1024 * 1024, cast=int),
+    cache_dir=config("QR_IMAGE_CACHE_DIR", default="") or None,
+    # O tier em disco exige PUBLIC_BASE_URL: sem ela cada Host teria suas próprias imagens
+    disk_variant=image_variant(public_base_url(""), "png") if PUBLIC_BASE_URL else None
+)
@@ -1,44 +1,214 @@
-from fastapi import APIRouter, Depends, Request, status
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime
+from decouple import config
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
 from fastapi.responses import JSONResponse, StreamingResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from app.depends import get_db_session, get_current_user
+from app.db.connection import Session as SessionFactory
+from app.depends import get_db_session, get_current_user, get_reader
 from app.qr_code_use_cases import QRCodeUseCases
-from app.schemas import QRCodeCreate, QRCodeResponse, AnalyticsResponse, ScanAnalytic
+from app.ingestion import ScanEvent, scan_ingestion
+from app.qr_images import image_cache, image_variant, public_base_url, redirect_url, render_many
+from app.schemas import QRCodeBulkCreate, QRCodeCreate, QRCodeResponse, AnalyticsResponse, ScanAnalytic, ScanPage
 
 router = APIRouter(prefix="/qr", tags=["QR Codes"])
 redirect_router = APIRouter(tags=["Redirect"])
 analytics_router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
+# Tamanho máximo do CSV de /qr/bulk/csv, conferido antes de ler o arquivo para a memória
+BULK_CSV_MAX_BYTES = config("BULK_CSV_MAX_BYTES", default=8 * 1024 * 1024, cast=int)
+
 
 @router.post("", response_model=QRCodeResponse, status_code=status.HTTP_201_CREATED)
 def create_qr_code(
     qr_data: QRCodeCreate,
     request: Request,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user),
     db_session: Session = Depends(get_db_session)
 ):
     """Cria um novo QR Code para o usuário autenticado"""
     uc = QRCodeUseCases(db_session=db_session)
-    base_url = str(request.base_url)
+    base_url = public_base_url(str(request.base_url))
     qr_code = uc.create_qr_code(qr_data, current_user.id, base_url)
     
+    # Pré-renderiza a imagem depois da resposta, para o primeiro GET já vir do cache
+    background_tasks.add_task(image_cache.prerender, base_url, qr_code.code)
+    
+    # Um QR Code recém-criado ainda não tem scans
     return QRCodeResponse(
         id=qr_code.id,
         code=qr_code.code,
         destination_url=qr_code.destination_url,
         created_at=qr_code.created_at.isoformat(),
-        scan_count=len(qr_code.scans)
+        scan_count=0
+    )
+
+
+def _decode_csv(content: bytes) -> str:
+    # Planilhas exportadas no Windows (Excel) costumam vir em cp1252
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="CSV must be encoded in UTF-8 or Windows-1252"
     )
 
 
+def _read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    too_large = HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"File too large (max {max_bytes} bytes)"
+    )
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+    content = file.file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise too_large
+    return content
+
+
+def _parse_destination_csv(content: bytes) -> list[str]:
+    # Usa a coluna destination_url se houver cabeçalho; senão, a primeira coluna
+    rows = list(csv.reader(io.StringIO(_decode_csv(content))))
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "destination_url" in header:
+        column = header.index("destination_url")
+        rows = rows[1:]
+    else:
+        column = 0
+    return [row[column] for row in rows if len(row) > column]
+
+
+class _ZipBuffer:
+    """Destino do ZipFile que só acumula os bytes até o próximo drain()."""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _bulk_zip(base_url: str, rows: list, format: str, size: int | None, ec: str):
+    """ZIP com a imagem de cada QR Code e um codes.csv, gerado à medida que as
+    imagens saem do pool de processos."""
+    buf = _ZipBuffer()
+    compression = zipfile.ZIP_STORED if format == "png" else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(buf, "w", compression=compression) as archive:
+        codes = [row.code for row in rows]
+        for code, image in render_many(base_url, codes, format, size, ec):
+            image_cache.set(code, image_variant(base_url, format, size, ec), image)
+            archive.writestr(f"{code}.{format}", image.content)
+            yield buf.drain()
+        
+        manifest = io.StringIO()
+        writer = csv.writer(manifest)
+        writer.writerow(["code", "destination_url", "redirect_url"])
+        for row in rows:
+            writer.writerow([row.code, row.destination_url, redirect_url(base_url, row.code)])
+        archive.writestr("codes.csv", manifest.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+    yield buf.drain()
+
+
+def _bulk_response(uc: QRCodeUseCases, destination_urls: list[str], user_id: int, request: Request,
+                   format: str, image_format: str, size: int | None, ec: str):
+    base_url = public_base_url(str(request.base_url))
+    if format == "zip":
+        uc.check_image_size(base_url, image_format, size, ec)
+    rows = uc.create_qr_codes_bulk(destination_urls, user_id)
+    
+    if format == "zip":
+        return StreamingResponse(
+            _bulk_zip(base_url, rows, image_format, size, ec),
+            media_type="application/zip",
+            status_code=status.HTTP_201_CREATED,
+            headers={"Content-Disposition": 'attachment; filename="qr-codes.zip"'}
+        )
+    
+    return JSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content=[
+            QRCodeResponse(
+                id=row.id,
+                code=row.code,
+                destination_url=row.destination_url,
+                created_at=row.created_at.isoformat(),
+                scan_count=0
+            ).model_dump()
+            for row in rows
+        ]
+    )
+
+
+@router.post("/bulk", response_model=list[QRCodeResponse], status_code=status.HTTP_201_CREATED)
+def create_qr_codes_bulk(
+    bulk_data: QRCodeBulkCreate,
+    request: Request,
+    format: str = Query("json", pattern="^(json|zip)$"),
+    image_format: str = Query("png", pattern="^(png|svg|pdf)$"),
+    size: int = Query(None, ge=64, le=4096),
+    ec: str = Query("L", pattern="^[LMQH]$"),
+    current_user = Depends(get_current_user),
+    db_session: Session = Depends(get_db_session)
+):
+    """Cria vários QR Codes numa única transação. Com format=zip a resposta é um ZIP
+    com as imagens (image_format, size, ec como em /qr/image) e um codes.csv"""
+    uc = QRCodeUseCases(db_session=db_session)
+    return _bulk_response(uc, bulk_data.destination_urls, current_user.id, request, format, image_format, size, ec)
+
+
+@router.post("/bulk/csv", response_model=list[QRCodeResponse], status_code=status.HTTP_201_CREATED)
+def create_qr_codes_bulk_csv(
+    request: Request,
+    file: UploadFile = File(...),
+    format: str = Query("json", pattern="^(json|zip)$"),
+    image_format: str = Query("png", pattern="^(png|svg|pdf)$"),
+    size: int = Query(None, ge=64, le=4096),
+    ec: str = Query("L", pattern="^[LMQH]$"),
+    current_user = Depends(get_current_user),
+    db_session: Session = Depends(get_db_session)
+):
+    """Igual a /qr/bulk, lendo as URLs de um CSV (coluna destination_url ou a primeira coluna)"""
+    uc = QRCodeUseCases(db_session=db_session)
+    destination_urls = _parse_destination_csv(_read_upload(file, BULK_CSV_MAX_BYTES))
+    return _bulk_response(uc, destination_urls, current_user.id, request, format, image_format, size, ec)
+
+
 @router.get("", response_model=list[QRCodeResponse])
 def list_user_qr_codes(
-    current_user = Depends(get_current_user),
+    response: Response,
+    sort: str = Query("created_at", pattern="^(created_at|scan_count|code)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(None, ge=1, le=1000),
+    cursor: str = None,
+    current_user = Depends(get_reader),
     db_session: Session = Depends(get_db_session)
 ):
-    """Lista todos os QR Codes do usuário autenticado"""
+    """Lista os QR Codes do usuário autenticado. Com limit a lista é paginada: o cursor
+    da próxima página vem no header X-Next-Cursor"""
     uc = QRCodeUseCases(db_session=db_session)
-    qr_codes = uc.get_user_qr_codes(current_user.id)
+    qr_codes, next_cursor = uc.get_user_qr_codes(current_user.id, sort, order, limit, cursor)
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return [
         QRCodeResponse(
@@ -46,20 +216,46 @@ def list_user_qr_codes(
             code=qr.code,
             destination_url=qr.destination_url,
             created_at=qr.created_at.isoformat(),
-            scan_count=len(qr.scans)
+            scan_count=qr.scan_count,
+            last_scanned_at=qr.last_scanned_at.isoformat() if qr.last_scanned_at else None
         )
         for qr in qr_codes
     ]
 
 
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match usa comparação fraca: ignora o prefixo W/
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
 @router.get("/image/{code}")
-def get_qr_image(code: str, request: Request, db_session: Session = Depends(get_db_session)):
-    """Retorna a imagem PNG do QR Code"""
+def get_qr_image(
+    code: str,
+    request: Request,
+    format: str = Query("png", pattern="^(png|svg|pdf)$"),
+    size: int = Query(None, ge=64, le=4096),
+    ec: str = Query("L", pattern="^[LMQH]$"),
+    db_session: Session = Depends(get_db_session)
+):
+    """Retorna a imagem do QR Code em PNG, SVG ou PDF. size é a largura em pixels (PNG) ou pontos
+    (SVG/PDF) e ec o nível de correção de erro (L, M, Q, H). A imagem de um código nunca muda:
+    a resposta tem ETag e pode ficar em cache indefinidamente (If-None-Match responde 304)"""
     uc = QRCodeUseCases(db_session=db_session)
-    base_url = str(request.base_url)
-    image_buffer = uc.generate_qr_image(code, base_url)
+    base_url = public_base_url(str(request.base_url))
+    image = uc.generate_qr_image(code, base_url, format, size, ec)
     
-    return StreamingResponse(image_buffer, media_type="image/png")
+    headers = {"ETag": image.etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), image.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(content=image.content, media_type=image.media_type, headers=headers)
 
 
 @router.delete("/{code}", status_code=status.HTTP_204_NO_CONTENT)
@@ -81,50 +277,48 @@ def redirect_and_track(
     db_session: Session = Depends(get_db_session)
 ):
     """Captura analytics e redireciona para URL de destino"""
-    import os
-    
     ip_address = request.client.host
     user_agent = request.headers.get("user-agent", "Unknown")
-    api_key = os.getenv("IPGEOLOCATION_API_KEY")
     
     uc = QRCodeUseCases(db_session=db_session)
-    destination_url = uc.process_scan(code, ip_address, user_agent, api_key)
+    target = uc.resolve_code(code)
     
-    return RedirectResponse(url=destination_url, status_code=status.HTTP_302_FOUND)
+    # O scan é gravado em background; sem o pipeline rodando, grava na hora
+    event = ScanEvent(target.qr_code_id, ip_address, user_agent, datetime.utcnow())
+    if not scan_ingestion.submit(event):
+        uc.record_scan(target.qr_code_id, ip_address, user_agent, event.scanned_at)
+    
+    return RedirectResponse(url=target.destination_url, status_code=status.HTTP_302_FOUND)
+
+
+def _scan_to_dict(scan) -> dict:
+    data = scan._asdict()
+    data["scanned_at"] = scan.scanned_at.isoformat()
+    return data
 
 
 @analytics_router.get("/{code}", response_model=AnalyticsResponse)
 def get_qr_analytics(
     code: str,
     days: int = None,
-    current_user = Depends(get_current_user),
+    include_scans: bool = True,
+    current_user = Depends(get_reader),
     db_session: Session = Depends(get_db_session)
 ):
-    """Retorna as estatísticas de scans de um QR Code. Use days para filtrar (ex: days=7 para últimos 7 dias)"""
+    """Retorna as estatísticas de scans de um QR Code. Use days para filtrar (ex: days=7 para últimos 7 dias)
+    e include_scans=false para receber só o resumo (a lista de scans fica em /analytics/{code}/scans)"""
     uc = QRCodeUseCases(db_session=db_session)
     analytics = uc.get_analytics(code, current_user.id, days)
     
     qr_code = analytics["qr_code"]
     
-    scans_data = [
-        ScanAnalytic(
-            id=scan.id,
-            ip_address=scan.ip_address,
-            browser=scan.browser,
-            browser_version=scan.browser_version,
-            os=scan.os,
-            os_version=scan.os_version,
-            device=scan.device,
-            country=scan.country,
-            city=scan.city,
-            latitude=scan.latitude,
-            longitude=scan.longitude,
-            timezone=scan.timezone,
-            isp=scan.isp,
-            scanned_at=scan.scanned_at.isoformat()
-        )
-        for scan in qr_code.scans
-    ]
+    scans_data = []
+    if include_scans:
+        scans_data = [
+            ScanAnalytic(**_scan_to_dict(scan))
+            for partition in uc.iter_scans(qr_code.id)
+            for scan in partition
+        ]
     
     return AnalyticsResponse(
         qr_code=QRCodeResponse(
@@ -132,9 +326,10 @@ def get_qr_analytics(
             code=qr_code.code,
             destination_url=qr_code.destination_url,
             created_at=qr_code.created_at.isoformat(),
-            scan_count=len(qr_code.scans)
+            scan_count=qr_code.scan_count,
+            last_scanned_at=qr_code.last_scanned_at.isoformat() if qr_code.last_scanned_at else None
         ),
-        total_scans=len(qr_code.scans),
+        total_scans=analytics["total_scans"],
         unique_visitors=analytics["unique_visitors"],
         scans=scans_data,
         top_browsers=analytics["top_browsers"],
@@ -142,3 +337,57 @@ def get_qr_analytics(
         top_devices=analytics["top_devices"],
         top_countries=analytics["top_countries"]
     )
+
+
+def _stream_scans(qr_code_id: int, days: int | None, format: str):
+    # Sessão própria: o gerador roda enquanto a resposta é enviada
+    session = SessionFactory()
+    try:
+        uc = QRCodeUseCases(db_session=session)
+        if format == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(ScanAnalytic.model_fields.keys())
+            for partition in uc.iter_scans(qr_code_id, days, newest_first=True):
+                for scan in partition:
+                    writer.writerow(_scan_to_dict(scan).values())
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue()
+        else:
+            for partition in uc.iter_scans(qr_code_id, days, newest_first=True):
+                yield "".join(json.dumps(_scan_to_dict(scan), ensure_ascii=False) + "\n" for scan in partition)
+    finally:
+        session.close()
+
+
+@analytics_router.get("/{code}/scans", response_model=ScanPage)
+def list_qr_scans(
+    code: str,
+    days: int = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str = None,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    current_user = Depends(get_reader),
+    db_session: Session = Depends(get_db_session)
+):
+    """Lista os scans de um QR Code, do mais recente para o mais antigo. Em format=json a lista é paginada
+    (use o next_cursor da resposta em cursor); ndjson e csv fazem streaming de todos os scans do período"""
+    uc = QRCodeUseCases(db_session=db_session)
+    qr_code = uc.get_user_qr_code(code, current_user.id)
+    
+    if format == "ndjson":
+        return StreamingResponse(_stream_scans(qr_code.id, days, format), media_type="application/x-ndjson")
+    if format == "csv":
+        return StreamingResponse(
+            _stream_scans(qr_code.id, days, format),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{code}-scans.csv"'}
+        )
+    
+    scans, next_cursor = uc.list_scans(qr_code.id, limit, cursor, days)
+    return ScanPage(
+        scans=[ScanAnalytic(**_scan_to_dict(scan)) for scan in scans],
+        next_cursor=next_cursor
+    )
@@ -0,0 +1,352 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from decouple import config
+from app.metrics import Counter, registry
+
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMIT_MAX_KEYS = config("RATE_LIMIT_MAX_KEYS", default=100000, cast=int)
+
+# Ocupação da fila de scans a partir da qual as rotas de escrita (exceto o /r/{code}) são recusadas com 503
+SHED_QUEUE_RATIO = config("SHED_QUEUE_RATIO", default=0.9, cast=float)
+SHED_RETRY_AFTER = config("SHED_RETRY_AFTER", default=1, cast=int)
+
+rate_limited = registry.register(Counter(
+    "rate_limited_total", "Requests recusadas com 429 por regra de rate limit", ("rule",)
+))
+load_shed = registry.register(Counter(
+    "load_shed_total", "Requests recusadas com 503 por sobrecarga", ("reason",)
+))
+
+
+class Rule(NamedTuple):
+    """Token bucket: até `limit` requests de uma vez, repostas em `period` segundos."""
+
+    name: str
+    limit: int
+    period: float
+    key: str  # ip ou ip_code
+
+
+def parse_rule(name: str, value: str, key: str = "ip") -> Rule:
+    # Formato "<requests>/<segundos>", ex: 10/60
+    limit, period = value.split("/")
+    return Rule(name, int(limit), float(period), key)
+
+
+class RateLimitStore:
+    """Armazena os token buckets. hit() consome um token e retorna 0 se a request
+    pode seguir, ou quantos segundos faltam para o próximo token."""
+
+    async def hit(self, key: str, rule: Rule) -> float:
+        raise NotImplementedError
+
+    async def refund(self, key: str, rule: Rule):
+        """Devolve o token consumido por um hit() que acabou não sendo usado."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+def _take(full_at: float | None, now: float, rule: Rule) -> tuple[float, float]:
+    """Token bucket guardado como um único número (GCRA): o instante em que o
+    bucket estará cheio de novo. Retorna (novo full_at, espera)."""
+    interval = rule.period / rule.limit
+    full_at = max(full_at or now, now) + interval
+    wait = full_at - now - rule.period
+    if wait > 0:
+        # Sem token: a request recusada não consome nada
+        return full_at - interval, wait
+    return full_at, 0.0
+
+
+class LocalRateLimitStore(RateLimitStore):
+    """Buckets em memória do processo (um worker, desenvolvimento e testes).
+
+    Cada chave guarda só o instante em que o bucket estará cheio; depois disso
+    o bucket equivale a não existir e a chave expira. O total de chaves é
+    limitado por max_keys (LRU).
+    """
+
+    def __init__(self, max_keys: int = 100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    async def hit(self, key: str, rule: Rule) -> float:
+        return self.take(key, rule)
+
+    def take(self, key: str, rule: Rule) -> float:
+        now = self.clock()
+        with self._lock:
+            full_at, wait = _take(self._buckets.pop(key, None), now, rule)
+            self._buckets[key] = full_at
+
+            # Remove do início (menos usados) os expirados e o que passar do limite
+            while self._buckets:
+                oldest = next(iter(self._buckets))
+                if len(self._buckets) > self.max_keys:
+                    self.evictions += 1
+                elif self._buckets[oldest] > now:
+                    break
+                del self._buckets[oldest]
+            return wait
+
+    async def refund(self, key: str, rule: Rule):
+        now = self.clock()
+        with self._lock:
+            full_at = self._buckets.get(key)
+            if full_at is None:
+                return
+            full_at -= rule.period / rule.limit
+            if full_at > now:
+                self._buckets[key] = full_at
+            else:
+                del self._buckets[key]
+
+    def stats(self) -> dict:
+        return {"keys": len(self._buckets), "max_keys": self.max_keys, "evictions": self.evictions}
+
+
+# Mesmo cálculo de _take, atômico no Redis; a chave expira quando o bucket enche
+_REDIS_TAKE = """
+local period = tonumber(ARGV[1])
+local interval = period / tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local full_at = math.max(tonumber(redis.call("GET", KEYS[1])) or now, now) + interval
+local wait = full_at - now - period
+if wait > 0 then
+  return tostring(wait)
+end
+redis.call("SET", KEYS[1], tostring(full_at), "PX", math.ceil((full_at - now) * 1000))
+return "0"
+"""
+
+_REDIS_REFUND = """
+local full_at = tonumber(redis.call("GET", KEYS[1]))
+if not full_at then
+  return 0
+end
+local now = tonumber(ARGV[3])
+full_at = full_at - tonumber(ARGV[1]) / tonumber(ARGV[2])
+if full_at > now then
+  redis.call("SET", KEYS[1], tostring(full_at), "PX", math.ceil((full_at - now) * 1000))
+else
+  redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets compartilhados entre workers. Se o Redis falhar, a request segue
+    (fail open): o rate limit nunca derruba o redirect."""
+
+    def __init__(self, url: str, prefix: str = "qrtrack:ratelimit:"):
+        import redis.asyncio
+
+        self.client = redis.asyncio.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.1)
+        self.prefix = prefix
+        self._take = self.client.register_script(_REDIS_TAKE)
+        self._refund = self.client.register_script(_REDIS_REFUND)
+        self.backend_errors = 0
+
+    async def hit(self, key: str, rule: Rule) -> float:
+        try:
+            wait = await self._take(keys=[self.prefix + key], args=[rule.period, rule.limit, time.time()])
+        except Exception:
+            self.backend_errors += 1
+            return 0.0
+        return float(wait)
+
+    async def refund(self, key: str, rule: Rule):
+        try:
+            await self._refund(keys=[self.prefix + key], args=[rule.period, rule.limit, time.time()])
+        except Exception:
+            self.backend_errors += 1
+
+    def stats(self) -> dict:
+        return {"backend_errors": self.backend_errors}
+
+
+class RouteLimits(NamedTuple):
+    method: str
+    path: str  # terminado em / casa como prefixo
+    rules: tuple
+    shed: bool = False
+
+    def matches(self, method: str, path: str) -> bool:
+        if method != self.method:
+            return False
+        return path.startswith(self.path) if self.path.endswith("/") else path == self.path
+
+
+def _rules(*rules) -> tuple:
+    return tuple(rule for rule in rules if rule is not None)
+
+
+def optional_rule(name: str, value: str, key: str = "ip") -> Rule | None:
+    # Vazio desliga a regra
+    return parse_rule(name, value, key) if value else None
+
+
+ROUTE_LIMITS = (
+    # Sem limite por IP + código por padrão: atrás de CGNAT ou do wifi de um
+    # evento, muita gente escaneia o mesmo cartaz com o mesmo IP
+    RouteLimits("GET", "/r/", _rules(
+        parse_rule("redirect", config("RATE_LIMIT_REDIRECT", default="300/60")),
+        optional_rule("redirect_code", config("RATE_LIMIT_REDIRECT_CODE", default=""), key="ip_code"),
+    )),
+    RouteLimits("POST", "/users/login", (
+        parse_rule("login", config("RATE_LIMIT_LOGIN", default="10/60")),
+    ), shed=True),
+    RouteLimits("POST", "/users/register", (
+        parse_rule("register", config("RATE_LIMIT_REGISTER", default="5/600")),
+    ), shed=True),
+    # Criação de QR Codes: sem limite por IP (já exige login), só a recusa sob sobrecarga
+    RouteLimits("POST", "/qr", (), shed=True),
+    RouteLimits("POST", "/qr/bulk", (), shed=True),
+    RouteLimits("POST", "/qr/bulk/csv", (), shed=True),
+)
+
+
+class LoadShedder:
+    """Recusa requests enquanto a fila de scans ou um pool do banco está
+    saturado, em vez de deixá-las esperando por um recurso que não vai liberar
+    a tempo. A fila cheia quer dizer que o writer não acompanha o banco: recusar
+    login, cadastro e criação de QR Codes deixa o banco para os scans.
+
+    O /r/{code} não passa por aqui: com o código no cache ele nem usa o banco,
+    e a fila de scans cheia é tratada pela política da ingestão (o visitante é
+    redirecionado e só o scan é descartado ou vai para o disco).
+    """
+
+    def __init__(self, queue_ratio: float = 0.9):
+        self.queue_ratio = queue_ratio
+        self._queue = None
+        self._pools = []
+
+    def watch_queue(self, ingestion):
+        self._queue = ingestion
+
+    def watch_pool(self, pool, capacity: int):
+        # Só pools com tamanho fixo (QueuePool) informam as conexões em uso
+        if hasattr(pool, "checkedout"):
+            self._pools.append((pool, capacity))
+
+    def overloaded(self) -> str | None:
+        if self._queue is not None and self._queue.running and self._queue.load() >= self.queue_ratio:
+            return "scan_queue"
+        for pool, capacity in self._pools:
+            if pool.checkedout() >= capacity:
+                return "db_pool"
+        return None
+
+
+def _json_response(status_code: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+    ]
+    return body, {"type": "http.response.start", "status": status_code, "headers": headers}
+
+
+class RateLimiter:
+    def __init__(self, store: RateLimitStore, routes: tuple = ROUTE_LIMITS, shedder: LoadShedder = None,
+                 shed_retry_after: int = 1):
+        self.store = store
+        self.routes = routes
+        self.shedder = shedder
+        self.shed_retry_after = shed_retry_after
+        self.allowed = 0
+        self.limited = {}
+        self.shed = {}
+
+    def route_limits(self, method: str, path: str) -> RouteLimits | None:
+        for route in self.routes:
+            if route.matches(method, path):
+                return route
+        return None
+
+    async def check(self, route: RouteLimits, ip: str, path: str) -> tuple[int, str, float] | None:
+        """None se a request pode seguir; senão (status, detail, retry_after)."""
+        if route.shed and self.shedder is not None:
+            reason = self.shedder.overloaded()
+            if reason is not None:
+                self.shed[reason] = self.shed.get(reason, 0) + 1
+                load_shed.inc(reason)
+                return 503, "Service overloaded, try again", self.shed_retry_after
+
+        taken = []
+        for rule in route.rules:
+            key = f"{rule.name}:{ip}"
+            if rule.key == "ip_code":
+                key += ":" + path[len(route.path):]
+            wait = await self.store.hit(key, rule)
+            if wait > 0:
+                # A request recusada não gasta os tokens das regras anteriores
+                for taken_key, taken_rule in taken:
+                    await self.store.refund(taken_key, taken_rule)
+                self.limited[rule.name] = self.limited.get(rule.name, 0) + 1
+                rate_limited.inc(rule.name)
+                return 429, "Too many requests", wait
+            taken.append((key, rule))
+
+        self.allowed += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            **self.store.stats(),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "shed": self.shed
+        }
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI que aplica os limites de ROUTE_LIMITS por IP do cliente
+    (e por IP + código no /r/{code}), respondendo 429 ou 503 com Retry-After."""
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self.limiter.route_limits(scope["method"], scope["path"])
+        if route is not None:
+            client = scope.get("client")
+            ip = client[0] if client else "unknown"
+            rejected = await self.limiter.check(route, ip, scope["path"])
+            if rejected is not None:
+                status_code, detail, retry_after = rejected
+                body, start = _json_response(status_code, detail, retry_after)
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+        await self.app(scope, receive, send)
+
+
+def _build_store() -> RateLimitStore:
+    url = config("RATE_LIMIT_URL", default="")
+    if not url or url == "memory://":
+        return LocalRateLimitStore(RATE_LIMIT_MAX_KEYS)
+    return RedisRateLimitStore(url)
+
+
+load_shedder = LoadShedder(SHED_QUEUE_RATIO)
+rate_limiter = RateLimiter(_build_store(), shedder=load_shedder, shed_retry_after=SHED_RETRY_AFTER)
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from app.db.models import ScanAnalyticsModel, ScanBucketModel, ScanRollupModel
+from app.hll import HyperLogLog
+
+# Bucket único com o acumulado de todo o período (consultas sem days)
+TOTAL_BUCKET = datetime(1970, 1, 1)
+GRANULARITIES = ("hour", "day", "total")
+DIMENSIONS = ("browser", "os", "device", "country")
+
+ROLLUP_KEY = ["qr_code_id", "granularity", "bucket_start", "dimension", "parent", "value"]
+BUCKET_KEY = ["qr_code_id", "granularity", "bucket_start"]
+
+
+def bucket_start(scanned_at: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return scanned_at.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return scanned_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return TOTAL_BUCKET
+
+
+def _upsert_increment(connection: Connection, table, rows: list[dict], key: list[str], column: str):
+    """INSERT ... ON CONFLICT DO UPDATE column = column + excluded.column."""
+    if not rows:
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_fn = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert_fn(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key,
+            set_={column: table.c[column] + stmt.excluded[column]}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(*[table.c[name] == row[name] for name in key])
+            .values({column: table.c[column] + row[column]})
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table), row)
+
+
+def apply_rollups(connection: Connection, rows: list[dict], granularities: tuple = GRANULARITIES):
+    """Atualiza os rollups e os sketches de visitantes com um lote de scans.
+
+    Roda na mesma transação do insert dos scans. As chaves são ordenadas para
+    que workers concorrentes travem as linhas sempre na mesma ordem.
+    """
+    if not rows:
+        return
+
+    counts = defaultdict(int)
+    buckets = defaultdict(lambda: [0, HyperLogLog()])
+
+    for row in rows:
+        for granularity in granularities:
+            start = bucket_start(row["scanned_at"], granularity)
+            bucket = buckets[(row["qr_code_id"], granularity, start)]
+            bucket[0] += 1
+            bucket[1].add(row["ip_address"])
+
+            for dimension in DIMENSIONS:
+                if row.get(dimension):
+                    counts[(row["qr_code_id"], granularity, start, dimension, "", row[dimension])] += 1
+            if row.get("country") and row.get("city"):
+                counts[(row["qr_code_id"], granularity, start, "city", row["country"], row["city"])] += 1
+
+    _upsert_increment(
+        connection,
+        ScanRollupModel.__table__,
+        [dict(zip(ROLLUP_KEY, key), count=count) for key, count in sorted(counts.items())],
+        ROLLUP_KEY,
+        "count"
+    )
+
+    # O upsert do contador cria/trava as linhas dos buckets antes do merge dos sketches
+    bucket_keys = sorted(buckets)
+    _upsert_increment(
+        connection,
+        ScanBucketModel.__table__,
+        [dict(zip(BUCKET_KEY, key), scans=buckets[key][0]) for key in bucket_keys],
+        BUCKET_KEY,
+        "scans"
+    )
+
+    table = ScanBucketModel.__table__
+    existing = connection.execute(
+        select(table.c.id, table.c.qr_code_id, table.c.granularity, table.c.bucket_start, table.c.visitors_sketch)
+        .where(
+            table.c.qr_code_id.in_({key[0] for key in bucket_keys}),
+            table.c.bucket_start.in_({key[2] for key in bucket_keys})
+        )
+        .order_by(table.c.id)
+        .with_for_update()
+    ).all()
+
+    for bucket_id, qr_code_id, granularity, start, sketch in existing:
+        bucket = buckets.get((qr_code_id, granularity, start))
+        if bucket is None:
+            continue
+        merged = bucket[1]
+        if sketch is not None:
+            merged.merge(HyperLogLog.from_bytes(sketch))
+        connection.execute(
+            update(table).where(table.c.id == bucket_id).values(visitors_sketch=merged.to_bytes())
+        )
+
+
+def delete_rollups(connection: Connection, qr_code_id: int = None, since: datetime = None):
+    for model in (ScanRollupModel, ScanBucketModel):
+        stmt = delete(model)
+        if qr_code_id is not None:
+            stmt = stmt.where(model.qr_code_id == qr_code_id)
+        if since is not None:
+            stmt = stmt.where(model.granularity.in_(("hour", "day")), model.bucket_start >= since)
+        connection.execute(stmt)
+
+
+def backfill_rollups(connection: Connection, qr_code_id: int = None, chunk_size: int = 20000,
+                     since: datetime = None) -> int:
+    """Reconstrói os rollups a partir de scan_analytics (de um QR Code ou de todos),
+    ignorando os scans marcados pelo filtro.
+
+    Com since (início dos scans mantidos pela retenção), só os buckets de hora e
+    dia a partir de since são reconstruídos: os anteriores e o acumulado total
+    dependem de scans que não existem mais e ficam como estão.
+    """
+    delete_rollups(connection, qr_code_id, since)
+
+    scans = ScanAnalyticsModel.__table__
+    columns = [scans.c.qr_code_id, scans.c.ip_address, scans.c.scanned_at] + [
+        scans.c[name] for name in DIMENSIONS + ("city",)
+    ]
+    stmt = select(*columns).where(scans.c.suppressed.is_(None)).order_by(scans.c.id)
+    if qr_code_id is not None:
+        stmt = stmt.where(scans.c.qr_code_id == qr_code_id)
+    granularities = GRANULARITIES
+    if since is not None:
+        stmt = stmt.where(scans.c.scanned_at >= since)
+        granularities = ("hour", "day")
+
+    total = 0
+    result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+    for partition in result.mappings().partitions():
+        chunk = [dict(row) for row in partition]
+        apply_rollups(connection, chunk, granularities)
+        total += len(chunk)
+    return total
@@ -4,24 +4,25 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.depends import get_db_session, get_current_user
 from app.auth_user import UserUseCases
+from app.passwords import login_slot
 from app.schemas import User, UserLogin
 
 router = APIRouter(prefix="/users")
 
-@router.post("/register")
-def register_user(user: User, db_session: Session = Depends(get_db_session)):
+@router.post("/register", dependencies=[Depends(login_slot)])
+async def register_user(user: User, db_session: Session = Depends(get_db_session)):
     uc = UserUseCases(db_session=db_session)
-    uc.user_register(user=user)
+    await uc.user_register(user=user)
     return JSONResponse(
         content={"message": "User registered successfully"},
         status_code=status.HTTP_201_CREATED
     )
 
-@router.post("/login")
-def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db_session: Session = Depends(get_db_session)):
+@router.post("/login", dependencies=[Depends(login_slot)])
+async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db_session: Session = Depends(get_db_session)):
     uc = UserUseCases(db_session=db_session)
     user_login = UserLogin(username=form_data.username, password=form_data.password)
-    token_data = uc.user_login(user=user_login)
+    token_data = await uc.user_login(user=user_login)
     return token_data
 
 @router.get("/me")
@@ -0,0 +1,154 @@
+import hashlib
+import math
+import re
+import threading
+import time
+from decouple import Csv, config
+from app.metrics import Counter, registry
+from app.user_agent import ParsedUserAgent
+
+# flag: grava o scan marcado em scan_analytics.suppressed; drop: descarta; off: sem filtro
+SCAN_FILTER_POLICY = config("SCAN_FILTER_POLICY", default="flag")
+SCAN_DEDUPE_WINDOW = config("SCAN_DEDUPE_WINDOW", default=30, cast=float)
+SCAN_DEDUPE_CAPACITY = config("SCAN_DEDUPE_CAPACITY", default=1000000, cast=int)
+SCAN_DEDUPE_ERROR_RATE = config("SCAN_DEDUPE_ERROR_RATE", default=0.001, cast=float)
+
+# Prévias de link de apps de mensagem/redes sociais e scanners de segurança de
+# e-mail: buscam a URL sem uma pessoa ter escaneado. Trechos em minúsculas.
+PREVIEW_AGENTS = (
+    "facebookexternalhit", "facebot", "whatsapp", "telegrambot", "twitterbot",
+    "slackbot", "slack-imgproxy", "discordbot", "linkedinbot", "skypeuripreview",
+    "microsoftpreview", "bingpreview", "pinterestbot", "redditbot", "embedly",
+    "iframely", "vkshare", "googleimageproxy", "google-pagerenderer", "applebot",
+    "mattermost", "proofpoint", "mimecast", "barracuda", "urlscan", "virustotal",
+    "zgrab", "censysinspect",
+) + tuple(agent.lower() for agent in config("SCAN_PREVIEW_AGENTS", default="", cast=Csv()))
+
+scans_filtered = registry.register(Counter(
+    "scans_total", "Scans recebidos por resultado do filtro (accepted, bot, preview, duplicate)", ("result",)
+))
+
+
+class BloomFilter:
+    """Conjunto aproximado com tamanho fixo: sem falsos negativos e com falsos
+    positivos em torno de error_rate até capacity chaves."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key: bytes) -> list[int]:
+        # Double hashing: k posições a partir de dois hashes de 64 bits
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def contains(self, positions: list[int]) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, positions: list[int]):
+        for p in positions:
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class RotatingBloomFilter:
+    """Lembra as chaves vistas nos últimos window segundos com memória fixa.
+
+    Duas gerações: as chaves entram na atual e são procuradas nas duas. A cada
+    window segundos (ou quando a atual chega em capacity chaves) a anterior é
+    descartada e a atual vira a anterior, então uma chave é lembrada por pelo
+    menos window segundos (e no máximo 2x window).
+    """
+
+    def __init__(self, window: float, capacity: int, error_rate: float, clock=time.monotonic):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.clock = clock
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = clock()
+        self._lock = threading.Lock()
+        self.rotations = 0
+
+    def _rotate(self):
+        self._previous = self._current
+        self._current = BloomFilter(self.capacity, self.error_rate)
+        self._rotated_at = self.clock()
+        self.rotations += 1
+
+    def seen(self, key: bytes) -> bool:
+        """True se a chave já apareceu na janela; registra a chave."""
+        positions = self._current.positions(key)
+        with self._lock:
+            if self.clock() - self._rotated_at >= self.window or self._current.count >= self.capacity:
+                self._rotate()
+            if self._current.contains(positions):
+                return True
+            found = self._previous.contains(positions)
+            # Chave só na geração anterior volta para a atual, para continuar lembrada
+            self._current.add(positions)
+            return found
+
+    def memory_bytes(self) -> int:
+        return len(self._current.bits) + len(self._previous.bits)
+
+
+class ScanFilter:
+    """Classifica os scans antes da gravação: bot (user agent de robô), preview
+    (prévia de link ou scanner de segurança) ou duplicate (mesmo ip, user agent
+    e QR Code dentro da janela). Retorna None para um scan válido."""
+
+    def __init__(self, policy: str = "flag", dedupe_window: float = 30, capacity: int = 1000000,
+                 error_rate: float = 0.001, preview_agents: tuple = PREVIEW_AGENTS):
+        self.policy = policy
+        self._preview = re.compile("|".join(re.escape(agent) for agent in preview_agents))
+        self.dedupe = None
+        if policy != "off" and dedupe_window > 0:
+            self.dedupe = RotatingBloomFilter(dedupe_window, capacity, error_rate)
+        self.counts = {"accepted": 0, "bot": 0, "preview": 0, "duplicate": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy != "off"
+
+    def classify(self, qr_code_id: int, ip_address: str, user_agent: str, ua: ParsedUserAgent) -> str | None:
+        if self._preview.search(user_agent.lower()):
+            return "preview"
+        if ua.is_bot:
+            return "bot"
+        if self.dedupe is not None and self.dedupe.seen(f"{qr_code_id}|{ip_address}|{user_agent}".encode("utf-8")):
+            return "duplicate"
+        return None
+
+    def check(self, qr_code_id: int, ip_address: str, user_agent: str, ua: ParsedUserAgent) -> str | None:
+        if not self.enabled:
+            return None
+        reason = self.classify(qr_code_id, ip_address, user_agent, ua)
+        result = reason or "accepted"
+        self.counts[result] += 1
+        scans_filtered.inc(result)
+        return reason
+
+    def stats(self) -> dict:
+        stats = {"policy": self.policy, **self.counts}
+        if self.dedupe is not None:
+            stats.update(
+                dedupe_window=self.dedupe.window,
+                dedupe_rotations=self.dedupe.rotations,
+                dedupe_memory_bytes=self.dedupe.memory_bytes()
+            )
+        return stats
+
+
+scan_filter = ScanFilter(
+    policy=SCAN_FILTER_POLICY,
+    dedupe_window=SCAN_DEDUPE_WINDOW,
+    capacity=SCAN_DEDUPE_CAPACITY,
+    error_rate=SCAN_DEDUPE_ERROR_RATE
+)
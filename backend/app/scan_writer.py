@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from io import StringIO
+from sqlalchemy import exc, insert, select
+from sqlalchemy.engine import Connection, Engine
+from app.db.models import QRCodeModel, ScanAnalyticsModel
+from app.counters import apply_scan_counters
+from app.metrics import scan_stage_duration
+from app.rollups import apply_rollups
+
+SCAN_COLUMNS = [
+    column.name for column in ScanAnalyticsModel.__table__.columns if column.name != "id"
+]
+
+# Erros de conexão/banco indisponível: o lote inteiro é tentado de novo depois.
+# Qualquer outro erro é atribuído aos dados (ex: FK de um QR Code apagado)
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, OSError)
+
+try:
+    import psycopg2  # noqa: F401
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+
+def _copy_value(value) -> str:
+    # No formato CSV do COPY, campo vazio sem aspas é NULL e "" é string vazia
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_rows(connection: Connection, rows: list[dict]):
+    buf = StringIO()
+    for row in rows:
+        buf.write(",".join(_copy_value(row.get(column)) for column in SCAN_COLUMNS))
+        buf.write("\n")
+    buf.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {ScanAnalyticsModel.__tablename__} ({', '.join(SCAN_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+    finally:
+        cursor.close()
+
+
+def write_scan_rows(connection: Connection, rows: list[dict], use_copy: bool = True):
+    """Insere as linhas de scan_analytics na transação de `connection` e
+    atualiza os contadores dos QR Codes e os rollups na mesma transação.
+
+    No PostgreSQL com psycopg2 usa COPY; nos outros bancos, um executemany.
+    """
+    if not rows:
+        return
+
+    if use_copy and HAS_PSYCOPG2 and connection.dialect.driver == "psycopg2":
+        _copy_rows(connection, rows)
+    else:
+        connection.execute(insert(ScanAnalyticsModel.__table__), rows)
+
+    # Scans marcados pelo filtro (app/scan_filter.py) ficam fora dos contadores e rollups
+    counted = [row for row in rows if not row.get("suppressed")]
+    apply_scan_counters(connection, counted)
+    apply_rollups(connection, counted)
+
+
+def _encode_row(row: dict) -> str:
+    return json.dumps(row, default=lambda value: value.isoformat())
+
+
+def _decode_row(line: str) -> dict:
+    row = json.loads(line)
+    row["scanned_at"] = datetime.fromisoformat(row["scanned_at"])
+    # Linhas gravadas antes do filtro de scans não têm a coluna
+    row.setdefault("suppressed", None)
+    return row
+
+
+class ScanBatchWriter:
+    """Acumula linhas de scan e grava em lote quando atinge batch_size linhas
+    ou quando a linha mais antiga espera mais que flush_interval segundos.
+
+    Se um flush falha, as linhas continuam no buffer e são reenviadas no próximo
+    flush (entrega at-least-once), com espera exponencial entre as tentativas
+    (até max_backoff segundos). Com o banco fora do ar, o buffer passa de
+    max_pending linhas para fallback_path, que é regravado em lotes assim que
+    um flush volta a funcionar. No close(), o que não puder ser gravado também
+    vai para fallback_path e é recarregado na próxima inicialização.
+
+    Só erros de conexão (TRANSIENT_ERRORS) seguram o lote. Um erro de dados
+    divide o lote ao meio até isolar as linhas que não entram, que vão para
+    dead_letter_path em vez de travar a gravação dos outros scans.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        use_copy: bool = True,
+        fallback_path: str | None = None,
+        dead_letter_path: str | None = None,
+        max_pending: int = 50000,
+        retry_backoff: float = 0.5,
+        max_backoff: float = 30.0
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.use_copy = use_copy
+        self.fallback_path = fallback_path
+        self.dead_letter_path = dead_letter_path
+        self.max_pending = max_pending
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.RLock()
+        self._failures = 0
+        self._retry_at = 0.0
+        self._fallback_pending = False
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.flush_errors = 0
+        self.rows_spilled = 0
+        self.rows_dead_lettered = 0
+        self.rows_orphaned = 0
+        self.last_flush_seconds = 0.0
+
+        self._load_fallback()
+
+    def add(self, row: dict):
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size and self._can_retry():
+                self.flush()
+            else:
+                self.flush_if_due()
+            if len(self._buffer) >= self.max_pending and self.fallback_path:
+                # Banco indisponível: o buffer não cresce além de max_pending
+                self.rows_spilled += len(self._buffer)
+                self._dump_fallback()
+                self._fallback_pending = True
+
+    def _can_retry(self) -> bool:
+        return self._failures == 0 or time.monotonic() >= self._retry_at
+
+    def flush_if_due(self):
+        with self._lock:
+            if self._buffer and time.monotonic() - self._oldest >= self.flush_interval and self._can_retry():
+                self.flush()
+            elif self._fallback_pending and not self._buffer and self._can_retry():
+                self._replay_fallback()
+
+    def _write(self, rows: list[dict]) -> list[dict]:
+        """Grava rows e retorna as que ficaram pendentes por erro de conexão
+        (vazio quando tudo foi gravado ou mandado para o dead letter)."""
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as connection:
+                written = self._existing_codes(connection, rows)
+                write_scan_rows(connection, written, self.use_copy)
+        except TRANSIENT_ERRORS:
+            self.flush_errors += 1
+            self._failures += 1
+            backoff = min(self.max_backoff, self.retry_backoff * 2 ** (self._failures - 1))
+            self._retry_at = time.monotonic() + backoff
+            return rows
+        except Exception:
+            self.flush_errors += 1
+            if len(rows) == 1:
+                self._dead_letter(rows[0])
+                return []
+            middle = len(rows) // 2
+            pending = self._write(rows[:middle])
+            if pending:
+                return pending + rows[middle:]
+            return self._write(rows[middle:])
+
+        self._failures = 0
+        self.flushes += 1
+        self.rows_written += len(written)
+        self.rows_orphaned += len(rows) - len(written)
+        self.last_flush_seconds = time.perf_counter() - started
+        # Um lote inteiro: no caminho com fila, substitui a etapa db_commit
+        scan_stage_duration.observe(self.last_flush_seconds, "db_flush")
+        return []
+
+    def _existing_codes(self, connection: Connection, rows: list[dict]) -> list[dict]:
+        # Scans de QR Codes apagados depois do redirect (o cache local de outro
+        # worker ainda tinha o código) são descartados, sem erro de FK no lote
+        ids = {row["qr_code_id"] for row in rows}
+        existing = set(connection.execute(select(QRCodeModel.id).where(QRCodeModel.id.in_(ids))).scalars())
+        if len(existing) == len(ids):
+            return rows
+        return [row for row in rows if row["qr_code_id"] in existing]
+
+    def _dead_letter(self, row: dict):
+        self.rows_dead_lettered += 1
+        if self.dead_letter_path:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(_encode_row(row) + "\n")
+
+    def flush(self) -> bool:
+        with self._lock:
+            if not self._buffer:
+                return True
+
+            # Com erro de conexão mantém as linhas para a próxima tentativa, sem reiniciar o timer
+            self._buffer = self._write(self._buffer)
+            if self._buffer:
+                return False
+            self._oldest = None
+            if self._fallback_pending:
+                self._replay_fallback()
+            return True
+
+    def _replay_fallback(self):
+        """Regrava em lotes as linhas mandadas para fallback_path durante a falha.
+        Se o banco cair de novo, o que faltar volta para fallback_path."""
+        with self._lock:
+            self._fallback_pending = False
+            replay_path = f"{self.fallback_path}.replay.{os.getpid()}"
+            try:
+                os.replace(self.fallback_path, replay_path)
+            except OSError:
+                return
+
+            with open(replay_path, encoding="utf-8") as f:
+                batch = []
+                for line in f:
+                    if line.strip():
+                        batch.append(_decode_row(line))
+                    if len(batch) >= self.batch_size:
+                        batch = self._write(batch)
+                        if batch:
+                            break
+                else:
+                    if batch:
+                        batch = self._write(batch)
+
+                if batch:
+                    # Falhou no meio: devolve o lote atual e o resto do arquivo
+                    with open(self.fallback_path, "a", encoding="utf-8") as out:
+                        for row in batch:
+                            out.write(_encode_row(row) + "\n")
+                        for line in f:
+                            out.write(line)
+                    self._fallback_pending = True
+            os.remove(replay_path)
+
+    def close(self, retries: int = 3, backoff: float = 0.5):
+        with self._lock:
+            for attempt in range(retries):
+                if self.flush():
+                    return
+                time.sleep(backoff * (attempt + 1))
+            self._dump_fallback()
+
+    def _dump_fallback(self):
+        if not self.fallback_path or not self._buffer:
+            return
+        with open(self.fallback_path, "a", encoding="utf-8") as f:
+            for row in self._buffer:
+                f.write(_encode_row(row) + "\n")
+        self._buffer = []
+        self._oldest = None
+
+    def _load_fallback(self):
+        if not self.fallback_path or not os.path.exists(self.fallback_path):
+            return
+        with open(self.fallback_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._buffer.append(_decode_row(line))
+        os.remove(self.fallback_path)
+        if self._buffer:
+            self._oldest = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._buffer),
+            "batch_size": self.batch_size,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "flush_errors": self.flush_errors,
+            "rows_spilled": self.rows_spilled,
+            "rows_dead_lettered": self.rows_dead_lettered,
+            "rows_orphaned": self.rows_orphaned,
+            "last_flush_seconds": round(self.last_flush_seconds, 6)
+        }
@@ -28,12 +28,17 @@ class QRCodeCreate(BaseModel):
     destination_url: str
 
 
+class QRCodeBulkCreate(BaseModel):
+    destination_urls: list[str]
+
+
 class QRCodeResponse(BaseModel):
     id: int
     code: str
     destination_url: str
     created_at: str
     scan_count: int = 0
+    last_scanned_at: str | None = None
     
     class Config:
         from_attributes = True
@@ -60,6 +65,11 @@ class ScanAnalytic(BaseModel):
         from_attributes = True
 
 
+class ScanPage(BaseModel):
+    scans: list[ScanAnalytic]
+    next_cursor: str | None = None
+
+
 class BrowserStats(BaseModel):
     name: str
     count: int
@@ -90,7 +100,7 @@ class AnalyticsResponse(BaseModel):
     qr_code: QRCodeResponse
     total_scans: int
     unique_visitors: int
-    scans: list[ScanAnalytic]
+    scans: list[ScanAnalytic] = []
     top_browsers: list[BrowserStats]
     top_os: list[OSStats]
     top_devices: list[DeviceStats]
@@ -0,0 +1,96 @@
+import threading
+from typing import NamedTuple
+from decouple import config
+from user_agents import parse
+from app.cache import LRUCache
+
+
+class ParsedUserAgent(NamedTuple):
+    browser: str
+    browser_version: str
+    os: str
+    os_version: str
+    device: str
+    is_bot: bool
+
+
+def parse_user_agent(user_agent: str) -> ParsedUserAgent:
+    ua = parse(user_agent)
+    return ParsedUserAgent(
+        browser=ua.browser.family,
+        browser_version=ua.browser.version_string,
+        os=ua.os.family,
+        os_version=ua.os.version_string,
+        device=ua.device.family,
+        is_bot=ua.is_bot
+    )
+
+
+class UserAgentParser:
+    """Parse de user agent memoizado.
+
+    O tráfego real tem poucos user agents distintos, então o resultado do parse
+    (caro, baseado em regex) fica num LRU. Strings que aparecem pelo menos
+    pin_after vezes são promovidas para um dict fixo (os user agents mais comuns),
+    consultado sem lock. Quando o dict chega em pinned_size, ele é trocado por um
+    vazio: versões antigas de navegador saem e os user agents que continuam
+    frequentes voltam a ser promovidos.
+    """
+
+    def __init__(self, maxsize: int = 10000, pin_after: int = 20, pinned_size: int = 512):
+        self.cache = LRUCache(maxsize=maxsize)
+        self.pin_after = pin_after
+        self.pinned_size = pinned_size
+        self._pinned = {}
+        self._lock = threading.Lock()
+        self.pinned_hits = 0
+        self.pinned_resets = 0
+
+    def parse(self, user_agent: str) -> ParsedUserAgent:
+        parsed = self._pinned.get(user_agent)
+        if parsed is not None:
+            self.pinned_hits += 1
+            return parsed
+
+        entry = self.cache.get(user_agent)
+        if entry is None:
+            parsed = parse_user_agent(user_agent)
+            self.cache.set(user_agent, [parsed, 1])
+            return parsed
+
+        parsed = entry[0]
+        with self._lock:
+            entry[1] += 1
+            if entry[1] < self.pin_after:
+                return parsed
+            if len(self._pinned) >= self.pinned_size:
+                # Troca o dict inteiro: quem está lendo o antigo sem lock não é afetado
+                self._pinned = {}
+                self.pinned_resets += 1
+            self._pinned[user_agent] = parsed
+        self.cache.delete(user_agent)
+        return parsed
+
+    def clear(self):
+        with self._lock:
+            self._pinned = {}
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        cache = self.cache.stats()
+        lookups = self.pinned_hits + cache["hits"] + cache["misses"]
+        hits = self.pinned_hits + cache["hits"]
+        return {
+            "cache": cache,
+            "pinned": len(self._pinned),
+            "pinned_hits": self.pinned_hits,
+            "pinned_resets": self.pinned_resets,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+user_agent_parser = UserAgentParser(
+    maxsize=config("UA_CACHE_SIZE", default=10000, cast=int),
+    pin_after=config("UA_PIN_AFTER", default=20, cast=int),
+    pinned_size=config("UA_PINNED_SIZE", default=512, cast=int)
+)
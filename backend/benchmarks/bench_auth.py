@@ -0,0 +1,109 @@
+"""Latência de requests autenticadas com e sem a busca do usuário no banco.
+
+Modos:
+  lookup: toda request busca o usuário (AUTH_CACHE_TTL=0)
+  cache:  usuário em cache por id (claim uid), com TTL
+  claims: rotas só de leitura confiam nas claims do token (AUTH_TRUST_CLAIMS=true)
+
+Roda o app em processo (TestClient) contra um SQLite temporário, ou --db-url.
+No PostgreSQL, com a ida e volta de rede, a diferença entre os modos cresce.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_auth --requests 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+if "--db-url" not in sys.argv:
+    os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'auth.db')}"
+else:
+    os.environ["DB_URL"] = sys.argv[sys.argv.index("--db-url") + 1]
+os.environ.setdefault("SECRET_KEY", "bench-auth")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["SCAN_INGESTION_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from jose import jwt  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+import app.depends as depends  # noqa: E402
+from app.db.connection import engine  # noqa: E402
+from app.db.models import Base, QRCodeModel, UserModel  # noqa: E402
+from app.main import app  # noqa: E402
+from app.scan_writer import write_scan_rows  # noqa: E402
+from benchmarks.datagen import generate_scan_rows  # noqa: E402
+
+MODES = {
+    "lookup": {"AUTH_CACHE_TTL": 0, "AUTH_TRUST_CLAIMS": False},
+    "cache": {"AUTH_CACHE_TTL": 60, "AUTH_TRUST_CLAIMS": False},
+    "claims": {"AUTH_CACHE_TTL": 60, "AUTH_TRUST_CLAIMS": True},
+}
+
+ENDPOINTS = ["/users/me", "/qr?limit=20", "/analytics/c000001?include_scans=false"]
+
+
+def seed(codes: int, scans: int):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(UserModel.__table__), [
+            {"id": 1, "username": "bench", "email": "bench@bench.local", "password": "x"}
+        ])
+        connection.execute(insert(QRCodeModel.__table__), [
+            {"id": i, "code": f"c{i:06d}", "destination_url": "https://example.com", "user_id": 1}
+            for i in range(1, codes + 1)
+        ])
+        write_scan_rows(connection, generate_scan_rows(1, scans, seed=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="requests por endpoint e modo")
+    parser.add_argument("--codes", type=int, default=50)
+    parser.add_argument("--scans", type=int, default=1000, help="scans do QR Code consultado em /analytics")
+    parser.add_argument("--db-url", default=None, help="padrão: SQLite temporário")
+    args = parser.parse_args()
+
+    seed(args.codes, args.scans)
+    token = jwt.encode({"sub": "bench", "uid": 1}, os.environ["SECRET_KEY"], algorithm=os.environ["ALGORITHM"])
+    headers = {"Authorization": f"Bearer {token}"}
+
+    queries = 0
+
+    def count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine, "before_cursor_execute", count_query)
+
+    print(f"{engine.dialect.name}, {args.requests} requests por endpoint")
+    print(f"{'endpoint':<42} {'modo':<7} {'p50 ms':>8} {'p95 ms':>8} {'média ms':>9} {'queries/req':>12}")
+    with TestClient(app) as client:
+        for path in ENDPOINTS:
+            for mode, settings in MODES.items():
+                for name, value in settings.items():
+                    setattr(depends, name, value)
+                depends.principal_cache.clear()
+                client.get(path, headers=headers).raise_for_status()
+
+                latencies = []
+                queries = 0
+                for _ in range(args.requests):
+                    started = time.perf_counter()
+                    response = client.get(path, headers=headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+
+                latencies.sort()
+                print(
+                    f"{path:<42} {mode:<7} {latencies[len(latencies) // 2]:>8.2f} "
+                    f"{latencies[int(len(latencies) * 0.95)]:>8.2f} {statistics.fmean(latencies):>9.2f} "
+                    f"{queries / args.requests:>12.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
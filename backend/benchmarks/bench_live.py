@@ -0,0 +1,114 @@
+"""Fan-out do feed ao vivo (app/live.py) com muitos dashboards conectados.
+
+Inscreve --subscribers consumidores em --codes QR Codes e publica --scans scans
+de uma thread separada (como a fila de ingestão), medindo o custo do publish()
+para quem grava o scan, a vazão de entregas e os consumidores desconectados
+por lentidão. Com --rate 0 a thread publica o mais rápido possível e os
+buffers enchem mesmo com consumidores rápidos (scans descartados). O hub não consulta o banco: o custo por dashboard conectado é só
+memória e CPU do event loop.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_live --subscribers 5000 --codes 500 --scans 20000
+    python -m benchmarks.bench_live --slow --subscribers 100 --codes 1 --scans 5000 --rate 1000
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime
+from app.live import LiveHub, LocalBroker
+
+
+async def run(args) -> dict:
+    loop = asyncio.get_running_loop()
+    hub = LiveHub(
+        LocalBroker(), buffer_size=args.buffer_size, max_subscribers=args.subscribers, slow_timeout=args.slow_timeout
+    )
+    hub.start(loop)
+    rng = random.Random(1)
+
+    subscriptions = []
+    for i in range(args.subscribers):
+        # Parte dos dashboards acompanha vários QR Codes (visão "todos os meus códigos")
+        topics = set(rng.sample(range(args.codes), min(5, args.codes))) if i % 10 == 0 else {rng.randrange(args.codes)}
+        subscriptions.append(hub.subscribe(topics))
+
+    received = 0
+
+    async def consume(subscription, slow: bool):
+        nonlocal received
+        while True:
+            event = await subscription.queue.get()
+            if event is None:
+                return
+            received += 1
+            if slow:
+                await asyncio.sleep(0.05)
+
+    consumers = [
+        asyncio.create_task(consume(subscription, args.slow and i == 0))
+        for i, subscription in enumerate(subscriptions)
+    ]
+
+    publish_seconds = 0.0
+
+    def producer():
+        nonlocal publish_seconds
+        now = datetime.utcnow()
+        interval = 1 / args.rate if args.rate else 0
+        next_at = time.perf_counter()
+        for _ in range(args.scans):
+            if interval:
+                next_at += interval
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+            row = {"qr_code_id": rng.randrange(args.codes), "browser": "Chrome", "os": "Android",
+                   "device": "Generic Smartphone", "country": "BR", "city": "São Paulo", "scanned_at": now}
+            started = time.perf_counter()
+            hub.publish(row)
+            publish_seconds += time.perf_counter() - started
+
+    started = time.perf_counter()
+    await loop.run_in_executor(None, producer)
+    # Os dispatches já agendados rodam antes deste callback
+    done = loop.create_future()
+    loop.call_soon_threadsafe(done.set_result, None)
+    await done
+    while any(not subscription.queue.empty() for subscription in subscriptions if subscription.active):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    hub.stop()
+    await asyncio.gather(*consumers)
+    return {
+        "elapsed": elapsed,
+        "publish_us": publish_seconds / args.scans * 1e6,
+        "delivered": hub.delivered,
+        "received": received,
+        "dropped": hub.dropped,
+        "evictions": hub.evictions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--codes", type=int, default=500)
+    parser.add_argument("--scans", type=int, default=20000)
+    parser.add_argument("--buffer-size", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=5000, help="scans/s publicados (0 = sem limite)")
+    parser.add_argument("--slow-timeout", type=float, default=1.0)
+    parser.add_argument("--slow", action="store_true", help="um consumidor lento, para ver a desconexão")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(f"{args.subscribers} dashboards, {args.codes} QR Codes, {args.scans} scans a {args.rate or 'máx.'} scans/s")
+    print(f"publish() na thread do scan   {result['publish_us']:>10.2f} µs/scan")
+    print(f"entregas                      {result['delivered']:>10} ({result['delivered'] / result['elapsed']:.0f}/s)")
+    print(f"recebidas pelos consumidores  {result['received']:>10}")
+    print(f"descartadas (buffer cheio)    {result['dropped']:>10}")
+    print(f"desconectados por lentidão    {result['evictions']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Latência do GET /r/{code} durante uma rajada de logins.
+
+O bcrypt roda no pool de processos (PASSWORD_HASH_WORKERS) e as rotas de login
+passam pelo limitador (LOGIN_MAX_CONCURRENCY / LOGIN_MAX_WAITING). Mede os
+redirects sem logins, com a rajada e o limitador padrão, e com a rajada e o
+limitador praticamente desligado.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_login_burst --logins 200 --login-concurrency 50 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+import bcrypt
+import httpx
+from sqlalchemy import create_engine, insert
+from app.db.models import Base, QRCodeModel, UserModel
+from benchmarks.bench_async_redirect import free_port, load
+
+SCENARIOS = {
+    "sem logins": None,
+    "limitado": {},
+    "sem limite": {"LOGIN_MAX_CONCURRENCY": "10000", "LOGIN_MAX_WAITING": "10000"},
+}
+
+
+def seed(db_url: str, codes: int, rounds: int) -> list[str]:
+    engine = create_engine(db_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    password = bcrypt.hashpw(b"bench", bcrypt.gensalt(rounds)).decode()
+    with engine.begin() as connection:
+        connection.execute(insert(UserModel.__table__), [
+            {"id": 1, "username": "bench", "email": "bench@bench.local", "password": password}
+        ])
+        connection.execute(insert(QRCodeModel.__table__), [
+            {"id": i, "code": f"c{i:06d}", "destination_url": "https://example.com", "user_id": 1}
+            for i in range(1, codes + 1)
+        ])
+    engine.dispose()
+    return [f"c{i:06d}" for i in range(1, codes + 1)]
+
+
+def start_server(db_url: str, rounds: int, extra_env: dict) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(
+        os.environ,
+        DB_URL=db_url,
+        BCRYPT_ROUNDS=str(rounds),
+        GEO_PROVIDER="none",
+        # Mede o limite de concorrência do login, não o rate limit por IP
+        RATE_LIMIT_ENABLED="false",
+        SECRET_KEY=os.environ.get("SECRET_KEY", "bench"),
+        ALGORITHM=os.environ.get("ALGORITHM", "HS256"),
+        **extra_env
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return process, base_url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("servidor não subiu")
+
+
+async def login_burst(base_url: str, logins: int, concurrency: int) -> Counter:
+    statuses = Counter()
+    pending = iter(range(logins))
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def worker():
+            for _ in pending:
+                try:
+                    response = await client.post("/users/login", data={"username": "bench", "password": "bench"})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError:
+                    statuses["erro"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+
+async def scenario(base_url: str, codes: list[str], args, with_logins: bool):
+    redirects = asyncio.create_task(load(base_url, codes, args.requests, args.concurrency))
+    logins = Counter()
+    if with_logins:
+        logins = await login_burst(base_url, args.logins, args.login_concurrency)
+    return await redirects, logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="redirects por cenário")
+    parser.add_argument("--concurrency", type=int, default=20, help="redirects simultâneos")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--login-concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--codes", type=int, default=1000)
+    parser.add_argument("--db-url", default=None, help="padrão: SQLite temporário")
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'login.db')}"
+    print(f"{args.requests} redirects (concorrência {args.concurrency}), {args.logins} logins "
+          f"(concorrência {args.login_concurrency}), bcrypt rounds={args.rounds}")
+    print(f"{'cenário':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  logins")
+    for name, extra_env in SCENARIOS.items():
+        codes = seed(db_url, args.codes, args.rounds)
+        process, base_url = start_server(db_url, args.rounds, extra_env or {})
+        try:
+            asyncio.run(load(base_url, codes, 200, args.concurrency))
+            result, logins = asyncio.run(scenario(base_url, codes, args, extra_env is not None))
+        finally:
+            process.terminate()
+            process.wait()
+        print(
+            f"{name:<12} {result['rps']:>8.1f} {result['p50']:>8.2f} {result['p95']:>8.2f} "
+            f"{result['p99']:>8.2f}  {dict(logins) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
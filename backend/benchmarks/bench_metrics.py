@@ -0,0 +1,89 @@
+"""Custo das métricas por request.
+
+Chama apps direto pela interface ASGI (sem rede e sem servidor), com e sem o
+MetricsMiddleware. O custo do middleware é medido sobre um app ASGI trivial,
+porque a variação de uma rota FastAPI entre rodadas é maior que o próprio
+custo; a rota FastAPI mínima aparece como referência. Também mede um timer de
+etapa (histogram.time) isolado.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_metrics --requests 50000
+"""
+import argparse
+import asyncio
+import time
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from app.metrics import Histogram, MetricsMiddleware, STAGE_BUCKETS
+
+
+async def trivial_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/r/{code}")
+    async def redirect(code: str):
+        return PlainTextResponse(code)
+
+    return app
+
+
+async def run_requests(app, requests: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/r/abc123", "raw_path": b"/r/abc123", "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5, help="repetições; vale a melhor de cada modo")
+    args = parser.parse_args()
+
+    apps = {
+        "plain": trivial_app,
+        "instrumented": MetricsMiddleware(trivial_app),
+        "fastapi": build_app(),
+        "fastapi_instrumented": MetricsMiddleware(build_app()),
+    }
+    best = {}
+    # Rodadas intercaladas; vale a melhor de cada modo
+    for _ in range(args.rounds):
+        for name, app in apps.items():
+            elapsed = asyncio.run(run_requests(app, args.requests))
+            best[name] = min(best.get(name, elapsed), elapsed)
+
+    histogram = Histogram("bench_stage_seconds", "bench", ("stage",), STAGE_BUCKETS)
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        with histogram.time("lookup"):
+            pass
+    timer = (time.perf_counter() - started) / args.requests * 1e6
+
+    print(f"{args.requests} requests, melhor de {args.rounds}")
+    print(f"{'app ASGI trivial':<28} {best['plain']:>8.2f} µs/request")
+    print(f"{'  + MetricsMiddleware':<28} {best['instrumented']:>8.2f} µs/request")
+    print(f"{'custo do middleware':<28} {best['instrumented'] - best['plain']:>8.2f} µs/request")
+    print(f"{'rota FastAPI (referência)':<28} {best['fastapi']:>8.2f} µs/request")
+    print(f"{'  + MetricsMiddleware':<28} {best['fastapi_instrumented']:>8.2f} µs/request")
+    print(f"{'timer de etapa':<28} {timer:>8.2f} µs/uso")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Tempo de renderização de um QR Code por formato e tamanho.
+
+Compara o caminho antigo (qrcode + PIL, sempre PNG com box_size=10) com o
+renderer baseado na matriz de módulos (app/qr_images.py). A codificação da
+matriz é medida à parte, já que ela fica em cache entre formatos e tamanhos.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_qr_render --iterations 200 --sizes 256,512,1024
+"""
+import argparse
+import os
+import time
+from io import BytesIO
+
+os.environ.setdefault("DB_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import qrcode  # noqa: E402
+from app.qr_images import BORDER, qr_matrix, render_pdf, render_png, render_svg  # noqa: E402
+
+DATA = "https://qrtrack.example.com/r/ab12cd"
+
+
+def render_pil(data: str, box_size: int = 10) -> bytes:
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=box_size, border=BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buf = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def timed(fn, iterations: int) -> tuple[float, int]:
+    output = fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000, len(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--sizes", default="256,512,1024")
+    parser.add_argument("--ec", default="L", choices="LMQH")
+    args = parser.parse_args()
+
+    matrix = qr_matrix(DATA, args.ec)
+    modules = len(matrix) + 2 * BORDER
+
+    print(f"{'renderer':<26} {'tamanho':>8} {'ms/img':>9} {'bytes':>8}")
+    encode_ms, _ = timed(lambda: (qr_matrix.cache_clear(), qr_matrix(DATA, args.ec)), args.iterations)
+    print(f"{'matriz (sem cache)':<26} {'-':>8} {encode_ms:>9.3f} {'-':>8}")
+
+    for size in [int(value) for value in args.sizes.split(",")]:
+        box_size = max(1, size // modules)
+        rows = [
+            ("qrcode + PIL (png)", lambda: render_pil(DATA, box_size)),
+            ("matriz (png)", lambda: render_png(matrix, box_size)),
+            ("matriz (svg)", lambda: render_svg(matrix, size)),
+            ("matriz (pdf)", lambda: render_pdf(matrix, size)),
+        ]
+        for name, fn in rows:
+            ms, length = timed(fn, args.iterations)
+            print(f"{name:<26} {size:>8} {ms:>9.3f} {length:>8}")
+
+
+if __name__ == "__main__":
+    main()
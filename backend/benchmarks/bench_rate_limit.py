@@ -0,0 +1,85 @@
+"""Custo do rate limit por request e memória dos token buckets.
+
+Chama o RateLimitMiddleware direto pela interface ASGI sobre um app trivial
+(sem rede), em três cenários do /r/{code}:
+  plain:   sem o middleware (referência)
+  clients: tráfego normal espalhado por --clients IPs
+  flood:   um único IP acima do limite (quase tudo volta 429)
+Depois mede com tracemalloc a memória do LocalRateLimitStore com --keys chaves.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_rate_limit --requests 50000 --keys 100000
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("DB_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from app.rate_limit import ROUTE_LIMITS, LocalRateLimitStore, RateLimiter, RateLimitMiddleware  # noqa: E402
+
+
+async def trivial_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 302, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def run_requests(app, requests: int, clients: int) -> tuple[float, dict]:
+    statuses = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses[message["status"]] = statuses.get(message["status"], 0) + 1
+
+    scopes = [
+        {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": f"/r/c{i % 50:05d}", "raw_path": b"", "query_string": b"",
+            "root_path": "", "headers": [], "client": (f"10.0.{i // 256 % 256}.{i % 256}", 1), "server": ("test", 80),
+        }
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(dict(scopes[i % clients]), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--keys", type=int, default=100000)
+    args = parser.parse_args()
+
+    scenarios = {
+        "plain": (trivial_app, args.clients),
+        "clients": (RateLimitMiddleware(trivial_app, RateLimiter(LocalRateLimitStore(), ROUTE_LIMITS)), args.clients),
+        "flood": (RateLimitMiddleware(trivial_app, RateLimiter(LocalRateLimitStore(), ROUTE_LIMITS)), 1),
+    }
+    print(f"{args.requests} requests")
+    for name, (app, clients) in scenarios.items():
+        elapsed, statuses = asyncio.run(run_requests(app, args.requests, clients))
+        print(f"  {name:<8} {elapsed:>7.2f} us/request  status: {statuses}")
+
+    rule = ROUTE_LIMITS[0].rules[0]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # Relógio parado: nenhum bucket expira durante a medição
+    store = LocalRateLimitStore(max_keys=args.keys, clock=lambda: 0.0)
+    for i in range(args.keys):
+        store.take(f"{rule.name}:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", rule)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"  memória  {used / 1024 / 1024:.1f} MiB para {args.keys} chaves ({used / args.keys:.0f} bytes/chave)")
+
+
+if __name__ == "__main__":
+    main()
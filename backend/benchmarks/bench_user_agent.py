@@ -0,0 +1,42 @@
+"""Replay de um corpus realista de user agents pelo parser memoizado vs user_agents.parse.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_user_agent --scans 50000
+"""
+import argparse
+import time
+from app.user_agent import UserAgentParser, parse_user_agent
+from benchmarks.ua_corpus import sample_user_agents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=50000)
+    parser.add_argument("--uncached-sample", type=int, default=5000, help="scans usados para medir o parse sem cache")
+    args = parser.parse_args()
+
+    corpus = sample_user_agents(args.scans)
+
+    sample = corpus[:args.uncached_sample]
+    started = time.perf_counter()
+    for user_agent in sample:
+        parse_user_agent(user_agent)
+    uncached = (time.perf_counter() - started) / len(sample)
+
+    memoized = UserAgentParser()
+    started = time.perf_counter()
+    for user_agent in corpus:
+        memoized.parse(user_agent)
+    cached = (time.perf_counter() - started) / len(corpus)
+
+    for user_agent in set(corpus):
+        assert memoized.parse(user_agent) == parse_user_agent(user_agent)
+
+    print(f"{args.scans} scans, {len(set(corpus))} user agents distintos")
+    print(f"  user_agents.parse   {uncached * 1e6:>10.1f} us/scan")
+    print(f"  UserAgentParser     {cached * 1e6:>10.1f} us/scan  ({uncached / cached:.0f}x)")
+    print(f"  stats: {memoized.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Verifica quantas queries cada request da listagem de QR Codes executa.
+
+O número de queries não pode crescer com o número de QR Codes/scans do
+usuário (regressão de N+1). Roda contra um SQLite temporário e termina com
+erro se algum limite for ultrapassado.
+
+Uso (a partir de backend/):
+    python -m benchmarks.check_query_counts --codes 200 --scans 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'queries.db')}"
+os.environ.setdefault("SECRET_KEY", "check-query-counts")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["SCAN_INGESTION_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from jose import jwt  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+from app.db.connection import engine  # noqa: E402
+from app.db.models import Base, QRCodeModel, UserModel  # noqa: E402
+from app.main import app  # noqa: E402
+from app.scan_writer import write_scan_rows  # noqa: E402
+from benchmarks.datagen import generate_scan_rows  # noqa: E402
+
+# Limites por request: autenticação (1) + listagem (1). O POST faz só o insert
+# com RETURNING (a reserva de blocos de códigos usa a engine do alocador).
+MAX_QUERIES = {
+    "GET /qr": 2,
+    "GET /qr?sort=scan_count&order=desc&limit=50": 2,
+    "GET /qr?limit=50&cursor": 2,
+    "POST /qr": 2,
+}
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def seed(codes: int, scans: int):
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(UserModel.__table__), [
+            {"id": 1, "username": "bench", "email": "bench@bench.local", "password": "x"}
+        ])
+        connection.execute(insert(QRCodeModel.__table__), [
+            {"id": i, "code": f"c{i:06d}", "destination_url": "https://example.com", "user_id": 1}
+            for i in range(1, codes + 1)
+        ])
+        for qr_code_id in range(1, codes + 1):
+            write_scan_rows(connection, generate_scan_rows(qr_code_id, scans, seed=qr_code_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codes", type=int, default=200)
+    parser.add_argument("--scans", type=int, default=20, help="scans por QR Code")
+    args = parser.parse_args()
+
+    seed(args.codes, args.scans)
+    token = jwt.encode({"sub": "bench"}, os.environ["SECRET_KEY"], algorithm=os.environ["ALGORITHM"])
+    headers = {"Authorization": f"Bearer {token}"}
+    counter = QueryCounter(engine)
+    failures = 0
+
+    with TestClient(app) as client:
+        def measure(name: str, method: str, path: str, **kwargs):
+            nonlocal failures
+            counter.count = 0
+            response = client.request(method, path, headers=headers, **kwargs)
+            response.raise_for_status()
+            status = "ok" if counter.count <= MAX_QUERIES[name] else "FALHOU"
+            failures += status != "ok"
+            print(f"{name:<48} {counter.count:>3} queries (máx. {MAX_QUERIES[name]})  {status}")
+            return response
+
+        response = measure("GET /qr", "GET", "/qr")
+        assert len(response.json()) == args.codes
+        assert all(qr["scan_count"] == args.scans for qr in response.json())
+
+        response = measure(
+            "GET /qr?sort=scan_count&order=desc&limit=50", "GET", "/qr?sort=scan_count&order=desc&limit=50"
+        )
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor:
+            measure("GET /qr?limit=50&cursor", "GET", "/qr", params={
+                "sort": "scan_count", "order": "desc", "limit": 50, "cursor": cursor
+            })
+
+        response = measure("POST /qr", "POST", "/qr", json={"destination_url": "https://example.com/new"})
+        assert response.json()["scan_count"] == 0
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Gerador de dados sintéticos para os benchmarks."""
+import random
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from app.db.models import Base, QRCodeModel, UserModel
+from app.scan_writer import write_scan_rows
+from app.user_agent import UserAgentParser
+from benchmarks.ua_corpus import sample_user_agents, zipf_weights
+
+LOCATIONS = [
+    ("Brazil", "São Paulo", "-23.55", "-46.63", "America/Sao_Paulo"),
+    ("Brazil", "Rio de Janeiro", "-22.91", "-43.17", "America/Sao_Paulo"),
+    ("Brazil", "Belo Horizonte", "-19.92", "-43.94", "America/Sao_Paulo"),
+    ("Brazil", "Curitiba", "-25.43", "-49.27", "America/Sao_Paulo"),
+    ("United States", "New York", "40.71", "-74.01", "America/New_York"),
+    ("United States", "Miami", "25.76", "-80.19", "America/New_York"),
+    ("Portugal", "Lisbon", "38.72", "-9.14", "Europe/Lisbon"),
+    ("Portugal", "Porto", "41.15", "-8.61", "Europe/Lisbon"),
+    ("Argentina", "Buenos Aires", "-34.60", "-58.38", "America/Argentina/Buenos_Aires"),
+    ("Germany", "Berlin", "52.52", "13.40", "Europe/Berlin"),
+    ("Japan", "Tokyo", "35.68", "139.69", "Asia/Tokyo"),
+    ("Mexico", "Mexico City", "19.43", "-99.13", "America/Mexico_City"),
+    (None, None, None, None, None),
+]
+ISPS = ["Claro", "Vivo", "TIM", "Oi", "Comcast", "MEO", "Telecom Argentina", "Deutsche Telekom", "NTT"]
+
+
+def visitor_ip(visitor: int) -> str:
+    """IP estável de um visitante: ~40% IPv6 (redes móveis) e o resto IPv4, com
+    parte dos visitantes IPv4 dividindo o mesmo IP público (CGNAT das operadoras)."""
+    h = (visitor * 2654435761) & 0xFFFFFFFF
+    bucket = h % 100
+    if bucket < 40:
+        return f"2804:{h >> 16:x}:{h & 0xFFFF:x}:{visitor & 0xFFFF:x}::{(h >> 4) & 0xFFF:x}"
+    if bucket < 55:
+        # ~16 visitantes por IP de CGNAT
+        shared = ((visitor // 16 + 1) * 2654435761) & 0xFFFFFF
+        return f"177.{shared >> 16}.{(shared >> 8) & 255}.{shared & 255}"
+    return f"{100 + h % 90}.{(h >> 8) & 255}.{(h >> 16) & 255}.{1 + (h >> 24) % 254}"
+
+
+def generate_scan_rows(qr_code_id: int, count: int, days: int = 90, seed: int = 7, now: datetime = None) -> list[dict]:
+    """Gera linhas de scan_analytics com user agents e locais em distribuição
+    de cauda longa, e IPs que se repetem (visitantes recorrentes e CGNAT)."""
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    parser = UserAgentParser()
+    user_agents = sample_user_agents(count, seed=seed)
+    locations = rng.choices(LOCATIONS, weights=zipf_weights(len(LOCATIONS), 0.9), k=count)
+    visitors = max(1, count // 3)
+
+    rows = []
+    for i in range(count):
+        ua = parser.parse(user_agents[i])
+        country, city, latitude, longitude, timezone = locations[i]
+        # Um quarto dos scans vem de visitantes recorrentes (cauda longa); o resto,
+        # de visitantes quase sempre novos
+        if rng.random() < 0.25:
+            visitor = int(rng.paretovariate(1.2)) % visitors
+        else:
+            visitor = rng.randrange(count)
+        rows.append({
+            "qr_code_id": qr_code_id,
+            "ip_address": visitor_ip(visitor),
+            "user_agent": user_agents[i],
+            "browser": ua.browser,
+            "browser_version": ua.browser_version,
+            "os": ua.os,
+            "os_version": ua.os_version,
+            "device": ua.device,
+            "country": country,
+            "city": city,
+            "latitude": latitude,
+            "longitude": longitude,
+            "timezone": timezone,
+            "isp": rng.choice(ISPS) if country else None,
+            "scanned_at": now - timedelta(seconds=rng.uniform(0, days * 86400))
+        })
+    return rows
+
+
+class Dataset(NamedTuple):
+    users: list[int]
+    codes: list[str]
+    owners: dict  # code -> user_id
+    weights: list[float]  # popularidade de cada código (mesma ordem de codes)
+    scans: int
+
+
+def seed_database(engine: Engine, users: int, codes: int, scans: int, days: int = 90, seed: int = 7,
+                  now: datetime = None, batch_size: int = 5000) -> Dataset:
+    """Recria as tabelas e grava usuários, QR Codes e scans (com contadores e rollups).
+
+    Os scans seguem uma lei de potência entre os códigos (Zipf): poucos códigos
+    concentram a maior parte do tráfego. Os donos dos códigos também seguem uma
+    cauda longa, com alguns usuários donos de muitos códigos.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    user_ids = list(range(1, users + 1))
+    code_list = [f"c{i:06d}" for i in range(1, codes + 1)]
+    # Ordem aleatória: o código mais popular não é o primeiro id
+    popularity = zipf_weights(codes)
+    rng.shuffle(popularity)
+    owner_ids = rng.choices(user_ids, weights=zipf_weights(users, 0.8), k=codes)
+
+    with engine.begin() as connection:
+        connection.execute(insert(UserModel.__table__), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@bench.local", "password": "x"}
+            for i in user_ids
+        ])
+        connection.execute(insert(QRCodeModel.__table__), [
+            {
+                "id": i,
+                "code": code,
+                "destination_url": f"https://example.com/{code}",
+                "user_id": owner_ids[i - 1],
+                "created_at": now - timedelta(days=rng.uniform(0, days))
+            }
+            for i, code in enumerate(code_list, start=1)
+        ])
+
+    rows = generate_scan_rows(0, scans, days, seed=seed, now=now)
+    for row, qr_code_id in zip(rows, rng.choices(range(1, codes + 1), weights=popularity, k=scans)):
+        row["qr_code_id"] = qr_code_id
+    rows.sort(key=lambda row: (row["qr_code_id"], row["scanned_at"]))
+    # Lotes em transações separadas, para não segurar o lock de escrita do SQLite
+    for start in range(0, len(rows), batch_size):
+        with engine.begin() as connection:
+            write_scan_rows(connection, rows[start:start + batch_size])
+
+    return Dataset(
+        users=user_ids,
+        codes=code_list,
+        owners=dict(zip(code_list, owner_ids)),
+        weights=popularity,
+        scans=scans
+    )
@@ -0,0 +1,116 @@
+"""Teste de estresse do alocador de códigos curtos.
+
+Várias threads (cada uma com sua sessão) criam QR Codes ao mesmo tempo, em
+lotes, usando o caminho real de insert (QRCodeUseCases._insert_qr_codes).
+Cenários:
+  counter: a tabela já tem, como códigos "legados", parte dos próximos códigos
+           que o contador vai gerar, forçando IntegrityError e o retry.
+  random:  códigos de 3 caracteres (46656 possíveis), forçando colisões e o
+           crescimento automático do tamanho.
+No fim confere que todo insert deu certo e que não há códigos repetidos.
+
+Uso (a partir de backend/):
+    python -m benchmarks.stress_code_allocator --threads 8 --batches 50 --batch-size 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+os.environ.setdefault("SECRET_KEY", "stress")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("DB_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+import app.qr_code_use_cases as use_cases  # noqa: E402
+from app.code_allocator import PermutedCounterStrategy, RandomCodeStrategy  # noqa: E402
+from app.db.models import Base, QRCodeModel, UserModel  # noqa: E402
+
+
+def run(engine, strategy, args, legacy: list[str]) -> bool:
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(UserModel.__table__), [
+            {"id": 1, "username": "stress", "email": "stress@stress.local", "password": "x"}
+        ])
+        if legacy:
+            connection.execute(insert(QRCodeModel.__table__), [
+                {"code": code, "destination_url": "https://legacy.example.com", "user_id": 1} for code in legacy
+            ])
+
+    use_cases.code_allocator = strategy
+    Session = sessionmaker(bind=engine)
+    errors = []
+
+    def worker(index: int):
+        session = Session()
+        uc = use_cases.QRCodeUseCases(db_session=session)
+        try:
+            for batch in range(args.batches):
+                uc._insert_qr_codes([
+                    {"destination_url": f"https://example.com/{index}/{batch}/{i}", "user_id": 1}
+                    for i in range(args.batch_size)
+                ])
+        except Exception as error:
+            errors.append(repr(error))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    table = QRCodeModel.__table__
+    with engine.connect() as connection:
+        total, distinct = connection.execute(
+            select(func.count(), func.count(table.c.code.distinct()))
+        ).one()
+        lengths = dict(connection.execute(
+            select(func.length(table.c.code), func.count()).group_by(func.length(table.c.code))
+        ).all())
+
+    expected = args.threads * args.batches * args.batch_size + len(legacy)
+    ok = not errors and total == expected and distinct == total
+    print(
+        f"{strategy.name:<8} QR Codes={total} (esperado {expected}) distintos={distinct} "
+        f"tamanhos={lengths} {strategy.stats()} erros={len(errors)} -> {'OK' if ok else 'FALHOU'}"
+    )
+    for error in errors[:5]:
+        print(f"  {error}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--db-url", default=None, help="padrão: SQLite temporário")
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}"
+    # No SQLite as threads disputam o lock de escrita: espera em vez de falhar
+    engine = create_engine(db_url, connect_args={"timeout": 60} if db_url.startswith("sqlite") else {})
+
+    total = args.threads * args.batches * args.batch_size
+    # Um em cada três dos próximos códigos do contador já existe na tabela
+    preview = PermutedCounterStrategy(engine, b"stress", block_size=total)
+    Base.metadata.create_all(engine)
+    legacy = preview.next_codes(total)[::3]
+
+    # Como em app/code_allocator.py, o contador reserva blocos por uma engine própria
+    allocator_engine = create_engine(db_url, connect_args={"timeout": 60} if db_url.startswith("sqlite") else {})
+    results = [
+        run(engine, PermutedCounterStrategy(allocator_engine, b"stress", block_size=50), args, legacy),
+        run(engine, RandomCodeStrategy(length=3, window=200), args, []),
+    ]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""add qr code scan counters
+
+Revision ID: 5e8a1f3c7b20
+Revises: c41e7b0d9a25
+Create Date: 2026-10-18 14:22:41.108375
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a1f3c7b20'
+down_revision: Union[str, Sequence[str], None] = 'c41e7b0d9a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('qr_codes', sa.Column('scan_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('qr_codes', sa.Column('last_scanned_at', sa.DateTime(), nullable=True))
+
+    # Backfill a partir dos scans já gravados
+    op.execute(
+        "UPDATE qr_codes SET "
+        "scan_count = (SELECT COUNT(*) FROM scan_analytics WHERE scan_analytics.qr_code_id = qr_codes.id), "
+        "last_scanned_at = (SELECT MAX(scanned_at) FROM scan_analytics WHERE scan_analytics.qr_code_id = qr_codes.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('qr_codes', 'last_scanned_at')
+    op.drop_column('qr_codes', 'scan_count')
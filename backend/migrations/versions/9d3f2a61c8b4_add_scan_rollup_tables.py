@@ -0,0 +1,141 @@
+"""add scan rollup tables
+
+Revision ID: 9d3f2a61c8b4
+Revises: 014e47a9fb5c
+Create Date: 2026-10-18 10:12:41.208113
+
+"""
+import hashlib
+import zlib
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f2a61c8b4'
+down_revision: Union[str, Sequence[str], None] = '014e47a9fb5c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scan_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('qr_code_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('dimension', sa.String(), nullable=False),
+    sa.Column('parent', sa.String(), nullable=False),
+    sa.Column('value', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['qr_code_id'], ['qr_codes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('qr_code_id', 'granularity', 'bucket_start', 'dimension', 'parent', 'value', name='uq_scan_rollups_bucket_value')
+    )
+    op.create_table('scan_buckets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('qr_code_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('scans', sa.Integer(), nullable=False),
+    sa.Column('visitors_sketch', sa.LargeBinary(), nullable=True),
+    sa.ForeignKeyConstraint(['qr_code_id'], ['qr_codes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('qr_code_id', 'granularity', 'bucket_start', name='uq_scan_buckets_bucket')
+    )
+
+    # Constrói os rollups a partir dos scans já existentes (no modo --sql,
+    # rode depois: python -m app.manage backfill-rollups)
+    if not context.is_offline_mode():
+        _backfill(op.get_bind())
+
+
+# O backfill usa só SQL e o schema desta revisão, sem os models do app
+TOTAL_BUCKET = "1970-01-01 00:00:00.000000"
+DIMENSIONS = ("browser", "os", "device", "country")
+HLL_PRECISION = 10
+
+
+def _bucket_expr(dialect: str, granularity: str) -> str:
+    if dialect == "postgresql":
+        if granularity == "total":
+            return "TIMESTAMP '1970-01-01'"
+        return f"date_trunc('{granularity}', scanned_at)"
+    # SQLite guarda DateTime como texto 'AAAA-MM-DD HH:MM:SS.ffffff'
+    if granularity == "total":
+        return f"'{TOTAL_BUCKET}'"
+    if granularity == "hour":
+        return "strftime('%Y-%m-%d %H:00:00.000000', scanned_at)"
+    return "strftime('%Y-%m-%d 00:00:00.000000', scanned_at)"
+
+
+def _sketch(ips: set) -> bytes:
+    # Mesmo formato do app/hll.py nesta revisão: 1024 registradores, zlib
+    registers = bytearray(1 << HLL_PRECISION)
+    for ip in ips:
+        h = int.from_bytes(hashlib.blake2b(ip.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - HLL_PRECISION)
+        rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+        registers[index] = max(registers[index], (64 - HLL_PRECISION) - rest.bit_length() + 1)
+    return zlib.compress(bytes(registers))
+
+
+def _backfill(connection) -> None:
+    dialect = connection.dialect.name
+    for granularity in ("hour", "day", "total"):
+        bucket = _bucket_expr(dialect, granularity)
+        for dimension in DIMENSIONS:
+            connection.execute(sa.text(
+                "INSERT INTO scan_rollups (qr_code_id, granularity, bucket_start, dimension, parent, value, count) "
+                f"SELECT qr_code_id, '{granularity}', {bucket}, '{dimension}', '', {dimension}, count(*) "
+                f"FROM scan_analytics WHERE {dimension} IS NOT NULL AND {dimension} != '' "
+                f"GROUP BY qr_code_id, {bucket}, {dimension}"
+            ))
+        connection.execute(sa.text(
+            "INSERT INTO scan_rollups (qr_code_id, granularity, bucket_start, dimension, parent, value, count) "
+            f"SELECT qr_code_id, '{granularity}', {bucket}, 'city', country, city, count(*) "
+            "FROM scan_analytics WHERE country IS NOT NULL AND country != '' AND city IS NOT NULL AND city != '' "
+            f"GROUP BY qr_code_id, {bucket}, country, city"
+        ))
+        connection.execute(sa.text(
+            "INSERT INTO scan_buckets (qr_code_id, granularity, bucket_start, scans) "
+            f"SELECT qr_code_id, '{granularity}', {bucket}, count(*) FROM scan_analytics "
+            f"GROUP BY qr_code_id, {bucket}"
+        ))
+
+        # Sketches de visitantes: os scans vêm em ordem de bucket, então só os
+        # IPs do bucket atual ficam em memória
+        update = sa.text(
+            "UPDATE scan_buckets SET visitors_sketch = :sketch "
+            "WHERE qr_code_id = :qr_code_id AND granularity = :granularity AND bucket_start = :bucket_start"
+        )
+        result = connection.execution_options(stream_results=True, yield_per=20000).execute(sa.text(
+            f"SELECT qr_code_id, {bucket} AS bucket_start, ip_address FROM scan_analytics "
+            f"ORDER BY qr_code_id, {bucket}"
+        ))
+        current, ips, pending = None, set(), []
+        for qr_code_id, bucket_start, ip_address in result:
+            if (qr_code_id, bucket_start) != current:
+                if current is not None:
+                    pending.append({"qr_code_id": current[0], "granularity": granularity,
+                                    "bucket_start": current[1], "sketch": _sketch(ips)})
+                current, ips = (qr_code_id, bucket_start), set()
+            if ip_address is not None:
+                ips.add(ip_address)
+            if len(pending) >= 1000:
+                connection.execute(update, pending)
+                pending = []
+        if current is not None:
+            pending.append({"qr_code_id": current[0], "granularity": granularity,
+                            "bucket_start": current[1], "sketch": _sketch(ips)})
+        if pending:
+            connection.execute(update, pending)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('scan_buckets')
+    op.drop_table('scan_rollups')
@@ -0,0 +1,32 @@
+"""add code sequences table
+
+Revision ID: a7c3e9d14f62
+Revises: 5e8a1f3c7b20
+Create Date: 2026-10-18 16:40:12.392817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9d14f62'
+down_revision: Union[str, Sequence[str], None] = '5e8a1f3c7b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('code_sequences',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('next_value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('code_sequences')
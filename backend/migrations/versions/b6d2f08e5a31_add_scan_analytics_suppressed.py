@@ -0,0 +1,28 @@
+"""add scan analytics suppressed
+
+Revision ID: b6d2f08e5a31
+Revises: a7c3e9d14f62
+Create Date: 2026-10-18 18:05:41.228163
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d2f08e5a31'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e9d14f62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('scan_analytics', sa.Column('suppressed', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('scan_analytics', 'suppressed')
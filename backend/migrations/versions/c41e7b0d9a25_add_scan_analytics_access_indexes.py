@@ -0,0 +1,34 @@
+"""add scan analytics access indexes
+
+Revision ID: c41e7b0d9a25
+Revises: 9d3f2a61c8b4
+Create Date: 2026-10-18 11:03:17.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7b0d9a25'
+down_revision: Union[str, Sequence[str], None] = '9d3f2a61c8b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação no PostgreSQL;
+    # nos outros bancos postgresql_concurrently é ignorado
+    with op.get_context().autocommit_block():
+        op.create_index('ix_scan_analytics_qr_code_id_scanned_at', 'scan_analytics', ['qr_code_id', 'scanned_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_qr_codes_user_id_created_at', 'qr_codes', ['user_id', 'created_at'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_qr_codes_user_id_created_at', table_name='qr_codes', postgresql_concurrently=True)
+        op.drop_index('ix_scan_analytics_qr_code_id_scanned_at', table_name='scan_analytics', postgresql_concurrently=True)
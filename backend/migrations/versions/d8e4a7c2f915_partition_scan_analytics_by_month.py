@@ -0,0 +1,91 @@
+"""partition scan analytics by month
+
+Revision ID: d8e4a7c2f915
+Revises: b6d2f08e5a31
+Create Date: 2026-10-18 20:02:37.918204
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.partitions import SCAN_PARTITIONS_AHEAD, add_months, create_partition_sql, month_start, partition_for
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e4a7c2f915'
+down_revision: Union[str, Sequence[str], None] = 'b6d2f08e5a31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _id_sequence(table: str) -> str:
+    # No modo --sql não há conexão: usa o nome padrão da sequence do SERIAL
+    if context.is_offline_mode():
+        return "scan_analytics_id_seq"
+    return op.get_bind().execute(sa.text(f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar()
+
+
+def _create_constraints_and_indexes(primary_key: str) -> None:
+    op.execute(f"ALTER TABLE scan_analytics ADD CONSTRAINT scan_analytics_pkey PRIMARY KEY ({primary_key})")
+    op.execute(
+        "ALTER TABLE scan_analytics ADD CONSTRAINT scan_analytics_qr_code_id_fkey "
+        "FOREIGN KEY (qr_code_id) REFERENCES qr_codes (id)"
+    )
+    op.create_index('ix_scan_analytics_id', 'scan_analytics', ['id'], unique=False)
+    op.create_index('ix_scan_analytics_qr_code_id_scanned_at', 'scan_analytics', ['qr_code_id', 'scanned_at'], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Particionamento declarativo só existe no PostgreSQL; nos outros bancos a
+    # retenção do app.manage maintain-partitions cai para DELETE por mês
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # A tabela é copiada para as partições numa única transação: as escritas em
+    # scan_analytics ficam bloqueadas durante a cópia (pare a ingestão antes)
+    op.execute("ALTER TABLE scan_analytics RENAME TO scan_analytics_legacy")
+    op.execute(
+        "CREATE TABLE scan_analytics (LIKE scan_analytics_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (scanned_at)"
+    )
+    # O id continua usando a mesma sequence, que passa a pertencer à tabela nova
+    # (senão seria apagada junto com a antiga)
+    op.execute(f"ALTER SEQUENCE {_id_sequence('scan_analytics_legacy')} OWNED BY scan_analytics.id")
+
+    # Recebe scans fora dos meses criados; o maintain-partitions cria os meses à frente
+    op.execute("CREATE TABLE scan_analytics_default PARTITION OF scan_analytics DEFAULT")
+    now = month_start(datetime.utcnow())
+    # No modo --sql não dá para consultar o scan mais antigo: os meses anteriores
+    # ao atual ficam na partição default até o maintain-partitions criá-los
+    first = now
+    if not context.is_offline_mode():
+        oldest = op.get_bind().execute(sa.text("SELECT min(scanned_at) FROM scan_analytics_legacy")).scalar()
+        if oldest is not None:
+            first = min(first, month_start(oldest))
+    month = first
+    while month <= add_months(now, SCAN_PARTITIONS_AHEAD):
+        op.execute(create_partition_sql(partition_for(month)))
+        month = add_months(month, 1)
+
+    op.execute("INSERT INTO scan_analytics SELECT * FROM scan_analytics_legacy")
+    op.execute("DROP TABLE scan_analytics_legacy")
+    # A chave de partição precisa fazer parte da chave primária
+    _create_constraints_and_indexes("id, scanned_at")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE TABLE scan_analytics_plain (LIKE scan_analytics INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    op.execute(f"ALTER SEQUENCE {_id_sequence('scan_analytics')} OWNED BY scan_analytics_plain.id")
+    op.execute("INSERT INTO scan_analytics_plain SELECT * FROM scan_analytics")
+    # Apaga a tabela particionada junto com todas as partições
+    op.execute("DROP TABLE scan_analytics")
+    op.execute("ALTER TABLE scan_analytics_plain RENAME TO scan_analytics")
+    _create_constraints_and_indexes("id")
@@ -0,0 +1,32 @@
+"""add scan retention table
+
+Revision ID: f2c9a4b7e1d3
+Revises: d8e4a7c2f915
+Create Date: 2026-10-18 21:05:37.614208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c9a4b7e1d3'
+down_revision: Union[str, Sequence[str], None] = 'd8e4a7c2f915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scan_retention',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('retained_since', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('scan_retention')
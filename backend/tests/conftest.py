@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# Os módulos do app leem a configuração no import: banco SQLite temporário e
+# sem filtro de scans repetidos (os testes repetem o mesmo cliente)
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}")
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("GEO_PROVIDER", "none")
+os.environ.setdefault("SCAN_DEDUPE_WINDOW", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("SCAN_INGESTION_ENABLED", "false")
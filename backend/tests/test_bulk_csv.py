@@ -0,0 +1,41 @@
+import io
+import pytest
+from fastapi import HTTPException, UploadFile
+from app.qr_routes import _parse_destination_csv, _read_upload
+
+
+def test_csv_with_header_uses_destination_url_column():
+    content = "name,destination_url\na,https://a.com\nb,https://b.com\n".encode("utf-8-sig")
+
+    assert _parse_destination_csv(content) == ["https://a.com", "https://b.com"]
+
+
+def test_csv_in_cp1252_is_accepted():
+    content = "https://example.com/ação\n".encode("cp1252")
+
+    assert _parse_destination_csv(content) == ["https://example.com/ação"]
+
+
+def test_csv_that_is_not_text_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        _parse_destination_csv(b"\x81\x8d\x8f\x90\x9d")
+
+    assert error.value.status_code == 400
+
+
+def test_upload_over_the_limit_is_rejected_without_reading_it():
+    file = UploadFile(io.BytesIO(b"x" * 100), size=100)
+
+    with pytest.raises(HTTPException) as error:
+        _read_upload(file, 10)
+
+    assert error.value.status_code == 413
+    assert file.file.tell() == 0
+
+
+def test_upload_without_size_is_read_up_to_the_limit():
+    with pytest.raises(HTTPException) as error:
+        _read_upload(UploadFile(io.BytesIO(b"x" * 100)), 10)
+    assert error.value.status_code == 413
+
+    assert _read_upload(UploadFile(io.BytesIO(b"x" * 10)), 10) == b"x" * 10
@@ -0,0 +1,50 @@
+"""Alocador de códigos curtos: a permutação é bijetora e o contador não
+repete códigos (ver benchmarks/stress_code_allocator.py)."""
+import pytest
+from sqlalchemy import create_engine
+from app.code_allocator import ALPHABET, FeistelPermutation, PermutedCounterStrategy, encode_code
+from app.db.models import Base
+
+
+def test_permutation_is_bijective_on_small_domain():
+    domain = len(ALPHABET) ** 3
+    permutation = FeistelPermutation(b"tests", domain)
+
+    assert sorted(permutation.permute(value) for value in range(domain)) == list(range(domain))
+
+
+def test_permutation_has_no_collisions_in_sample_range():
+    domain = len(ALPHABET) ** 6
+    permutation = FeistelPermutation(b"tests", domain)
+    values = [permutation.permute(value) for value in range(50000)]
+
+    assert len(set(values)) == len(values)
+    assert all(0 <= value < domain for value in values)
+
+
+def test_permutation_rejects_values_out_of_domain():
+    permutation = FeistelPermutation(b"tests", 1000)
+
+    with pytest.raises(ValueError):
+        permutation.permute(1000)
+
+
+def test_counter_strategy_codes_are_unique_across_blocks_and_lengths():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    # 36^2 = 1296 códigos de 2 caracteres: o contador esgota o tamanho e passa para 3
+    strategy = PermutedCounterStrategy(engine, key=b"tests", length=2, block_size=100)
+
+    codes = []
+    for _ in range(20):
+        codes.extend(strategy.next_codes(97))
+
+    assert len(set(codes)) == len(codes)
+    assert {len(code) for code in codes} == {2, 3}
+    assert sum(len(code) == 2 for code in codes) == len(ALPHABET) ** 2
+    assert strategy.blocks_reserved >= len(codes) // 100
+
+
+def test_encode_code_has_fixed_length():
+    assert encode_code(0, 6) == "aaaaaa"
+    assert encode_code(len(ALPHABET) ** 6 - 1, 6) == "999999"
@@ -0,0 +1,114 @@
+import threading
+import time
+from app.geolocation import CircuitBreaker, GeoLookupError, GeolocationService, StaticGeoProvider
+
+SAO_PAULO = {"country": "Brazil", "city": "São Paulo", "latitude": -23.55, "longitude": -46.63,
+             "timezone": "America/Sao_Paulo", "isp": "ISP"}
+
+
+def lookup_concurrently(service: GeolocationService, ip_address: str, threads: int) -> list[dict]:
+    results = [None] * threads
+    barrier = threading.Barrier(threads)
+
+    def run(i):
+        barrier.wait()
+        results[i] = service.lookup(ip_address)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def test_concurrent_lookups_of_one_ip_call_the_provider_once():
+    provider = StaticGeoProvider(default=SAO_PAULO, delay=0.2)
+    service = GeolocationService(provider)
+
+    results = lookup_concurrently(service, "200.98.196.114", 10)
+
+    assert provider.calls == 1
+    assert results == [SAO_PAULO] * 10
+    assert service.coalesced == 9
+
+
+def test_successful_lookup_is_cached():
+    provider = StaticGeoProvider(default=SAO_PAULO)
+    service = GeolocationService(provider)
+
+    assert service.lookup("200.98.196.114") == SAO_PAULO
+    assert service.lookup("200.98.196.114") == SAO_PAULO
+    assert provider.calls == 1
+
+
+def test_failures_and_unknown_ips_are_negatively_cached_until_the_ttl():
+    provider = StaticGeoProvider(results={"10.0.0.1": GeoLookupError("timeout")}, default={})
+    service = GeolocationService(provider, negative_ttl=0.1)
+
+    assert service.lookup("10.0.0.1") == {}
+    assert service.lookup("10.0.0.1") == {}
+    assert service.lookup("10.0.0.2") == {}
+    assert service.lookup("10.0.0.2") == {}
+    assert provider.calls == 2
+    assert service.provider_errors == 1
+
+    time.sleep(0.15)
+    service.lookup("10.0.0.1")
+    service.lookup("10.0.0.2")
+    assert provider.calls == 4
+
+
+def test_waiting_lookup_gives_up_after_wait_timeout():
+    provider = StaticGeoProvider(default=SAO_PAULO, delay=0.5)
+    service = GeolocationService(provider, wait_timeout=0.05)
+
+    leader = threading.Thread(target=service.lookup, args=("200.98.196.114",))
+    leader.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    assert service.lookup("200.98.196.114") == {}
+    assert time.monotonic() - started < 0.3
+    leader.join()
+    assert provider.calls == 1
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers_after_cooldown():
+    provider = StaticGeoProvider(default=GeoLookupError("503"))
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    service = GeolocationService(provider, breaker=breaker)
+
+    for i in range(3):
+        service.lookup(f"10.0.1.{i}")
+    assert breaker.state == "open"
+
+    # Aberto: nem chega ao provedor
+    assert service.lookup("10.0.1.10") == {}
+    assert provider.calls == 3
+    assert service.short_circuited == 1
+
+    time.sleep(0.12)
+    assert breaker.state == "half_open"
+    # Uma única chamada de teste; se falhar, o circuito abre de novo
+    service.lookup("10.0.1.11")
+    assert provider.calls == 4
+    assert breaker.state == "open"
+
+    time.sleep(0.12)
+    provider.default = SAO_PAULO
+    assert service.lookup("10.0.1.12") == SAO_PAULO
+    assert breaker.state == "closed"
+    assert service.lookup("10.0.1.13") == SAO_PAULO
+    assert provider.calls == 6
+
+
+def test_half_open_breaker_lets_a_single_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
@@ -0,0 +1,33 @@
+import struct
+import pytest
+from app.qr_images import png_min_size, render_qr_image
+
+BASE_URL = "http://testserver/"
+
+
+def png_dimensions(content: bytes) -> tuple[int, int]:
+    return struct.unpack(">II", content[16:24])
+
+
+@pytest.mark.parametrize("size", [64, 65, 100, 333, 4096])
+def test_png_has_requested_size(size):
+    image = render_qr_image(BASE_URL, "abcdef", "png", size)
+
+    assert png_dimensions(image.content) == (size, size)
+
+
+def test_png_without_size_uses_default_module_size():
+    modules = png_min_size(BASE_URL, "abcdef")
+    image = render_qr_image(BASE_URL, "abcdef", "png")
+
+    assert png_dimensions(image.content) == (modules * 10, modules * 10)
+
+
+def test_png_smaller_than_modules_is_rejected():
+    base_url = "http://testserver/" + "x" * 200 + "/"
+    min_size = png_min_size(base_url, "abcdef", "H")
+    assert min_size > 64
+
+    with pytest.raises(ValueError):
+        render_qr_image(base_url, "abcdef", "png", min_size - 1, "H")
+    assert png_dimensions(render_qr_image(base_url, "abcdef", "png", min_size, "H").content) == (min_size, min_size)
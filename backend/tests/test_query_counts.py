@@ -0,0 +1,91 @@
+"""Número de queries da listagem de QR Codes (ver benchmarks/check_query_counts.py):
+não pode crescer com o número de QR Codes e scans do usuário."""
+import os
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import event, insert
+from app.db.connection import engine
+from app.db.models import Base, QRCodeModel, UserModel
+from app.main import app
+from app.scan_writer import write_scan_rows
+from benchmarks.datagen import generate_scan_rows
+
+CODES = 120
+SCANS = 5
+
+# Autenticação (1) + listagem (1); o POST faz só o insert com RETURNING
+MAX_QUERIES = 2
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        self.engine = engine
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+@pytest.fixture(scope="module")
+def client():
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(UserModel.__table__), [
+            {"username": "queries", "email": "queries@tests.local", "password": "x"}
+        ])
+        user_id = connection.execute(
+            UserModel.__table__.select().where(UserModel.__table__.c.username == "queries")
+        ).one().id
+        ids = connection.execute(insert(QRCodeModel.__table__).returning(QRCodeModel.__table__.c.id), [
+            {"code": f"q{i:06d}", "destination_url": "https://example.com", "user_id": user_id}
+            for i in range(CODES)
+        ]).scalars().all()
+        for qr_code_id in ids:
+            write_scan_rows(connection, generate_scan_rows(qr_code_id, SCANS, seed=qr_code_id))
+
+    token = jwt.encode({"sub": "queries"}, os.environ["SECRET_KEY"], algorithm=os.environ["ALGORITHM"])
+    with TestClient(app) as client:
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
+
+
+@pytest.fixture
+def counter():
+    counter = QueryCounter(engine)
+    yield counter
+    counter.close()
+
+
+def test_list_query_count(client, counter):
+    response = client.get("/qr")
+
+    assert response.status_code == 200
+    assert len(response.json()) == CODES
+    assert all(qr["scan_count"] == SCANS for qr in response.json())
+    assert counter.count <= MAX_QUERIES
+
+
+def test_paginated_list_query_count(client, counter):
+    params = {"sort": "scan_count", "order": "desc", "limit": 50}
+    response = client.get("/qr", params=params)
+    assert response.status_code == 200
+    assert counter.count <= MAX_QUERIES
+
+    counter.count = 0
+    response = client.get("/qr", params={**params, "cursor": response.headers["X-Next-Cursor"]})
+    assert response.status_code == 200
+    assert len(response.json()) == 50
+    assert counter.count <= MAX_QUERIES
+
+
+def test_create_query_count(client, counter):
+    response = client.post("/qr", json={"destination_url": "https://example.com/new"})
+
+    assert response.status_code == 201
+    assert response.json()["scan_count"] == 0
+    assert counter.count <= MAX_QUERIES
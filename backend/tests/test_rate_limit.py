@@ -0,0 +1,34 @@
+import asyncio
+from app.rate_limit import ROUTE_LIMITS, LoadShedder, LocalRateLimitStore, RateLimiter
+
+
+class FakeIngestion:
+    def __init__(self, load: float, running: bool = True):
+        self.running = running
+        self._load = load
+
+    def load(self) -> float:
+        return self._load
+
+
+def check(limiter: RateLimiter, method: str, path: str):
+    return asyncio.run(limiter.check(limiter.route_limits(method, path), "10.0.0.1", path))
+
+
+def test_full_scan_queue_sheds_write_routes_but_not_redirects():
+    shedder = LoadShedder(queue_ratio=0.9)
+    shedder.watch_queue(FakeIngestion(0.95))
+    limiter = RateLimiter(LocalRateLimitStore(), ROUTE_LIMITS, shedder=shedder)
+
+    for method, path in [("POST", "/users/login"), ("POST", "/users/register"), ("POST", "/qr"), ("POST", "/qr/bulk")]:
+        assert check(limiter, method, path)[0] == 503
+    assert check(limiter, "GET", "/r/abc123") is None
+    assert limiter.shed == {"scan_queue": 4}
+
+
+def test_scan_queue_below_ratio_or_stopped_does_not_shed():
+    for ingestion in (FakeIngestion(0.5), FakeIngestion(1.0, running=False)):
+        shedder = LoadShedder(queue_ratio=0.9)
+        shedder.watch_queue(ingestion)
+
+        assert shedder.overloaded() is None
@@ -0,0 +1,7 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def test_stats_is_not_exposed_by_default():
+    with TestClient(app) as client:
+        assert client.get("/stats").status_code == 404